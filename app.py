@@ -4,18 +4,27 @@ Find trending SaaS ideas powered by AI
 """
 import streamlit as st
 import asyncio
+import functools
 import json
+import time
 from datetime import datetime
 import os
 
 # Import our modules
-from trend_hunter.sources.google_trends import fetch_google_trends
-from trend_hunter.sources.reddit import fetch_reddit_trends
-from trend_hunter.sources.hackernews import fetch_hackernews
-from trend_hunter.sources.producthunt import fetch_producthunt
-from trend_hunter.saas_analyzer import analyze_for_saas, rank_saas_ideas
+from trend_hunter.sources.google_trends import stream_google_trends
+from trend_hunter.sources.reddit import stream_reddit_trends
+from trend_hunter.sources.hackernews import stream_hackernews
+from trend_hunter.sources.producthunt import stream_producthunt
+from trend_hunter.sources.http_client import HttpClient
+from trend_hunter.sources.resilience import SourceMonitor
+from trend_hunter.watermarks import Watermarks
+from trend_hunter.sources.stream import merge_streams, sort_source_items
+from trend_hunter.saas_analyzer import analyze_for_saas_async, rank_saas_ideas
+from trend_hunter.relevance import prescan
+from trend_hunter.llm import close_async_client
+from trend_hunter.llm_cache import get_llm_cache
 from trend_hunter.storage import load_report, get_all_reports, get_all_ideas
-from trend_hunter.config import SUBREDDITS
+from trend_hunter.config import SUBREDDITS, REDDIT_SEARCH_KEYWORDS, REDDIT_BATCHED, INCREMENTAL_COLLECTION
 
 # Page config
 st.set_page_config(
@@ -105,6 +114,12 @@ def display_idea_card(idea: dict, rank: int):
 
         st.markdown(f"**Problem:** {idea.get('problem', 'N/A')}")
 
+        if idea.get('occurrences', 0) > 1:
+            st.caption(
+                f"🔁 Seen in {idea['occurrences']} reports "
+                f"({idea.get('first_seen')} → {idea.get('last_seen')})"
+            )
+
         col1, col2, col3 = st.columns(3)
         with col1:
             st.markdown(f"👥 **Target:** {idea.get('target_audience', 'N/A')}")
@@ -159,6 +174,13 @@ def main():
         st.markdown("### Region")
         region = st.selectbox("Google Trends Region", ["US", "GB", "DE", "RU"])
 
+        st.markdown("### Collection")
+        only_new = st.checkbox(
+            "Only new since last run",
+            value=INCREMENTAL_COLLECTION,
+            help="Skip items already seen unless their score or comments changed"
+        )
+
         st.markdown("---")
         st.markdown("### About")
         st.markdown("""
@@ -216,48 +238,120 @@ def main():
 
         if st.button("🚀 Start Analysis", type="primary", use_container_width=True):
 
-            google_trends = []
-            reddit_posts = []
-            hackernews_data = []
-            producthunt_data = []
-
             progress = st.progress(0, text="Starting analysis...")
 
-            # Fetch data
-            with st.spinner("Collecting data from sources..."):
+            # Fetch data: all sources stream concurrently over one pooled HTTP client
+            collected = {"google_trends": [], "reddit": [], "hackernews": [], "producthunt": []}
+            live_status = st.empty()
+            watermarks = Watermarks() if only_new else None
+
+            async def collect_data():
+                async with HttpClient() as http:
+                    monitor = SourceMonitor(http)
+                    sources = []
+                    if use_google:
+                        sources.append(("google_trends", stream_google_trends(geo=region, http=http)))
+                    if use_reddit:
+                        sources.append(("reddit", stream_reddit_trends(
+                            subreddits=SUBREDDITS,
+                            keywords=REDDIT_SEARCH_KEYWORDS,
+                            http=http,
+                            batched=REDDIT_BATCHED,
+                            known=functools.partial(watermarks.unchanged, "reddit") if watermarks else None
+                        )))
+                    if use_hackernews:
+                        sources.append(("hackernews", stream_hackernews(http=http, incremental=only_new)))
+                    if use_producthunt:
+                        sources.append(("producthunt", stream_producthunt(["today", "ai", "saas"], http=http)))
+
+                    streams = []
+                    for source, stream in sources:
+                        stream = monitor.track(source, stream)
+                        streams.append(watermarks.filter(source, stream) if watermarks else stream)
+
+                    progress.progress(10, text="Fetching data from sources...")
+                    async for item in merge_streams(*streams):
+                        collected[item["source"]].append(item)
+                        prescan(item)  # relevance pre-filter work starts on the first items
+                        live_status.caption(
+                            f"Google Trends: {len(collected['google_trends'])} · "
+                            f"Reddit: {len(collected['reddit'])} · "
+                            f"Hacker News: {len(collected['hackernews'])} · "
+                            f"Product Hunt: {len(collected['producthunt'])}"
+                        )
+                    return monitor.report()
 
-                if use_google:
-                    progress.progress(10, text="Fetching Google Trends...")
-                    google_trends = run_async(fetch_google_trends(geo=region))
-                    st.success(f"✅ Google Trends: {len(google_trends)} trends")
-
-                if use_reddit:
-                    progress.progress(30, text="Fetching Reddit posts...")
-                    reddit_posts = run_async(fetch_reddit_trends(
-                        subreddits=SUBREDDITS,
-                        keywords=["startup idea", "business idea", "saas idea", "side project"]
-                    ))
-                    st.success(f"✅ Reddit: {len(reddit_posts)} posts")
-
-                if use_hackernews:
-                    progress.progress(50, text="Fetching Hacker News...")
-                    hackernews_data = run_async(fetch_hackernews())
-                    st.success(f"✅ Hacker News: {len(hackernews_data)} stories")
-
-                if use_producthunt:
-                    progress.progress(70, text="Fetching Product Hunt...")
-                    producthunt_data = run_async(fetch_producthunt(["today", "ai", "saas"]))
-                    st.success(f"✅ Product Hunt: {len(producthunt_data)} products")
+            with st.spinner("Collecting data from sources..."):
+                source_status = run_async(collect_data())
+
+            sort_source_items(collected)
+            google_trends = collected["google_trends"]
+            reddit_posts = collected["reddit"]
+            hackernews_data = collected["hackernews"]
+            producthunt_data = collected["producthunt"]
+            progress.progress(70, text="Data collected")
+
+            source_labels = [
+                ("google_trends", "Google Trends", "trends"),
+                ("reddit", "Reddit", "posts"),
+                ("hackernews", "Hacker News", "stories"),
+                ("producthunt", "Product Hunt", "products"),
+            ]
+            for source, label, noun in source_labels:
+                status = source_status.get(source)
+                if status is None:
+                    continue
+                message = f"{label}: {status['items']} {noun} ({status['latency_s']}s)"
+                if status["status"] == "ok":
+                    st.success(f"✅ {message}")
+                elif status["status"] == "partial":
+                    st.warning(f"⚠️ {message} — some requests failed, results are partial")
+                else:
+                    st.error(f"❌ {message} — source unavailable")
 
             # AI Analysis
             progress.progress(85, text="🤖 AI analyzing trends...")
 
+            # Ideas are shown as soon as the model finishes each one
+            live_placeholder = st.empty()
+            live_box = live_placeholder.container()
+            streamed = []
+            analysis_started = time.monotonic()
+
+            def show_idea(idea):
+                if not streamed:
+                    live_box.markdown("## ⏳ Ideas so far")
+                    live_box.caption(f"First idea after {time.monotonic() - analysis_started:.1f}s")
+                streamed.append(idea)
+                with live_box:
+                    display_idea_card(idea, len(streamed))
+
+            async def run_analysis():
+                try:
+                    return await analyze_for_saas_async(
+                        google_trends=google_trends,
+                        reddit_posts=reddit_posts,
+                        hackernews=hackernews_data,
+                        producthunt=producthunt_data,
+                        on_idea=show_idea
+                    )
+                finally:
+                    # Loop is thrown away after run_async, so is its client
+                    await close_async_client()
+
             with st.spinner("AI is generating SaaS ideas..."):
-                analysis = analyze_for_saas(
-                    google_trends=google_trends,
-                    reddit_posts=reddit_posts,
-                    hackernews=hackernews_data,
-                    producthunt=producthunt_data
+                analysis = run_async(run_analysis())
+
+            # The final ranked list below replaces the live preview
+            live_placeholder.empty()
+
+            llm_cache = get_llm_cache()
+            if llm_cache is not None:
+                llm_cache.flush()
+                cache_stats = llm_cache.stats()
+                st.caption(
+                    f"LLM cache: {cache_stats['hits'] + cache_stats['overlap_hits']} hits · "
+                    f"{cache_stats['misses']} misses · ~{cache_stats['saved_tokens']} tokens saved"
                 )
 
             progress.progress(100, text="Done!")
@@ -265,6 +359,10 @@ def main():
             if "error" in analysis:
                 st.error(f"Analysis error: {analysis['error']}")
             else:
+                # Only now is the new data consumed; on failure it is offered again next run
+                if watermarks:
+                    watermarks.save()
+
                 # Rank ideas
                 ideas = rank_saas_ideas(analysis)
 
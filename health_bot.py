@@ -8,8 +8,10 @@ import json
 import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from groq import Groq
 from dotenv import load_dotenv
+from trend_hunter.config import LLM_PROVIDERS
+from trend_hunter.llm import acomplete
+from trend_hunter.scheduler import INTERACTIVE
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -25,9 +27,6 @@ logger = logging.getLogger(__name__)
 TELEGRAM_TOKEN = os.getenv('HEALTH_BOT_TOKEN')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
-# Инициализация Groq API
-client = Groq(api_key=GROQ_API_KEY)
-
 # Системный промпт для медицинских советов
 SYSTEM_PROMPT = """Ты опытный врач-терапевт и фельдшер скорой помощи. Даёшь КОНКРЕТНЫЕ практические советы при симптомах.
 
@@ -220,15 +219,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
         messages = [{"role": "system", "content": SYSTEM_PROMPT}] + user_conversations[user_id]
 
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=messages,
+        # Провайдер (Groq или запасной) выбирает роутер trend_hunter,
+        # минутный бюджет ключа общий с trend_hunter
+        bot_response = await acomplete(
+            messages,
             max_tokens=2000,
-            temperature=0.5  # Ниже для более точных медицинских советов
+            temperature=0.5,  # Ниже для более точных медицинских советов
+            priority=INTERACTIVE  # пользователь ждёт — вперёд пакетного анализа
         )
 
-        bot_response = response.choices[0].message.content
-
         user_conversations[user_id].append({
             "role": "assistant",
             "content": bot_response
@@ -253,7 +252,7 @@ def main() -> None:
     """Запуск бота"""
     if not TELEGRAM_TOKEN:
         raise ValueError("HEALTH_BOT_TOKEN не установлен!")
-    if not GROQ_API_KEY:
+    if "groq" in LLM_PROVIDERS and not GROQ_API_KEY:
         raise ValueError("GROQ_API_KEY не установлен!")
 
     load_conversations()
@@ -11,8 +11,10 @@ import asyncio
 from datetime import datetime, time
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
-from groq import Groq
 from dotenv import load_dotenv
+from trend_hunter.config import LLM_PROVIDERS
+from trend_hunter.llm import acomplete
+from trend_hunter.scheduler import INTERACTIVE
 
 # Загрузка переменных окружения из .env файла
 load_dotenv()
@@ -28,9 +30,6 @@ logger = logging.getLogger(__name__)
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 
-# Инициализация Groq API
-client = Groq(api_key=GROQ_API_KEY)
-
 # Системный промпт для психологической помощи
 SYSTEM_PROMPT = """Ты тёплый друг и психолог. Общайся просто, как в переписке с близким человеком. Используй смайлики 😊💙🌟✨💪🙏😔😰🤗💭
 
@@ -217,17 +216,15 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # Создаём список сообщений с системным промптом
         messages = [{"role": "system", "content": SYSTEM_PROMPT}] + user_conversations[user_id]
 
-        # Отправляем запрос к Groq API (бесплатно!)
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Можно использовать "mixtral-8x7b-32768" или "llama-3.1-70b-versatile"
-            messages=messages,
+        # Отправляем запрос к модели (провайдера выбирает роутер trend_hunter:
+        # Groq, а при сбое или задержке — запасной; модель — LLM_MODEL)
+        bot_response = await acomplete(
+            messages,
             max_tokens=2000,
-            temperature=0.7
+            temperature=0.7,
+            priority=INTERACTIVE  # пользователь ждёт — вперёд пакетного анализа
         )
 
-        # Получаем ответ
-        bot_response = response.choices[0].message.content
-
         # Добавляем ответ бота в историю
         user_conversations[user_id].append({
             "role": "assistant",
@@ -303,7 +300,7 @@ def main() -> None:
     # Проверка наличия токенов
     if not TELEGRAM_TOKEN:
         raise ValueError("TELEGRAM_BOT_TOKEN не установлен в переменных окружения")
-    if not GROQ_API_KEY:
+    if "groq" in LLM_PROVIDERS and not GROQ_API_KEY:
         raise ValueError("GROQ_API_KEY не установлен в переменных окружения")
 
     # Загружаем сохранённую историю разговоров
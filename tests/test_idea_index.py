@@ -0,0 +1,89 @@
+"""
+Тесты индекса идей между отчётами
+"""
+import json
+from datetime import datetime
+
+from trend_hunter import storage
+from trend_hunter.idea_index import IdeaIndex
+
+
+def _idea(name, problem="Ручной учёт счетов отнимает часы", audience="фрилансеры", score=50, **extra):
+    return dict(extra, name=name, problem=problem, target_audience=audience, final_score=score)
+
+
+def _index(tmp_path):
+    return IdeaIndex(str(tmp_path / "ideas.json"), threshold=0.6)
+
+
+def test_similar_ideas_of_different_days_merge(tmp_path):
+    index = _index(tmp_path)
+    index.add_report("2026-01-15", [_idea("Invoice Autopilot", score=60)])
+
+    stats = index.add_report("2026-01-16", [_idea("Invoice Autopilot Pro", score=80)])
+
+    assert stats == {"new": 0, "merged": 1}
+    [idea] = index.ideas()
+    assert idea["name"] == "Invoice Autopilot Pro"
+    assert (idea["first_seen"], idea["last_seen"], idea["occurrences"]) == ("2026-01-15", "2026-01-16", 2)
+
+
+def test_ideas_of_one_report_never_merge(tmp_path):
+    index = _index(tmp_path)
+
+    stats = index.add_report("2026-01-16", [
+        _idea("Invoice Autopilot"),
+        _idea("Invoice Autopilot Pro"),
+    ])
+
+    assert stats == {"new": 2, "merged": 0}
+    assert len(index) == 2
+
+
+def test_readding_a_report_does_not_duplicate(tmp_path):
+    index = _index(tmp_path)
+    ideas = [_idea("Invoice Autopilot"), _idea("Invoice Autopilot Pro")]
+    index.add_report("2026-01-16", ideas)
+
+    assert index.add_report("2026-01-16", ideas) == {"new": 0, "merged": 2}
+    assert len(index) == 2
+    assert {idea["occurrences"] for idea in index.ideas()} == {1}
+
+
+def test_description_does_not_make_ideas_similar(tmp_path):
+    index = _index(tmp_path)
+    template = "Сервис, который автоматизирует рутину и экономит время команды"
+    index.add_report("2026-01-15", [_idea("Invoice Autopilot", description=template)])
+
+    index.add_report("2026-01-16", [_idea(
+        "Podcast Clipper", problem="Нарезка подкастов для соцсетей", audience="подкастеры", description=template
+    )])
+
+    assert len(index) == 2
+
+
+def test_index_survives_reload(tmp_path):
+    path = str(tmp_path / "ideas.json")
+    IdeaIndex(path).add_report("2026-01-15", [_idea("Invoice Autopilot")])
+
+    reloaded = IdeaIndex(path)
+    reloaded.add_report("2026-01-16", [_idea("Invoice Autopilot")])
+
+    assert reloaded.dates() == {"2026-01-15", "2026-01-16"}
+    assert reloaded.ideas()[0]["occurrences"] == 2
+
+
+def test_reports_saved_before_the_index_are_backfilled(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path))
+    index = _index(tmp_path)
+    monkeypatch.setattr(storage, "get_idea_index", lambda: index)
+    for date, name in (("2026-01-14", "Podcast Clipper"), ("2026-01-15", "Invoice Autopilot")):
+        with open(tmp_path / f"report_{date}.json", "w", encoding="utf-8") as f:
+            json.dump({"date": date, "ideas": [_idea(name, problem=f"{name} problem")]}, f)
+
+    storage.save_daily_report({}, [_idea("Invoice Autopilot", problem="Invoice Autopilot problem", score=90)])
+
+    assert index.dates() == {"2026-01-14", "2026-01-15", datetime.now().strftime("%Y-%m-%d")}
+    ideas = {idea["name"]: idea for idea in storage.get_all_ideas()}
+    assert set(ideas) == {"Podcast Clipper", "Invoice Autopilot"}
+    assert ideas["Invoice Autopilot"]["occurrences"] == 2
@@ -0,0 +1,274 @@
+"""
+Тесты роутера провайдеров LLM: failover, hedging, circuit breaker
+"""
+import asyncio
+import json
+
+import pytest
+
+from trend_hunter.providers import NoProviderError, Provider, ProviderStats, Router, StubProvider
+
+MESSAGES = [{"role": "user", "content": "привет"}]
+
+
+class FakeProvider(Provider):
+    """Провайдер с заданной задержкой и ошибкой; считает вызовы и отмены"""
+
+    def __init__(self, name: str, latency: float = 0.0, error: Exception = None, chunks=("Привет, ", "мир")):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.chunks = chunks
+        self.calls = 0
+        self.cancelled = 0
+
+    def complete(self, messages, max_tokens, temperature, model):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.name, 10
+
+    async def acomplete(self, messages, max_tokens, temperature, model):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.name, 10
+
+    async def astream(self, messages, max_tokens, temperature, model):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        for chunk in self.chunks:
+            yield chunk, 0
+            await asyncio.sleep(0)
+        yield "", 10
+
+
+def _router(*providers, **kwargs):
+    options = dict(hedge=False, hedge_delay=0.05, hedge_min_delay=0.0, failure_threshold=3, reset_timeout=60)
+    options.update(kwargs)
+    return Router(list(providers), **options)
+
+
+def _half_open(router: Router, name: str):
+    """Переводит провайдера в half-open: цепь открыта, время сброса уже прошло"""
+    breaker = router.breakers[name]
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "half_open"
+
+
+async def _collect(stream):
+    return [piece async for piece in stream]
+
+
+# --- failover ---
+
+def test_sync_failover_to_next_provider():
+    broken, healthy = FakeProvider("broken", error=RuntimeError("500")), FakeProvider("healthy")
+    router = _router(broken, healthy)
+
+    assert router.complete(MESSAGES, 100, 0.7, "model") == ("healthy", 10)
+    assert router.stats["broken"].failures == 1
+    assert router.stats["healthy"].requests == 1
+
+
+def test_async_failover_to_next_provider():
+    router = _router(FakeProvider("broken", error=RuntimeError("500")), FakeProvider("healthy"))
+
+    assert asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model")) == ("healthy", 10)
+
+
+def test_last_error_is_raised_when_everyone_fails():
+    router = _router(FakeProvider("a", error=RuntimeError("a")), FakeProvider("b", error=ValueError("b")))
+
+    with pytest.raises(ValueError):
+        router.complete(MESSAGES, 100, 0.7, "model")
+
+
+# --- circuit breaker ---
+
+def test_breaker_stops_calling_failing_provider():
+    broken = FakeProvider("broken", error=RuntimeError("500"))
+    router = _router(broken, failure_threshold=2)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            router.complete(MESSAGES, 100, 0.7, "model")
+    with pytest.raises(NoProviderError):
+        router.complete(MESSAGES, 100, 0.7, "model")
+
+    assert broken.calls == 2
+    assert router.report()["broken"]["state"] == "open"
+
+
+def test_failing_provider_drops_below_healthy_one():
+    broken, healthy = FakeProvider("broken", error=RuntimeError("500")), FakeProvider("healthy")
+    router = _router(broken, healthy)
+
+    for _ in range(3):
+        router.complete(MESSAGES, 100, 0.7, "model")
+
+    assert broken.calls == 1
+    assert router.ranked()[0] is healthy
+
+
+def test_no_provider_error_when_all_breakers_open():
+    router = _router(FakeProvider("a"), failure_threshold=1)
+    router.breakers["a"].record_failure()
+
+    with pytest.raises(NoProviderError):
+        router.complete(MESSAGES, 100, 0.7, "model")
+
+
+def test_half_open_probe_success_closes_breaker():
+    provider = FakeProvider("a")
+    router = _router(provider)
+    _half_open(router, "a")
+
+    asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model"))
+
+    assert router.breakers["a"].state == "closed"
+
+
+def test_deadline_timeout_counts_as_failure():
+    slow = FakeProvider("slow", latency=1.0)
+    router = _router(slow, failure_threshold=1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model", timeout=0.05))
+
+    assert slow.cancelled == 1
+    assert router.stats["slow"].failures == 1
+    assert router.breakers["slow"].state == "open"
+
+
+# --- hedging ---
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    slow, fast = FakeProvider("slow", latency=1.0), FakeProvider("fast", latency=0.01)
+    router = _router(slow, fast, hedge=True)
+
+    result = asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model", timeout=5))
+
+    assert result == ("fast", 10)
+    assert slow.cancelled == 1
+    stats = router.stats
+    assert (stats["slow"].hedges, stats["fast"].hedge_wins) == (1, 1)
+    assert stats["slow"].failures == 0          # проигрыш в hedging — не ошибка
+    assert stats["slow"].measured               # но задержка замерена снизу
+    assert router.ranked()[0] is fast
+
+
+def test_cancelled_hedge_loser_releases_half_open_probe():
+    primary, probe = FakeProvider("primary", latency=0.1), FakeProvider("probe", latency=1.0)
+    router = _router(primary, probe, hedge=True, hedge_delay=0.02)
+    _half_open(router, "probe")
+
+    assert asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model", timeout=5)) == ("primary", 10)
+
+    assert probe.calls == 1 and probe.cancelled == 1
+    assert router.breakers["probe"].allow()     # проба не зависла
+
+
+def test_caller_cancellation_releases_probe():
+    provider = FakeProvider("a", latency=1.0)
+    router = _router(provider)
+    _half_open(router, "a")
+
+    async def cancel_midway():
+        task = asyncio.ensure_future(router.acomplete(MESSAGES, 100, 0.7, "model"))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(cancel_midway())
+
+    assert router.stats["a"].failures == 0
+    assert router.breakers["a"].allow()
+
+
+def test_no_hedge_without_spare_provider():
+    slow = FakeProvider("slow", latency=0.1)
+    router = _router(slow, hedge=True, hedge_delay=0.01)
+
+    assert asyncio.run(router.acomplete(MESSAGES, 100, 0.7, "model", timeout=5)) == ("slow", 10)
+    assert router.stats["slow"].hedges == 0
+
+
+# --- потоковые запросы ---
+
+def test_stream_failover_before_first_chunk():
+    router = _router(FakeProvider("broken", error=RuntimeError("500")), FakeProvider("healthy"))
+
+    pieces = asyncio.run(_collect(router.astream(MESSAGES, 100, 0.7, "model")))
+
+    assert "".join(text for text, _ in pieces) == "Привет, мир"
+    assert pieces[-1] == ("", 10)
+    assert router.stats["broken"].failures == 1
+
+
+def test_stream_timeout_counts_as_failure_without_failover():
+    slow, spare = FakeProvider("slow", latency=1.0), FakeProvider("spare")
+    router = _router(slow, spare)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(_collect(router.astream(MESSAGES, 100, 0.7, "model", timeout=0.05)))
+
+    assert router.stats["slow"].failures == 1
+    assert spare.calls == 0
+
+
+def test_stream_closed_early_releases_probe():
+    router = _router(FakeProvider("a"))
+    _half_open(router, "a")
+
+    async def read_first():
+        stream = router.astream(MESSAGES, 100, 0.7, "model")
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(read_first()) == ("Привет, ", 0)
+    assert router.stats["a"].failures == 0
+    assert router.breakers["a"].allow()
+
+
+# --- статистика и ранжирование ---
+
+def test_expected_latency_accounts_for_errors():
+    stats = ProviderStats(window=10)
+    for _ in range(5):
+        stats.record(1.0, True)
+    for _ in range(5):
+        stats.record(0.0, False)
+
+    assert stats.median == 1.0
+    assert stats.error_rate == 0.5
+    assert stats.expected_latency() == pytest.approx(2.0)
+
+
+def test_ranking_prefers_measured_fast_providers():
+    a, b, c = FakeProvider("a"), FakeProvider("b"), FakeProvider("c")
+    router = _router(a, b, c)
+    router.stats["a"].record(2.0, True)
+    router.stats["b"].record(0.5, True)
+
+    assert router.ranked() == [b, a, c]  # c не замерен — после замеренных
+
+
+def test_stub_provider_is_deterministic():
+    messages = [{"role": "user", "content": 'Верни JSON с "saas_ideas": invoices invoices automation'}]
+    first, second = StubProvider(), StubProvider()
+
+    text, tokens = first.complete(messages, 100, 0.7, "model")
+
+    assert second.complete(messages, 100, 0.7, "model") == (text, tokens)
+    assert json.loads(text)["saas_ideas"][0]["name"] == "Invoices Autopilot"
@@ -0,0 +1,132 @@
+"""
+Тесты ремонта JSON из ответов модели
+"""
+import json
+
+import pytest
+
+from trend_hunter import repair
+from trend_hunter.repair import continue_json, is_truncated, parse_validated, repair_json
+from trend_hunter.saas_analyzer import SAAS_SCHEMA
+
+
+def test_valid_json_is_returned_as_is():
+    assert repair_json('{"a": [1, {"b": null}]}') == ({"a": [1, {"b": None}]}, False)
+
+
+def test_trailing_commas():
+    assert repair_json('{"a": [1, 2,], "b": {"c": 1,},}') == ({"a": [1, 2], "b": {"c": 1}}, False)
+
+
+def test_markdown_fence():
+    assert repair_json('```json\n{"a": 1}\n```') == ({"a": 1}, False)
+
+
+def test_prose_around_json():
+    text = 'Вот результат анализа:\n{"a": "x", "b": [1,]}\nНадеюсь, это поможет! {не JSON}'
+
+    assert repair_json(text) == ({"a": "x", "b": [1]}, False)
+
+
+def test_truncated_inside_array_keeps_finished_items():
+    text = '{"saas_ideas": [{"name": "A"}, {"name": "B", "problem": "оборва'
+
+    assert repair_json(text) == ({"saas_ideas": [{"name": "A"}]}, True)
+
+
+def test_truncated_after_array_keeps_whole_array():
+    text = '{"saas_ideas": [{"name": "A"}], "market_insights": "не дописа'
+
+    assert repair_json(text) == ({"saas_ideas": [{"name": "A"}]}, True)
+
+
+def test_brackets_inside_strings_do_not_confuse_repair():
+    text = '{"a": "скобки } ] внутри", "b": [{"c": "{["}, {"d'
+
+    assert repair_json(text) == ({"a": "скобки } ] внутри", "b": [{"c": "{["}]}, True)
+
+
+def test_truncated_before_first_finished_value_is_unrecoverable():
+    with pytest.raises(json.JSONDecodeError):
+        repair_json('{"saas_ideas": [')
+
+
+def test_no_json_object():
+    with pytest.raises(ValueError):
+        repair_json("Извините, я не могу помочь с этим")
+
+
+@pytest.mark.parametrize("text, truncated", [
+    ('{"a": 1}', False),
+    ('```json\n{"a": [1,]}\n```', False),
+    ('{"a": [1, 2', True),
+    ('{"a": "}"', True),
+    ("без JSON", False),
+])
+def test_is_truncated(text, truncated):
+    assert is_truncated(text) is truncated
+
+
+def test_continue_json_appends_tail(monkeypatch):
+    calls = []
+
+    def fake_complete(messages, **kwargs):
+        calls.append((messages, kwargs))
+        return ', {"name": "B"}]}'
+
+    monkeypatch.setattr(repair, "complete", fake_complete)
+    messages = [{"role": "user", "content": "идеи"}]
+
+    text = continue_json(messages, '{"ideas": [{"name": "A"}')
+
+    assert json.loads(text) == {"ideas": [{"name": "A"}, {"name": "B"}]}
+    assert len(calls) == 1
+    sent, kwargs = calls[0]
+    assert sent[-2] == {"role": "assistant", "content": '{"ideas": [{"name": "A"}'}
+    assert sent[-1]["content"] == repair.CONTINUE_PROMPT
+    assert kwargs["max_tokens"] == repair.LLM_CONTINUATION_TOKENS
+
+
+def test_continue_json_takes_restarted_answer(monkeypatch):
+    monkeypatch.setattr(repair, "complete", lambda messages, **kwargs: '```json\n{"ideas": []}')
+
+    assert continue_json([], '{"ideas": [{"name": "A"') == '{"ideas": []}'
+
+
+def test_continue_json_skips_complete_answer(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("дозапрос не нужен")
+
+    monkeypatch.setattr(repair, "complete", fail)
+
+    assert continue_json([], '{"ideas": []}') == '{"ideas": []}'
+
+
+def test_continue_json_survives_failed_continuation(monkeypatch):
+    def fail(*args, **kwargs):
+        raise TimeoutError()
+
+    monkeypatch.setattr(repair, "complete", fail)
+
+    assert continue_json([], '{"ideas": [{"name": "A"}') == '{"ideas": [{"name": "A"}'
+
+
+def test_parse_validated_marks_repairs():
+    text = '```json\n{"saas_ideas": [{"name": "A", "problem": "p", "potential_score": "9"}, {"name": "B'
+
+    data = parse_validated(text, SAAS_SCHEMA)
+
+    assert [idea["name"] for idea in data["saas_ideas"]] == ["A"]
+    assert data["saas_ideas"][0]["potential_score"] == 9
+    assert data["repair"] == {"truncated": True, "fixes": 1}
+
+
+def test_parse_validated_clean_answer_has_no_repair_field():
+    data = parse_validated('{"saas_ideas": [{"name": "A", "problem": "p"}]}', SAAS_SCHEMA)
+
+    assert "repair" not in data
+
+
+def test_parse_validated_rejects_wrong_shape():
+    with pytest.raises(ValueError):
+        parse_validated('{"ideas": []}', SAAS_SCHEMA)
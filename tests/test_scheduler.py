@@ -0,0 +1,252 @@
+"""
+Тесты общего бюджета LLM: журнал расхода, приоритеты, доля batch
+"""
+import asyncio
+import threading
+
+import pytest
+
+from trend_hunter import llm, scheduler as scheduler_module
+from trend_hunter.scheduler import BATCH, INTERACTIVE, WINDOW, BudgetLedger, LLMScheduler, _free_after
+
+MESSAGES = [{"role": "user", "content": "привет"}]
+
+
+# --- журнал расхода ---
+
+def test_try_reserve_within_budget():
+    ledger = BudgetLedger()
+
+    assert ledger.try_reserve("a", 600, rpm=10, tpm=1000) == (True, 0.0)
+    assert ledger.try_reserve("b", 400, rpm=10, tpm=1000) == (True, 0.0)
+    assert ledger.usage() == {"requests": 2, "tokens": 1000}
+
+
+def test_try_reserve_rejects_over_token_budget():
+    ledger = BudgetLedger()
+    ledger.try_reserve("a", 900, rpm=10, tpm=1000)
+
+    ok, retry_after = ledger.try_reserve("b", 200, rpm=10, tpm=1000)
+
+    assert not ok
+    assert 0 < retry_after <= WINDOW
+    assert ledger.usage() == {"requests": 1, "tokens": 900}
+
+
+def test_try_reserve_rejects_over_request_budget():
+    ledger = BudgetLedger()
+    ledger.try_reserve("a", 1, rpm=1, tpm=0)
+
+    assert not ledger.try_reserve("b", 1, rpm=1, tpm=0)[0]
+
+
+def test_zero_limits_mean_unlimited():
+    ledger = BudgetLedger()
+
+    assert all(ledger.try_reserve(str(i), 10 ** 6, rpm=0, tpm=0)[0] for i in range(5))
+
+
+def test_settle_replaces_estimate_and_discard_removes_entry():
+    ledger = BudgetLedger()
+    ledger.try_reserve("a", 900, rpm=10, tpm=1000)
+    ledger.try_reserve("b", 100, rpm=10, tpm=1000)
+
+    ledger.settle("a", 250)
+    assert ledger.usage() == {"requests": 2, "tokens": 350}
+
+    ledger.discard("b")
+    assert ledger.usage() == {"requests": 1, "tokens": 250}
+
+
+def test_entries_leave_window():
+    ledger = BudgetLedger()
+    ledger._entries = [[0.0, 1000, "old"]]  # запрос давнее минуты назад
+
+    assert ledger.try_reserve("new", 1000, rpm=1, tpm=1000)[0]
+
+
+def test_free_after_waits_for_enough_old_entries():
+    now = 1000.0
+    entries = [[now - 50, 400, "a"], [now - 30, 400, "b"], [now - 10, 200, "c"]]
+
+    # 300 токенов влезут, когда уйдёт "a" (через 10 с)
+    assert _free_after(entries, now, rpm=0, tpm=1000, tokens=300) == pytest.approx(10)
+    # 700 — только когда уйдёт и "b" (через 30 с)
+    assert _free_after(entries, now, rpm=0, tpm=1000, tokens=700) == pytest.approx(30)
+    # по числу запросов: при лимите 3 нужно, чтобы ушёл один
+    assert _free_after(entries, now, rpm=3, tpm=0, tokens=1) == pytest.approx(10)
+    # не влезет никогда
+    assert _free_after(entries, now, rpm=0, tpm=1000, tokens=2000) == WINDOW
+
+
+def test_shared_ledger_is_seen_by_other_instances(tmp_path):
+    pytest.importorskip("fcntl")
+    path = str(tmp_path / "budget.json")
+    bot, analyzer = BudgetLedger(path), BudgetLedger(path)  # как два процесса
+
+    assert bot.try_reserve("bot-1", 700, rpm=10, tpm=1000)[0]
+
+    assert not analyzer.try_reserve("job-1", 400, rpm=10, tpm=1000)[0]
+    assert analyzer.usage() == {"requests": 1, "tokens": 700}
+
+
+# --- планировщик ---
+
+def test_batch_cannot_use_interactive_reserve():
+    scheduler = LLMScheduler(requests_per_minute=10, tokens_per_minute=1000, reserve=0.2)
+
+    async def scenario():
+        await scheduler.acquire(800, BATCH)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire(1, BATCH), 0.1)
+        return await asyncio.wait_for(scheduler.acquire(200, INTERACTIVE), 0.1)
+
+    assert asyncio.run(scenario()).priority == INTERACTIVE
+    assert scheduler.ledger.usage()["tokens"] == 1000
+    assert scheduler.report()["queue_depth"] == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_batch_request_share_is_capped_too():
+    scheduler = LLMScheduler(requests_per_minute=5, tokens_per_minute=0, reserve=0.2)
+
+    async def scenario():
+        for _ in range(4):
+            await scheduler.acquire(1, BATCH)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire(1, BATCH), 0.1)
+        await asyncio.wait_for(scheduler.acquire(1, INTERACTIVE), 0.1)
+
+    asyncio.run(scenario())
+
+
+def test_interactive_overtakes_queued_batch():
+    scheduler = LLMScheduler(requests_per_minute=100, tokens_per_minute=1000, reserve=0.2)
+    order = []
+
+    async def request(name, tokens, priority):
+        ticket = await scheduler.acquire(tokens, priority)
+        order.append(name)
+        return ticket
+
+    async def scenario():
+        first = await request("batch-1", 800, BATCH)
+        waiting_batch = asyncio.ensure_future(request("batch-2", 500, BATCH))
+        await asyncio.sleep(0.05)
+        waiting_bot = asyncio.ensure_future(request("bot", 500, INTERACTIVE))
+        await asyncio.sleep(0.05)
+        assert order == ["batch-1"]
+
+        scheduler.release(first, 100)  # фактически потрачено меньше оценки
+        bot = await asyncio.wait_for(waiting_bot, 1)
+        await asyncio.sleep(0.1)
+        # 100 + 500 = 600: ещё 500 для batch выйдут за его 800
+        assert order == ["batch-1", "bot"]
+
+        scheduler.release(bot, 50)
+        await asyncio.wait_for(waiting_batch, 1)
+
+    asyncio.run(scenario())
+    assert order == ["batch-1", "bot", "batch-2"]
+    stats = scheduler.report()["priorities"]
+    assert stats[INTERACTIVE]["waited"] == 1 and stats[BATCH]["waited"] == 1
+
+
+def test_oversized_request_is_clamped_to_budget():
+    scheduler = LLMScheduler(requests_per_minute=10, tokens_per_minute=1000, reserve=0.0)
+
+    ticket = asyncio.run(asyncio.wait_for(scheduler.acquire(5000, BATCH), 0.5))
+
+    assert ticket.tokens == 5000
+    assert scheduler.ledger.usage()["tokens"] == 1000
+
+
+def test_cancelled_waiter_leaves_queue():
+    scheduler = LLMScheduler(requests_per_minute=1, tokens_per_minute=0, reserve=0.0)
+
+    async def scenario():
+        await scheduler.acquire(1, BATCH)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire(1, BATCH), 0.1)
+
+    asyncio.run(scenario())
+    assert scheduler.report()["queue_depth"] == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_release_in_event_loop_settles_off_the_loop(tmp_path):
+    pytest.importorskip("fcntl")
+    ledger = BudgetLedger(str(tmp_path / "budget.json"))
+    scheduler = LLMScheduler(requests_per_minute=10, tokens_per_minute=1000, reserve=0.0, ledger=ledger)
+    settled_in = []
+    settle = ledger.settle
+
+    def tracked_settle(entry_id, tokens):
+        settled_in.append(threading.current_thread())
+        settle(entry_id, tokens)
+
+    ledger.settle = tracked_settle
+
+    async def scenario():
+        ticket = await scheduler.acquire(900, BATCH)
+        scheduler.release(ticket, 100)
+        while not scheduler._released:  # ожидающие узнают об этом после правки журнала
+            await asyncio.sleep(0.01)
+
+    asyncio.run(asyncio.wait_for(scenario(), 1))
+
+    assert settled_in and settled_in[0] is not threading.main_thread()
+    assert ledger.usage() == {"requests": 1, "tokens": 100}
+
+
+def test_stub_providers_bypass_shared_budget(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "_scheduler", None)
+    monkeypatch.setattr(scheduler_module, "LLM_PROVIDERS", ["stub"])
+
+    scheduler = scheduler_module.get_scheduler()
+
+    assert scheduler.ledger.path is None
+    assert (scheduler.rpm, scheduler.tpm) == (0, 0)
+    for _ in range(100):
+        scheduler.acquire_sync(10 ** 6, BATCH)
+    assert scheduler.ledger.usage()["requests"] == 0  # журнал не трогается
+    assert scheduler.report()["queue_depth"] == {INTERACTIVE: 0, BATCH: 0}
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        LLMScheduler().acquire_sync(1, "urgent")
+
+
+# --- освобождение бюджета в llm ---
+
+class _FailingRouter:
+    def complete(self, *args, **kwargs):
+        raise RuntimeError("провайдер упал")
+
+    async def acomplete(self, *args, **kwargs):
+        raise RuntimeError("провайдер упал")
+
+    async def astream(self, *args, **kwargs):
+        yield "кусок", 0
+        yield "ещё", 0
+        yield "", 42
+
+
+def test_ticket_released_on_error_and_early_close(monkeypatch):
+    scheduler = LLMScheduler(requests_per_minute=100, tokens_per_minute=100000, reserve=0.0)
+    monkeypatch.setattr(llm, "get_scheduler", lambda: scheduler)
+    monkeypatch.setattr(llm, "get_router", lambda: _FailingRouter())
+
+    with pytest.raises(RuntimeError):
+        llm.complete(MESSAGES, max_tokens=100)
+    with pytest.raises(RuntimeError):
+        asyncio.run(llm.acomplete(MESSAGES, max_tokens=100))
+
+    async def read_first():
+        stream = llm.astream(MESSAGES, max_tokens=100)
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(read_first())
+
+    assert scheduler._released == 3
+    assert scheduler.report()["queue_depth"] == {INTERACTIVE: 0, BATCH: 0}
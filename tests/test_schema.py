@@ -0,0 +1,142 @@
+"""
+Тесты проверки ответов модели по схеме
+"""
+import pytest
+
+from trend_hunter.schema import Field, Schema
+
+IDEA = Schema({
+    "name": Field("str", required=True),
+    "complexity": Field("str", choices=("low", "medium", "high"), default="medium"),
+    "score": Field("number", bounds=(1, 10), default=5),
+    "features": Field("list", items=Field("str")),
+    "note": Field("str"),
+})
+
+REPORT = Schema({
+    "ideas": Field("list", required=True, items=Field("object", items=IDEA)),
+    "summary": Field("str", default=""),
+})
+
+
+def test_valid_object_passes_unchanged():
+    value = {"name": "A", "complexity": "low", "score": 7, "features": ["x"], "extra": {"kept": True}}
+
+    assert IDEA.validate(value) == (value, [])
+
+
+def test_result_is_a_copy():
+    value = {"name": "A", "score": "7"}
+    cleaned, _ = IDEA.validate(value)
+
+    assert cleaned["score"] == 7
+    assert value["score"] == "7"
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("8", 8),
+    ("8/10", 8),
+    ("7,5", 7.5),
+    (42, 10),
+    (-3, 1),
+])
+def test_number_coercion_and_bounds(raw, expected):
+    cleaned, problems = IDEA.validate({"name": "A", "score": raw})
+
+    assert cleaned["score"] == expected
+    assert problems
+
+
+def test_whole_float_becomes_int():
+    assert IDEA.validate({"name": "A", "score": 7.0}) == ({"name": "A", "score": 7}, [])
+
+
+@pytest.mark.parametrize("raw", ["высокий", True, {"v": 1}])
+def test_bad_number_falls_back_to_default(raw):
+    cleaned, problems = IDEA.validate({"name": "A", "score": raw})
+
+    assert cleaned["score"] == 5
+    assert problems
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("Low", "low"),
+    (" HIGH ", "high"),
+    ("low/medium", "low"),
+    ("Medium complexity", "medium"),
+    ("неизвестно", "medium"),
+])
+def test_choices_are_normalized(raw, expected):
+    cleaned, _ = IDEA.validate({"name": "A", "complexity": raw})
+
+    assert cleaned["complexity"] == expected
+
+
+def test_string_coercions():
+    cleaned, problems = IDEA.validate({"name": 42, "note": ["a", "b"]})
+
+    assert cleaned["name"] == "42"
+    assert cleaned["note"] == "a, b"
+    assert len(problems) == 2
+
+
+def test_list_coercion_and_bad_items():
+    cleaned, _ = IDEA.validate({"name": "A", "features": "одна фича"})
+    assert cleaned["features"] == ["одна фича"]
+
+    cleaned, problems = IDEA.validate({"name": "A", "features": ["ok", {"bad": 1}, 3]})
+    assert cleaned["features"] == ["ok", "3"]
+    assert len(problems) == 2
+
+
+def test_invalid_optional_field_is_dropped():
+    cleaned, problems = IDEA.validate({"name": "A", "note": {"not": "a string"}})
+
+    assert "note" not in cleaned
+    assert problems
+
+
+def test_null_optional_field_is_dropped_silently():
+    cleaned, problems = IDEA.validate({"name": "A", "note": None})
+
+    assert "note" not in cleaned
+    assert problems == []
+
+
+def test_missing_required_field_rejects_object():
+    cleaned, problems = IDEA.validate({"score": 5})
+
+    assert cleaned is None
+    assert "name" in problems[0]
+
+
+def test_missing_required_field_with_default_is_filled():
+    schema = Schema({"kind": Field("str", required=True, default="saas")})
+
+    assert schema.validate({}) == ({"kind": "saas"}, ["kind: нет поля, подставлено 'saas'"])
+
+
+def test_not_an_object():
+    cleaned, problems = IDEA.validate(["name"])
+
+    assert cleaned is None
+    assert problems
+
+
+def test_nested_objects_drop_only_broken_items():
+    cleaned, problems = REPORT.validate({"ideas": [
+        {"name": "A", "score": "9"},
+        {"score": 3},          # нет name — идея отбрасывается
+        "просто строка",       # не объект
+        {"name": "B"},
+    ]})
+
+    assert [idea["name"] for idea in cleaned["ideas"]] == ["A", "B"]
+    assert cleaned["ideas"][0]["score"] == 9
+    assert "summary" not in cleaned  # default — только вместо неисправимого значения
+    assert any(problem.startswith("ideas[1]") for problem in problems)
+
+
+def test_unknown_field_kind_is_a_programming_error():
+    with pytest.raises(ValueError):
+        Schema({"x": Field("date")}).validate({"x": "2026-01-01"})
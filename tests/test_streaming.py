@@ -0,0 +1,173 @@
+"""
+Тесты потокового разбора ответа модели и отдачи идей on_idea
+"""
+import asyncio
+import json
+
+import pytest
+
+from trend_hunter import analyzer, repair, saas_analyzer, streaming
+from trend_hunter.streaming import JsonArrayStream
+
+IDEAS = [
+    {"name": "Invoice Bot", "problem": "Фрилансеры забывают выставлять счета {ежемесячно}"},
+    {"name": "Quote \"Checker\"", "problem": "Цитаты с ] и [ внутри, а ещё \\ и \"кавычки\""},
+    {"name": "Nested", "problem": "Вложенные объекты", "meta": {"saas_ideas": [{"name": "не идея"}]}},
+]
+
+RESPONSE = json.dumps({
+    "meta": {"saas_ideas": [{"name": "вложенный ключ с тем же именем"}]},
+    "saas_ideas": IDEAS,
+    "market_insights": "после массива",
+}, ensure_ascii=False)
+
+
+def _feed_all(parser: JsonArrayStream, chunks):
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    return items
+
+
+def test_whole_response_in_one_chunk():
+    parser = JsonArrayStream("saas_ideas")
+
+    assert parser.feed(RESPONSE) == IDEAS
+    assert parser.done
+    assert parser.emitted == len(IDEAS)
+
+
+@pytest.mark.parametrize("offset", range(1, len(RESPONSE)))
+def test_split_at_every_offset(offset):
+    parser = JsonArrayStream("saas_ideas")
+
+    assert _feed_all(parser, [RESPONSE[:offset], RESPONSE[offset:]]) == IDEAS
+
+
+def test_character_by_character():
+    assert _feed_all(JsonArrayStream("saas_ideas"), list(RESPONSE)) == IDEAS
+
+
+def test_fenced_output_with_prose():
+    text = "Вот анализ:\n```json\n" + RESPONSE + "\n```\nНадеюсь, поможет {не JSON}"
+
+    assert _feed_all(JsonArrayStream("saas_ideas"), [text[i:i + 7] for i in range(0, len(text), 7)]) == IDEAS
+
+
+def test_braces_and_key_name_inside_strings():
+    text = json.dumps({
+        "summary": "текст про \"saas_ideas\": [{\"name\": \"фальшивка\"}]",
+        "saas_ideas": [{"name": "A", "problem": "скобки } ] { [ в строке"}],
+    }, ensure_ascii=False)
+
+    assert JsonArrayStream("saas_ideas").feed(text) == [{"name": "A", "problem": "скобки } ] { [ в строке"}]
+
+
+def test_nested_key_with_same_name_is_ignored():
+    text = json.dumps({"meta": {"trends": [{"name": "вложенный"}]}, "other": 1})
+
+    parser = JsonArrayStream("trends")
+    assert parser.feed(text) == []
+    assert not parser.done
+
+
+def test_text_after_array_is_ignored():
+    parser = JsonArrayStream("trends")
+    items = parser.feed('{"trends": [{"name": "A"}], "more": [{"name": "B"}]}')
+
+    assert items == [{"name": "A"}]
+    assert parser.feed('{"trends": [{"name": "C"}]}') == []
+
+
+def test_non_object_array_items_are_skipped():
+    assert JsonArrayStream("trends").feed('{"trends": [1, "x", {"name": "A"}, null]}') == [{"name": "A"}]
+
+
+def test_truncated_response_emits_only_closed_items():
+    parser = JsonArrayStream("saas_ideas")
+
+    assert parser.feed(RESPONSE[:RESPONSE.index('"Nested"')]) == IDEAS[:2]
+    assert not parser.done
+
+
+# --- Отдача идей через on_idea ---
+
+def _fake_astream(text: str, chunk_size: int = 5):
+    async def astream(messages, **kwargs):
+        for i in range(0, len(text), chunk_size):
+            yield text[i:i + chunk_size]
+            await asyncio.sleep(0)
+    return astream
+
+
+@pytest.fixture
+def offline_llm(monkeypatch):
+    """Ответ модели приходит из подставленного текста; LLM-кэш выключен"""
+    monkeypatch.setattr(repair, "get_llm_cache", lambda: None)
+
+    def use(text: str):
+        monkeypatch.setattr(streaming, "astream", _fake_astream(text))
+    return use
+
+
+def test_saas_analyzer_emits_ideas_while_streaming(offline_llm):
+    ideas = [
+        {"name": "Churn Radar", "problem": "SaaS не видят отток заранее",
+         "mvp_complexity": "Low", "potential_score": "8/10", "market_size": "large"},
+        {"name": "Churn Radar Pro", "problem": "SaaS не видят отток заранее",
+         "mvp_complexity": "low", "potential_score": 8, "market_size": "large"},  # повтор
+        {"name": "Без проблемы"},  # нет обязательного поля
+        {"name": "Meeting Notes", "problem": "Итоги встреч теряются", "potential_score": 6},
+    ]
+    offline_llm(json.dumps({"saas_ideas": ideas, "market_insights": "ok"}, ensure_ascii=False))
+    emitted = []
+
+    result = asyncio.run(saas_analyzer.analyze_for_saas_async(
+        reddit_posts=[{"title": "x", "subreddit": "SaaS", "score": 1, "num_comments": 0}],
+        on_idea=emitted.append
+    ))
+
+    assert [idea["name"] for idea in emitted] == ["Churn Radar", "Meeting Notes"]
+    assert emitted[0]["mvp_complexity"] == "low"
+    assert emitted[0]["potential_score"] == 8
+    assert all("final_score" in idea for idea in emitted)
+    assert "error" not in result
+
+
+def test_trend_analyzer_emits_business_ideas(offline_llm):
+    trends = [
+        {"name": "AI agents", "why_now": "модели подешевели",
+         "business_idea": {"name": "Agent Ops", "potential_score": 9, "mvp_complexity": "high"}},
+        {"name": "Тренд без идеи"},
+    ]
+    offline_llm(json.dumps({"trends": trends, "summary": "s"}, ensure_ascii=False))
+    emitted = []
+
+    asyncio.run(analyzer.analyze_trends_async(
+        [{"title": "ai agents", "traffic": "100K+"}], [], on_idea=emitted.append
+    ))
+
+    assert len(emitted) == 1
+    assert emitted[0]["name"] == "Agent Ops"
+    assert emitted[0]["trend_name"] == "AI agents"
+    assert emitted[0]["why_now"] == "модели подешевели"
+    assert "final_score" in emitted[0]
+
+
+def test_on_idea_error_does_not_stop_stream(offline_llm):
+    offline_llm(json.dumps({"saas_ideas": [
+        {"name": "Первая", "problem": "одна проблема"},
+        {"name": "Вторая", "problem": "совсем другая беда"},
+    ]}, ensure_ascii=False))
+    seen = []
+
+    def on_idea(idea):
+        seen.append(idea["name"])
+        raise RuntimeError("обработчик упал")
+
+    asyncio.run(saas_analyzer.analyze_for_saas_async(
+        reddit_posts=[{"title": "x", "subreddit": "SaaS", "score": 1, "num_comments": 0}],
+        on_idea=on_idea
+    ))
+
+    assert seen == ["Первая", "Вторая"]
@@ -0,0 +1,161 @@
+"""
+Тесты водяных знаков инкрементального сбора
+"""
+import asyncio
+import time
+
+from trend_hunter.sources.reddit import RedditFetcher
+from trend_hunter.watermarks import Watermarks
+
+
+async def _stream(items):
+    for item in items:
+        yield item
+
+
+def _run(watermarks, source, items):
+    async def collect():
+        return [dict(item) async for item in watermarks.filter(source, _stream(items))]
+    return asyncio.run(collect())
+
+
+def _reddit_post(post_id, created_utc, score=10, num_comments=2):
+    return {"id": post_id, "created_utc": created_utc, "score": score, "num_comments": num_comments}
+
+
+def test_first_run_emits_everything_as_new(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"))
+    now = time.time()
+
+    emitted = _run(watermarks, "reddit", [_reddit_post("a", now - 60), _reddit_post("b", now - 30)])
+
+    assert [item["id"] for item in emitted] == ["a", "b"]
+    assert {item["change"] for item in emitted} == {"new"}
+    assert watermarks.stats["reddit"] == {"new": 2, "changed": 0, "seen": 0}
+
+
+def test_second_run_emits_only_new_and_changed(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"), min_change=0.5)
+    now = time.time()
+    _run(watermarks, "reddit", [_reddit_post("a", now - 60), _reddit_post("b", now - 30)])
+
+    emitted = _run(watermarks, "reddit", [
+        _reddit_post("a", now - 60, score=12),   # +20% — ниже порога
+        _reddit_post("b", now - 30, score=40),   # x4 — изменился
+        _reddit_post("c", now - 10),
+    ])
+
+    assert [(item["id"], item["change"]) for item in emitted] == [("b", "changed"), ("c", "new")]
+
+
+def test_state_survives_save_and_reload(tmp_path):
+    path = str(tmp_path / "wm.json")
+    now = time.time()
+    watermarks = Watermarks(path)
+    _run(watermarks, "hackernews", [{"id": 100, "time": now - 60, "score": 5, "comments": 1}])
+    watermarks.save()
+
+    reloaded = Watermarks(path)
+    emitted = _run(reloaded, "hackernews", [
+        {"id": 100, "time": now - 60, "score": 5, "comments": 1},
+        {"id": 101, "time": now - 5, "score": 1, "comments": 0},
+    ])
+
+    assert [item["id"] for item in emitted] == [101]
+    assert reloaded.cache.get("hackernews")["mark"] == 101
+
+
+def test_old_unknown_item_below_mark_is_not_new(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"), retention=3600)
+    now = time.time()
+    _run(watermarks, "reddit", [_reddit_post("fresh", now - 60)])
+
+    emitted = _run(watermarks, "reddit", [
+        _reddit_post("ancient", now - 7200),     # забыт: ниже границы и старше retention
+        _reddit_post("late", now - 600),         # только попал в hot: ниже границы, но свежий
+    ])
+
+    assert [item["id"] for item in emitted] == ["late"]
+
+
+def test_items_unseen_for_longer_than_retention_are_dropped(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"), retention=3600)
+    now = time.time()
+    watermarks.cache.set("reddit", {"mark": now - 60, "items": {
+        "stale": {"m": [1, 0], "t": now - 7200},
+        "recent": {"m": [1, 0], "t": now - 60},
+    }})
+
+    _run(watermarks, "reddit", [])
+
+    assert set(watermarks.cache.get("reddit")["items"]) == {"recent"}
+
+
+def test_producthunt_is_keyed_by_url(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"))
+    product = {"url": "https://www.producthunt.com/posts/x", "pub_date": "Fri, 16 Jan 2026 10:00:00 GMT"}
+    _run(watermarks, "producthunt", [product])
+
+    renamed = dict(product, name="X 2.0")
+    assert _run(watermarks, "producthunt", [renamed]) == []
+
+
+def test_google_trends_key_does_not_depend_on_geo(tmp_path):
+    # stream_google_trends оставляет тренд из того региона, чей фид
+    # ответил первым, — от запуска к запуску geo может меняться
+    watermarks = Watermarks(str(tmp_path / "wm.json"))
+    _run(watermarks, "google_trends", [{"title": "openai", "geo": "US"}])
+
+    assert _run(watermarks, "google_trends", [{"title": "openai", "geo": "GB"}]) == []
+
+
+def test_unknown_source_passes_through(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"))
+    items = [{"id": 1}, {"id": 1}]
+
+    assert _run(watermarks, "mastodon", items) == items
+
+
+def test_unchanged_only_reads_state(tmp_path):
+    watermarks = Watermarks(str(tmp_path / "wm.json"), min_change=0.5)
+    now = time.time()
+    _run(watermarks, "reddit", [_reddit_post("a", now - 60)])
+    state = repr(watermarks.cache.get("reddit"))
+
+    assert watermarks.unchanged("reddit", _reddit_post("a", now - 60, score=12))
+    assert not watermarks.unchanged("reddit", _reddit_post("a", now - 60, score=40))
+    assert not watermarks.unchanged("reddit", _reddit_post("b", now - 10))
+    assert not watermarks.unchanged("mastodon", {"id": 1})
+    assert repr(watermarks.cache.get("reddit")) == state
+
+
+class _Listing:
+    """Объединённый hot-листинг из нескольких страниц вместо HTTP"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = 0
+
+    async def __call__(self, url, label):
+        page = self.pages[self.requested]
+        self.requested += 1
+        after = f"t3_{page[-1]}" if self.requested < len(self.pages) else None
+        return {"data": {"after": after, "children": [
+            {"data": {"id": post_id, "title": post_id, "subreddit": "SaaS"}} for post_id in page
+        ]}}
+
+
+def _fetch_listing(pages, known):
+    fetcher = RedditFetcher(http=object())
+    fetcher._get_json = _Listing(pages)
+    posts = asyncio.run(fetcher.get_combined_hot(["SaaS"], pages=len(pages), known=known))
+    return [post["id"] for post in posts], fetcher._get_json.requested
+
+
+def test_reddit_pagination_stops_at_page_without_news():
+    pages = [["a", "b"], ["c", "d"], ["e", "f"]]
+
+    assert _fetch_listing(pages, known=None) == (["a", "b", "c", "d", "e", "f"], 3)
+    assert _fetch_listing(pages, known=lambda post: post["id"] in {"c", "d"}) == (["a", "b", "c", "d"], 2)
+    # первая страница читается всегда
+    assert _fetch_listing(pages, known=lambda post: True) == (["a", "b"], 1)
@@ -4,16 +4,22 @@ AI-анализатор трендов
 """
 import json
 import logging
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
-from groq import Groq
-from .config import GROQ_API_KEY
+from .config import DEDUPE_ENABLED, IDEA_SCORE_WEIGHTS, LLM_MODEL, LLM_TIMEOUT, MAP_CHUNK_TOKENS
+from .dedupe import cluster_fields, collapse_duplicates, engagement_score
+from .llm import acomplete, complete
+from .llm_cache import LLMRequest, summary_items
+from .mapreduce import chunk_sections, dedupe_ideas, map_chunks, merge_texts, unique_items
+from .prompting import PROMPT_ENCODING, data_budget, encode_sections, fit_sections
+from .relevance import select_relevant
+from .repair import acontinue_json, continue_json, parse_validated
+from .schema import Field, Schema
+from .scoring import rank, score_ideas
+from .streaming import stream_items
 
 logger = logging.getLogger(__name__)
 
-# Инициализация Groq
-client = Groq(api_key=GROQ_API_KEY)
-
 
 ANALYSIS_PROMPT = """Ты эксперт по стартапам и бизнес-трендам. Проанализируй данные и найди бизнес-возможности.
 
@@ -50,59 +56,92 @@ ANALYSIS_PROMPT = """Ты эксперт по стартапам и бизнес
 Отвечай ТОЛЬКО валидным JSON, без markdown и пояснений."""
 
 
-def analyze_trends(google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
-    """
-    Анализирует собранные данные и генерирует бизнес-идеи
+ANALYSIS_SYSTEM = "Ты аналитик трендов. Отвечай только валидным JSON."
 
-    Args:
-        google_trends: Тренды из Google
-        reddit_posts: Посты из Reddit
+# Схема ответа на ANALYSIS_PROMPT
+BUSINESS_IDEA_SCHEMA = Schema({
+    "name": Field("str", required=True),
+    "description": Field("str"),
+    "target_audience": Field("str"),
+    "monetization": Field("str"),
+    "mvp_complexity": Field("str", choices=("low", "medium", "high"), default="medium"),
+    "potential_score": Field("number", bounds=(1, 10), default=5),
+})
 
-    Returns:
-        Структурированный анализ с бизнес-идеями
+TREND_SCHEMA = Schema({
+    "name": Field("str", required=True),
+    "description": Field("str"),
+    "business_idea": Field("object", items=BUSINESS_IDEA_SCHEMA),
+    "why_now": Field("str"),
+    "risks": Field("str"),
+})
+
+ANALYSIS_SCHEMA = Schema({
+    "trends": Field("list", required=True, items=Field("object", items=TREND_SCHEMA)),
+    "summary": Field("str", default=""),
+    "top_opportunity": Field("str", default=""),
+})
+
+
+def build_analysis_sections(google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict[str, List[Dict]]:
+    """
+    Собранные данные в виде разделов для модели
+
+    Почти-дубликаты сливаются (см. dedupe.py), затем items отбираются
+    и упорядочиваются локально по релевантности тематическим профилям
+    (см. relevance.py) — до любого запроса к модели.
     """
+    sources = {"google_trends": google_trends, "reddit": reddit_posts}
+    if DEDUPE_ENABLED:
+        sources = collapse_duplicates(sources)
 
-    # Готовим данные для AI
-    data_summary = {
+    ranked = select_relevant(sources)
+    google_trends = ranked["google_trends"]
+    reddit_posts = ranked["reddit"]
+
+    return {
         "google_trends": [
             {"title": t["title"], "traffic": t.get("traffic", "N/A")}
-            for t in google_trends[:20]
+            for t in google_trends
         ],
         "reddit_hot_topics": [
             {
                 "title": p["title"],
                 "subreddit": p["subreddit"],
-                "score": p["score"],
-                "comments": p["num_comments"],
-                "preview": p.get("selftext", "")[:200]
+                "score": engagement_score(p),
+                "comments": p.get("combined_comments", p["num_comments"]),
+                "preview": p.get("selftext", "")[:200],
+                **cluster_fields(p)
             }
-            for p in reddit_posts[:30]
+            for p in reddit_posts
         ]
     }
 
-    prompt = ANALYSIS_PROMPT.format(data=json.dumps(data_summary, ensure_ascii=False, indent=2))
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "Ты аналитик трендов. Отвечай только валидным JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4000,
-            temperature=0.7
-        )
+def build_analysis_summary(google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
+    """Выборка данных для одиночного запроса: столько, сколько влезает в бюджет промпта"""
+    sections = build_analysis_sections(google_trends, reddit_posts)
+    return fit_sections(sections, data_budget(ANALYSIS_PROMPT, ANALYSIS_SYSTEM))
+
+
+def build_analysis_messages(data_summary: Dict) -> List[Dict[str, str]]:
+    """Собирает сообщения для модели"""
+    prompt = ANALYSIS_PROMPT.format(data=encode_sections(data_summary))
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM},
+        {"role": "user", "content": prompt}
+    ]
 
-        result_text = response.choices[0].message.content
 
-        # Пытаемся распарсить JSON
-        # Иногда модель добавляет ```json в начале
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0]
-        elif "```" in result_text:
-            result_text = result_text.split("```")[1].split("```")[0]
+def _analysis_request(data_summary: Dict) -> LLMRequest:
+    """Адрес запроса в LLM-кэше"""
+    return LLMRequest(LLM_MODEL, 0.7, PROMPT_ENCODING + ANALYSIS_PROMPT, data_summary, summary_items(data_summary))
 
-        analysis = json.loads(result_text.strip())
+
+def _parse_analysis(result_text: str, google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
+    """Разбирает ответ модели в анализ (или в словарь с ошибкой)"""
+    try:
+        analysis = parse_validated(result_text, ANALYSIS_SCHEMA)
         analysis["analyzed_at"] = datetime.now().isoformat()
         analysis["data_sources"] = {
             "google_trends_count": len(google_trends),
@@ -122,45 +161,162 @@ def analyze_trends(google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
         }
 
     except Exception as e:
-        logger.error(f"Ошибка анализа: {e}")
-        return {
-            "error": str(e),
-            "analyzed_at": datetime.now().isoformat()
-        }
+        return _analysis_error(e)
 
 
-def score_idea(idea: Dict) -> float:
+def _analysis_error(e: Exception) -> Dict:
+    message = str(e) or type(e).__name__  # у TimeoutError пустой текст
+    logger.error(f"Ошибка анализа: {message}")
+    return {
+        "error": message,
+        "analyzed_at": datetime.now().isoformat()
+    }
+
+
+def analyze_trends(google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
     """
-    Рассчитывает итоговый скор бизнес-идеи
+    Анализирует собранные данные и генерирует бизнес-идеи
 
     Args:
-        idea: Данные бизнес-идеи
+        google_trends: Тренды из Google
+        reddit_posts: Посты из Reddit
 
     Returns:
-        Числовой скор от 0 до 100
+        Структурированный анализ с бизнес-идеями
     """
-    score = 0
+    data_summary = build_analysis_summary(google_trends, reddit_posts)
+    messages = build_analysis_messages(data_summary)
 
-    # Базовый потенциал от AI (0-10 -> 0-40)
-    potential = idea.get("potential_score", 5)
-    score += potential * 4
+    request = _analysis_request(data_summary)
 
-    # Бонус за низкую сложность MVP
-    complexity = idea.get("mvp_complexity", "medium")
-    if complexity == "low":
-        score += 30
-    elif complexity == "medium":
-        score += 15
+    try:
+        result_text = complete(messages, max_tokens=4000, temperature=0.7, cache_request=request)
+        result_text = continue_json(messages, result_text, cache_request=request)
+    except Exception as e:
+        return _analysis_error(e)
 
-    # Бонус за понятную монетизацию
-    if idea.get("monetization") and len(idea["monetization"]) > 10:
-        score += 15
+    return _parse_analysis(result_text, google_trends, reddit_posts)
 
-    # Бонус за конкретную целевую аудиторию
-    if idea.get("target_audience") and len(idea["target_audience"]) > 10:
-        score += 15
 
-    return min(score, 100)
+async def analyze_trends_async(
+    google_trends: List[Dict],
+    reddit_posts: List[Dict],
+    timeout: Optional[float] = LLM_TIMEOUT,
+    on_idea: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    Асинхронная версия analyze_trends: ждёт модель, не блокируя event loop
+
+    В отличие от синхронной версии, анализирует все собранные данные:
+    если они не помещаются в один запрос, работает map-reduce —
+    куски анализируются параллельно, а тренды сливаются без повторов.
+
+    Args:
+        google_trends: Тренды из Google
+        reddit_posts: Посты из Reddit
+        timeout: Сколько секунд ждать ответа модели
+        on_idea: Вызывается для каждой бизнес-идеи (со скором) сразу,
+            как модель её допишет — ещё до конца ответа
+
+    Returns:
+        Структурированный анализ с бизнес-идеями
+    """
+    emit = _trend_emitter(on_idea) if on_idea is not None else None
+
+    chunks = chunk_sections(
+        build_analysis_sections(google_trends, reddit_posts),
+        budget=min(MAP_CHUNK_TOKENS, data_budget(ANALYSIS_PROMPT, ANALYSIS_SYSTEM))
+    )
+    if len(chunks) > 1:
+        partials = await map_chunks(
+            chunks, build_analysis_messages, _analysis_request, timeout,
+            stream_key="trends", on_item=emit, schema=ANALYSIS_SCHEMA
+        )
+        return _reduce_analyses(partials, google_trends, reddit_posts)
+
+    data_summary = chunks[0] if chunks else {}
+    messages = build_analysis_messages(data_summary)
+    request = _analysis_request(data_summary)
+
+    try:
+        if emit is not None:
+            result_text = await stream_items(messages, "trends", emit, timeout=timeout, cache_request=request)
+        else:
+            result_text = await acomplete(
+                messages, max_tokens=4000, temperature=0.7, timeout=timeout, cache_request=request
+            )
+        result_text = await acontinue_json(messages, result_text, timeout=timeout, cache_request=request)
+    except Exception as e:
+        return _analysis_error(e)
+
+    return _parse_analysis(result_text, google_trends, reddit_posts)
+
+
+def _trend_emitter(on_idea: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    """Обработчик потока трендов: отдаёт их бизнес-идеи со скором, без повторов"""
+    def emit(trend: Dict):
+        trend, _ = TREND_SCHEMA.validate(trend)
+        idea = _trend_idea(trend) if trend else None
+        if idea:
+            idea["final_score"] = score_idea(idea)
+            on_idea(idea)
+
+    return unique_items(emit, text_of=lambda t: f"{t.get('name', '')} {(t.get('business_idea') or {}).get('name', '')}")
+
+
+def _potential(trend: Dict) -> float:
+    try:
+        return float((trend.get("business_idea") or {}).get("potential_score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _reduce_analyses(partials: List[Optional[Dict]], google_trends: List[Dict], reddit_posts: List[Dict]) -> Dict:
+    """Шаг reduce: сливает анализы отдельных кусков в один"""
+    succeeded = [partial for partial in partials if partial]
+    if not succeeded:
+        return _analysis_error(RuntimeError("ни один кусок map-reduce не проанализирован"))
+
+    trends = dedupe_ideas(
+        (t for partial in succeeded for t in partial.get("trends", []) if isinstance(t, dict)),
+        text_of=lambda t: f"{t.get('name', '')} {(t.get('business_idea') or {}).get('name', '')}",
+        score_of=_potential
+    )
+    # Главная возможность — из куска, где нашёлся самый сильный тренд
+    best = max(succeeded, key=lambda partial: max(
+        (_potential(t) for t in partial.get("trends", []) if isinstance(t, dict)), default=0
+    ))
+
+    analysis = {
+        "trends": trends,
+        "summary": merge_texts(succeeded, "summary"),
+        "top_opportunity": best.get("top_opportunity", ""),
+        "analyzed_at": datetime.now().isoformat(),
+        "data_sources": {
+            "google_trends_count": len(google_trends),
+            "reddit_posts_count": len(reddit_posts)
+        },
+        "map_reduce": {"chunks": len(partials), "failed": len(partials) - len(succeeded)}
+    }
+
+    logger.info(f"Анализ завершён: {len(trends)} трендов из {len(succeeded)}/{len(partials)} кусков")
+    return analysis
+
+
+def score_idea(idea: Dict) -> float:
+    """
+    Рассчитывает итоговый скор бизнес-идеи
+
+    Формула — веса IDEA_SCORE_WEIGHTS (см. config.py): потенциал,
+    сложность MVP, понятная монетизация и конкретная аудитория.
+
+    Args:
+        idea: Данные бизнес-идеи
+
+    Returns:
+        Числовой скор от 0 до 100
+    """
+    return score_ideas([idea], IDEA_SCORE_WEIGHTS)[0]
 
 
 def rank_ideas(analysis: Dict) -> List[Dict]:
@@ -173,16 +329,15 @@ def rank_ideas(analysis: Dict) -> List[Dict]:
     Returns:
         Список идей, отсортированный по скору
     """
-    ranked = []
-
-    for trend in analysis.get("trends", []):
-        idea = trend.get("business_idea", {})
-        if idea:
-            idea["trend_name"] = trend.get("name")
-            idea["why_now"] = trend.get("why_now")
-            idea["risks"] = trend.get("risks")
-            idea["final_score"] = score_idea(idea)
-            ranked.append(idea)
-
-    ranked.sort(key=lambda x: x["final_score"], reverse=True)
-    return ranked
+    ideas = [_trend_idea(trend) for trend in analysis.get("trends", [])]
+    return rank([idea for idea in ideas if idea], IDEA_SCORE_WEIGHTS)
+
+
+def _trend_idea(trend: Dict) -> Dict:
+    """Бизнес-идея тренда с полями самого тренда (пустой словарь, если идеи нет)"""
+    idea = trend.get("business_idea") or {}
+    if idea:
+        idea["trend_name"] = trend.get("name")
+        idea["why_now"] = trend.get("why_now")
+        idea["risks"] = trend.get("risks")
+    return idea
@@ -0,0 +1,142 @@
+"""
+Простой файловый кэш - словарь ключ -> значение в JSON с TTL
+и необязательным ограничением размера (вытеснение LRU)
+"""
+import os
+import json
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JsonFileCache:
+    """
+    Кэш в одном JSON-файле
+
+    Файл читается лениво при первом обращении и пишется целиком
+    в save() (через временный файл, чтобы не оставить его битым).
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        """
+        Args:
+            path: Путь к JSON-файлу кэша
+            ttl: Время жизни записи в секундах (None — бессрочно)
+            max_entries: Максимум записей; сверх него вытесняются давно
+                не читавшиеся (None — без ограничения)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict] = {}
+        self._loaded = False
+        self._dirty = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша {self.path}: {e}")
+            self._entries = {}
+
+    def _expired(self, entry: Dict, now: float) -> bool:
+        return self.ttl is not None and now - entry.get("stored_at", 0) > self.ttl
+
+    def get_entry(self, key: str) -> Optional[Dict]:
+        """
+        Возвращает запись целиком: {"value": ..., "stored_at": ts}
+
+        Просроченные записи не возвращаются.
+        """
+        self._load()
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None or self._expired(entry, now):
+            return None
+        if self.max_entries is not None:
+            entry["used_at"] = now
+            self._dirty = True
+        return entry
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Возвращает значение по ключу или default"""
+        entry = self.get_entry(key)
+        return entry["value"] if entry is not None else default
+
+    def set(self, key: str, value: Any):
+        """Сохраняет значение (в память; на диск — в save())"""
+        self._load()
+        now = time.time()
+        self._entries[key] = {"value": value, "stored_at": now}
+        if self.max_entries is not None:
+            self._entries[key]["used_at"] = now
+            self._evict()
+        self._dirty = True
+
+    def _evict(self):
+        """Удаляет просроченные, затем давно не читавшиеся записи сверх лимита"""
+        if len(self._entries) <= self.max_entries:
+            return
+        self.prune()
+        overflow = len(self._entries) - self.max_entries
+        if overflow <= 0:
+            return
+        def last_used(key: str) -> float:
+            entry = self._entries[key]
+            return entry.get("used_at", entry.get("stored_at", 0))
+
+        for key in sorted(self._entries, key=last_used)[:overflow]:
+            del self._entries[key]
+
+    def entries(self) -> Iterator[Tuple[str, Dict]]:
+        """Перебирает непросроченные записи (ключ, запись)"""
+        self._load()
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            if not self._expired(entry, now):
+                yield key, entry
+
+    def delete(self, key: str):
+        """Удаляет запись"""
+        self._load()
+        if self._entries.pop(key, None) is not None:
+            self._dirty = True
+
+    def prune(self):
+        """Удаляет все просроченные записи"""
+        self._load()
+        now = time.time()
+        expired = [key for key, entry in self._entries.items() if self._expired(entry, now)]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._dirty = True
+
+    def save(self):
+        """Записывает кэш на диск, если он менялся"""
+        if not self._dirty:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self._entries)
@@ -8,6 +8,9 @@ load_dotenv()
 
 # API ключи
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+LLM_MODEL = os.getenv('LLM_MODEL', 'llama-3.3-70b-versatile')
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '90'))        # секунд на один ответ модели
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
 
 # Reddit API (опционально, можно парсить без API)
 REDDIT_CLIENT_ID = os.getenv('REDDIT_CLIENT_ID', '')
@@ -31,10 +34,163 @@ SUBREDDITS = [
     "indiehackers"
 ]
 
+# Поисковые запросы к Reddit
+REDDIT_SEARCH_KEYWORDS = ["startup idea", "business idea", "side project", "saas idea"]
+
 # Пути к файлам
 DATA_DIR = "trend_hunter/data"
 TRENDS_FILE = f"{DATA_DIR}/trends.json"
 IDEAS_FILE = f"{DATA_DIR}/business_ideas.json"
+CACHE_DIR = f"{DATA_DIR}/cache"
+IDEA_INDEX_FILE = f"{DATA_DIR}/idea_index.json"
 
 # Расписание (cron формат для ежедневного запуска)
 SCHEDULE_TIME = "09:00"  # Утренняя сводка
+
+# HTTP-клиент источников (общий пул соединений на весь запуск)
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', '30'))      # секунд на весь запрос
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))  # секунд на установку соединения
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))   # всего соединений в пуле
+HTTP_MAX_PER_HOST = int(os.getenv('HTTP_MAX_PER_HOST', '10'))          # соединений на один хост
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))       # секунд кэша DNS
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '30'))  # секунд жизни простаивающего соединения
+
+# Лимиты частоты запросов по хостам: хост -> (запросов в секунду, размер пачки)
+HOST_RATE_LIMITS = {
+    "trends.google.com": (2.0, 4),
+    "www.producthunt.com": (2.0, 3),
+}
+
+# Регионы Google Trends, которые опрашиваются вместе с основным
+GOOGLE_TRENDS_EXTRA_GEOS = [
+    g.strip() for g in os.getenv('GOOGLE_TRENDS_EXTRA_GEOS', 'GB,DE').split(',') if g.strip()
+]
+
+# Reddit: параллельность и повторы при 429
+REDDIT_MAX_CONCURRENCY = int(os.getenv('REDDIT_MAX_CONCURRENCY', '4'))
+REDDIT_MAX_RETRIES = int(os.getenv('REDDIT_MAX_RETRIES', '3'))
+REDDIT_BATCH_SIZE = int(os.getenv('REDDIT_BATCH_SIZE', '10'))          # сабреддитов в одном r/a+b+c
+REDDIT_LISTING_PAGES = int(os.getenv('REDDIT_LISTING_PAGES', '3'))     # страниц по курсору after
+# Читать сабреддиты объединёнными листингами r/a+b+c с пагинацией (меньше запросов, больше постов)
+REDDIT_BATCHED = os.getenv('REDDIT_BATCHED', '').lower() in ('1', 'true', 'yes')
+
+# HackerNews: кэш items между запусками
+HN_CACHE_FILE = f"{CACHE_DIR}/hn_items.json"
+HN_ITEM_TTL = int(os.getenv('HN_ITEM_TTL', str(7 * 24 * 3600)))     # секунд жизни тела item
+HN_HOT_WINDOW = int(os.getenv('HN_HOT_WINDOW', str(24 * 3600)))     # пока история моложе — её метрики растут
+HN_METRICS_TTL = int(os.getenv('HN_METRICS_TTL', str(30 * 60)))     # как часто обновлять score/comments горячих
+HN_MAX_CONCURRENCY = int(os.getenv('HN_MAX_CONCURRENCY', '10'))     # одновременных запросов items
+HN_UPDATES_MAX_GAP = int(os.getenv('HN_UPDATES_MAX_GAP', '600'))    # дольше — лента updates уже не покрывает паузу
+
+# RSS-фиды: кэш для условных GET (ETag / Last-Modified)
+FEED_CACHE_TTL = int(os.getenv('FEED_CACHE_TTL', str(24 * 3600)))
+GOOGLE_TRENDS_FEED_CACHE = f"{CACHE_DIR}/feeds_google_trends.json"
+PRODUCTHUNT_FEED_CACHE = f"{CACHE_DIR}/feeds_producthunt.json"
+
+# Повторы и circuit breaker для HTTP-запросов источников
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))                      # повторов идемпотентного GET
+HTTP_RETRY_BASE_DELAY = float(os.getenv('HTTP_RETRY_BASE_DELAY', '0.5'))
+HTTP_RETRY_MAX_DELAY = float(os.getenv('HTTP_RETRY_MAX_DELAY', '8'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))  # ошибок подряд до отключения хоста
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '60'))      # секунд до пробного запроса
+
+# Кассеты: запись / воспроизведение HTTP-обменов источников
+HTTP_CASSETTE_MODE = os.getenv('HTTP_CASSETTE_MODE', '')          # '' / record / replay
+HTTP_CASSETTE_PATH = os.getenv('HTTP_CASSETTE_PATH', f"{DATA_DIR}/cassettes/default.json.gz")
+HTTP_CASSETTE_LATENCY_SCALE = float(os.getenv('HTTP_CASSETTE_LATENCY_SCALE', '0'))  # 1 — как при записи
+
+# Инкрементальный сбор ("с прошлого запуска")
+INCREMENTAL_COLLECTION = os.getenv('INCREMENTAL_COLLECTION', '').lower() in ('1', 'true', 'yes')
+WATERMARKS_FILE = f"{CACHE_DIR}/watermarks.json"
+WATERMARK_MIN_CHANGE = float(os.getenv('WATERMARK_MIN_CHANGE', '0.1'))   # доля изменения метрики, чтобы item отдался снова
+WATERMARK_RETENTION = int(os.getenv('WATERMARK_RETENTION', str(3 * 24 * 3600)))
+
+# Кэш ответов LLM
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+LLM_CACHE_FILE = f"{CACHE_DIR}/llm_responses.json"
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '200'))
+LLM_CACHE_MIN_OVERLAP = float(os.getenv('LLM_CACHE_MIN_OVERLAP', '0'))  # 0.8 — переиспользовать при 80% совпадения items
+
+# Общий для процессов журнал расхода LLM-бюджета (боты + trend_hunter)
+LLM_BUDGET_FILE = f"{CACHE_DIR}/llm_budget.json"
+LLM_BUDGET_SHARED = os.getenv('LLM_BUDGET_SHARED', '1').lower() in ('1', 'true', 'yes')
+
+# Map-reduce анализ всего собранного набора
+MAP_CHUNK_TOKENS = int(os.getenv('MAP_CHUNK_TOKENS', '3000'))     # данных в одном запросе
+MAP_MAX_CHUNKS = int(os.getenv('MAP_MAX_CHUNKS', '6'))            # больше — хвост по приоритету отбрасывается
+MAP_CONCURRENCY = int(os.getenv('MAP_CONCURRENCY', '3'))
+
+# Общий минутный бюджет LLM для ботов и анализа (см. scheduler.py)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '30'))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', '12000'))  # лимит ключа (Groq free, llama-3.3-70b); 0 — без лимита
+LLM_INTERACTIVE_RESERVE = float(os.getenv('LLM_INTERACTIVE_RESERVE', '0.2'))  # доля бюджета только для ботов
+
+# Бюджет промпта (шаблон + данные), токенов
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '6000'))
+LLM_CONTEXT_TOKENS = int(os.getenv('LLM_CONTEXT_TOKENS', '131072'))  # окно контекста модели
+
+# Оборванный ответ модели: дозапрос только недостающего хвоста JSON
+LLM_CONTINUATION_TOKENS = int(os.getenv('LLM_CONTINUATION_TOKENS', '1500'))
+LLM_MAX_CONTINUATIONS = int(os.getenv('LLM_MAX_CONTINUATIONS', '1'))    # 0 — только спасать готовые идеи
+
+# Провайдеры LLM: groq, openai (любой OpenAI-совместимый API), stub (локальная заглушка)
+# Порядок — приоритет, пока провайдеры не замерены или равны по задержке
+LLM_PROVIDERS = [name.strip() for name in os.getenv('LLM_PROVIDERS', 'groq').split(',') if name.strip()]
+LLM_OPENAI_BASE_URL = os.getenv('LLM_OPENAI_BASE_URL', 'https://api.openai.com/v1')
+LLM_OPENAI_API_KEY = os.getenv('LLM_OPENAI_API_KEY', '')
+LLM_OPENAI_MODEL = os.getenv('LLM_OPENAI_MODEL', 'gpt-4o-mini')
+LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY', '0'))            # секунд на ответ заглушки
+LLM_STUB_FAILURE_RATE = float(os.getenv('LLM_STUB_FAILURE_RATE', '0'))  # доля имитированных ошибок
+LLM_STATS_WINDOW = int(os.getenv('LLM_STATS_WINDOW', '20'))             # запросов в скользящей статистике
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', '30'))             # до первых замеров провайдера
+LLM_HEDGE_MIN_DELAY = float(os.getenv('LLM_HEDGE_MIN_DELAY', '3'))      # дублировать не раньше, даже если p90 меньше
+
+# Локальный отбор релевантных items до LLM (BM25 по тематическим профилям)
+# Ключи — SEARCH_CATEGORIES, значения — слова профиля (в нижнем регистре)
+RELEVANCE_PROFILES = {
+    "SaaS": ["saas", "software", "subscription", "b2b", "platform", "api", "mvp", "startup", "startups",
+             "customers", "pricing", "mrr", "arr", "churn", "tool", "tools", "app", "apps", "product"],
+    "AI tools": ["ai", "llm", "llms", "gpt", "chatgpt", "openai", "claude", "gemini", "agent", "agents",
+                 "model", "models", "machine-learning", "ml", "copilot", "prompt", "rag"],
+    "automation": ["automation", "automate", "automated", "automating", "workflow", "workflows", "zapier",
+                   "n8n", "bot", "bots", "scraper", "scraping", "integration", "integrations", "pipeline"],
+    "productivity": ["productivity", "productive", "task", "tasks", "calendar", "notes", "focus", "todo",
+                     "time", "meeting", "meetings", "notion", "organize", "habit"],
+    "fintech": ["fintech", "payments", "payment", "invoice", "invoicing", "accounting", "bank", "banking",
+                "finance", "stripe", "budget", "tax", "taxes", "crypto"],
+    "health tech": ["health", "healthcare", "medical", "fitness", "wellness", "mental", "therapy",
+                    "clinic", "patients", "sleep", "nutrition"],
+    "e-commerce": ["e-commerce", "ecommerce", "shopify", "store", "shop", "dropshipping", "amazon",
+                   "etsy", "inventory", "checkout", "marketplace", "sellers"],
+    "no-code": ["no-code", "nocode", "low-code", "lowcode", "bubble", "webflow", "airtable", "builder",
+                "template", "templates"],
+}
+RELEVANCE_TOP_K = int(os.getenv('RELEVANCE_TOP_K', '300'))                  # items всех источников в анализ
+RELEVANCE_MIN_PER_SOURCE = int(os.getenv('RELEVANCE_MIN_PER_SOURCE', '5'))  # лучших из каждого источника — всегда
+
+# Слияние почти-дубликатов между источниками (MinHash + LSH)
+DEDUPE_ENABLED = os.getenv('DEDUPE_ENABLED', '1').lower() in ('1', 'true', 'yes')
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.5'))  # оценка Жаккара по шинглам, чтобы считать items одним
+
+# Индекс идей между отчётами: доля общих слов (name/problem/audience), чтобы считать идеи одной
+IDEA_MATCH_THRESHOLD = float(os.getenv('IDEA_MATCH_THRESHOLD', '0.6'))
+
+# Веса итогового скора идей (признаки — см. scoring.FEATURES); сумма обрезается до 100
+IDEA_SCORE_WEIGHTS = {
+    "potential": 4,            # potential_score 1-10 → 0-40
+    "complexity_low": 30,
+    "complexity_medium": 15,
+    "has_monetization": 15,    # монетизация описана (> 10 символов)
+    "has_audience": 15,        # аудитория конкретна (> 10 символов)
+}
+SAAS_SCORE_WEIGHTS = {
+    "potential": 4,
+    "complexity_low": 30,
+    "complexity_medium": 15,
+    "market_large": 15,
+    "market_medium": 10,
+    "market_small": 5,
+    "has_differentiation": 15,  # отличие описано (> 20 символов)
+}
@@ -0,0 +1,241 @@
+"""
+Слияние почти-дубликатов между источниками
+
+Один и тот же запуск часто приходит как Show HN, продукт на
+Product Hunt и несколько тредов на Reddit. Точная дедупликация
+(по title / id / url) их не ловит, поэтому items сравниваются по
+MinHash-сигнатурам байтовых 4-грамм заголовка, а кандидаты в пары
+ищутся LSH-бандингом — без сравнения всех пар, почти линейно по
+числу items.
+
+Кластер почти-дубликатов сворачивается в один item (с наибольшей
+вовлечённостью), который несёт суммарные метрики всех участников
+и список источников, где тема всплыла.
+"""
+import re
+import time
+from typing import Callable, Dict, List, Tuple
+import logging
+
+import numpy as np
+
+from .config import DEDUPE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Текст, по которому сравниваются items источника
+SOURCE_TEXT: Dict[str, Callable[[Dict], str]] = {
+    "google_trends": lambda t: t.get("title") or "",
+    "reddit": lambda p: p.get("title") or "",
+    "hackernews": lambda h: h.get("title") or "",
+    "producthunt": lambda p: f"{p.get('name') or ''} {p.get('tagline') or ''}",
+}
+
+# Поля вовлечённости источника: (очки, комментарии)
+ENGAGEMENT_FIELDS: Dict[str, Tuple[str, str]] = {
+    "reddit": ("score", "num_comments"),
+    "hackernews": ("score", "comments"),
+}
+
+_PREFIX_RE = re.compile(r"^\s*(show|launch|ask|tell)\s+hn\s*[:\-–—]\s*", re.IGNORECASE)
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+_SHIFT = np.uint64(32)
+
+
+def normalize(text: str) -> str:
+    """Текст для шинглов: без "Show HN:", пунктуации и регистра"""
+    text = _PREFIX_RE.sub("", text or "")
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+class MinHashLSH:
+    """
+    MinHash по байтовым 4-граммам и LSH-бандинг
+
+    `num_perm` хэш-функций вида (a·x + b) mod 2^64 >> 32 дают
+    сигнатуру; она режется на `bands` полос, items с совпавшей
+    полосой — кандидаты. Кандидат принимается, если доля совпавших
+    позиций сигнатур (оценка Жаккара) не меньше `threshold`.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = DEDUPE_THRESHOLD, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm должно делиться на bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.band_mix = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+
+    def signatures(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Сигнатуры текстов
+
+        Returns:
+            (индексы текстов, у которых есть хотя бы одна 4-грамма;
+             матрица сигнатур этих текстов, num_perm столбцов)
+        """
+        encoded = [text.encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(e) + 1 for e in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"\n".join(encoded) + b"\n", dtype=np.uint8).astype(np.uint32)
+        if len(data) < 4:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.num_perm), dtype=np.uint32)
+
+        grams = (data[:-3] << 24) | (data[1:-2] << 16) | (data[2:-1] << 8) | data[3:]
+
+        # 4-грамма не должна пересекать границу между текстами
+        separators = np.concatenate(([0], np.cumsum(data == ord("\n"))))
+        valid = separators[4:] == separators[:-4]
+        positions = np.flatnonzero(valid)
+        grams = grams[positions].astype(np.uint64)
+
+        owners = np.searchsorted(np.cumsum(lengths), positions, side="right")
+        if len(owners) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.num_perm), dtype=np.uint32)
+
+        starts = np.flatnonzero(np.concatenate(([True], owners[1:] != owners[:-1])))
+        signatures = np.empty((len(starts), self.num_perm), dtype=np.uint32)
+        hashed = np.empty_like(grams)
+        for i in range(self.num_perm):
+            np.multiply(grams, self.a[i], out=hashed)
+            np.add(hashed, self.b[i], out=hashed)
+            np.right_shift(hashed, _SHIFT, out=hashed)
+            signatures[:, i] = np.minimum.reduceat(hashed, starts)
+        return owners[starts], signatures
+
+    def pairs(self, signatures: np.ndarray) -> np.ndarray:
+        """Пары почти-дубликатов (индексы строк сигнатур), shape (k, 2)"""
+        found = []
+        for band in range(self.bands):
+            block = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys = (block * self.band_mix).sum(axis=1)
+
+            order = np.argsort(keys, kind="stable")
+            sorted_keys = keys[order]
+            group_start = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+            # Каждый участник корзины сравнивается с её первым элементом
+            heads = order[np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))]
+            members = ~group_start
+            if members.any():
+                found.append(np.stack((heads[members], order[members]), axis=1))
+
+        if not found:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        candidates = np.unique(np.concatenate(found), axis=0)
+        similarity = (signatures[candidates[:, 0]] == signatures[candidates[:, 1]]).mean(axis=1)
+        return candidates[similarity >= self.threshold]
+
+    def clusters(self, texts: List[str]) -> List[List[int]]:
+        """Группы индексов почти-дубликатов (только группы из 2+ текстов)"""
+        owners, signatures = self.signatures(texts)
+        parent = list(range(len(owners)))
+
+        def root(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for left, right in self.pairs(signatures).tolist():
+            left, right = root(left), root(right)
+            if left != right:
+                parent[max(left, right)] = min(left, right)
+
+        groups: Dict[int, List[int]] = {}
+        for row, owner in enumerate(owners.tolist()):
+            groups.setdefault(root(row), []).append(owner)
+        return [group for group in groups.values() if len(group) > 1]
+
+
+def _engagement(source: str, item: Dict) -> Tuple[int, int]:
+    fields = ENGAGEMENT_FIELDS.get(source)
+    if not fields:
+        return 0, 0
+    score, comments = (item.get(field) or 0 for field in fields)
+    try:
+        return int(score), int(comments)
+    except (TypeError, ValueError):
+        return 0, 0
+
+
+def collapse_duplicates(
+    sources: Dict[str, List[Dict]],
+    threshold: float = DEDUPE_THRESHOLD,
+    lsh: MinHashLSH = None
+) -> Dict[str, List[Dict]]:
+    """
+    Сворачивает почти-дубликаты всех источников
+
+    В каждом кластере остаётся item с наибольшими очками (при
+    равенстве — первый), на своём месте в своём источнике. Его копия
+    получает поля:
+        seen_on           — источники всех участников кластера
+        duplicates        — сколько items слито в него
+        combined_score    — сумма очков всех участников
+        combined_comments — сумма комментариев
+
+    Returns:
+        Те же источники без слитых items
+    """
+    started = time.perf_counter()
+    lsh = lsh or MinHashLSH(threshold=threshold)
+
+    flat: List[Tuple[str, int]] = []
+    texts: List[str] = []
+    for name, items in sources.items():
+        text_of = SOURCE_TEXT.get(name, lambda item: item.get("title") or "")
+        for index, item in enumerate(items or []):
+            flat.append((name, index))
+            texts.append(normalize(text_of(item)))
+
+    replaced: Dict[Tuple[str, int], Dict] = {}
+    dropped = set()
+
+    for cluster in lsh.clusters(texts):
+        members = [flat[i] for i in cluster]
+        engagement = [_engagement(name, sources[name][index]) for name, index in members]
+        keeper = max(range(len(members)), key=lambda i: (engagement[i][0], -cluster[i]))
+
+        name, index = members[keeper]
+        item = dict(sources[name][index])
+        item["seen_on"] = sorted({source for source, _ in members})
+        item["duplicates"] = len(members) - 1
+        item["combined_score"] = sum(score for score, _ in engagement)
+        item["combined_comments"] = sum(comments for _, comments in engagement)
+
+        replaced[members[keeper]] = item
+        dropped.update(member for i, member in enumerate(members) if i != keeper)
+
+    collapsed = {
+        name: [
+            replaced.get((name, index), item)
+            for index, item in enumerate(items or [])
+            if (name, index) not in dropped
+        ]
+        for name, items in sources.items()
+    }
+
+    if dropped:
+        logger.info(
+            f"Дубликаты: {len(dropped)} items слиты в {len(replaced)} кластеров "
+            f"({(time.perf_counter() - started) * 1000:.1f} мс)"
+        )
+    return collapsed
+
+
+def cluster_fields(item: Dict) -> Dict:
+    """Поля кластера для строки промпта (пусто, если item ни с чем не слит)"""
+    if not item.get("duplicates"):
+        return {}
+    return {"seen_on": item.get("seen_on", []), "mentions": item["duplicates"] + 1}
+
+
+def engagement_score(item: Dict):
+    """Очки item с учётом слитых в него дубликатов"""
+    return item.get("combined_score", item.get("score"))
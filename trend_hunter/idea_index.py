@@ -0,0 +1,215 @@
+"""
+Индекс идей между отчётами
+
+Модель день за днём генерирует почти одинаковые идеи. Индекс
+хранит по одной канонической идее на группу похожих: отпечаток
+(нормализованные слова name / problem / target_audience), даты
+первого и последнего появления и число отчётов, в которых она была.
+Обновляется при каждом save_daily_report, так что список идей —
+это чтение одного файла, а не обход всех report_*.json.
+"""
+import hashlib
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+
+from .cache import JsonFileCache
+from .config import IDEA_INDEX_FILE, IDEA_MATCH_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Поля, по которым идеи сравниваются. Длинное description не участвует:
+# шаблонные фразы в нём сближают совсем разные идеи
+IDEA_TEXT_FIELDS = ("name", "problem", "target_audience")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def idea_words(idea: Dict) -> List[str]:
+    """Нормализованные слова идеи (без регистра, пунктуации и коротких слов)"""
+    text = " ".join(str(idea.get(field) or "") for field in IDEA_TEXT_FIELDS)
+    return sorted({word for word in _WORD_RE.findall(text.lower()) if len(word) > 2})
+
+
+def fingerprint(words: Iterable[str]) -> str:
+    """Отпечаток идеи: хэш её нормализованных слов"""
+    return hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()[:16]
+
+
+def _score(idea: Dict) -> float:
+    try:
+        return float(idea.get("final_score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class IdeaIndex:
+    """
+    Канонические идеи всех отчётов
+
+    Похожая идея ищется сначала по точному отпечатку, затем по
+    словарю слово -> идеи: сравниваются только идеи с общими
+    словами, а не весь индекс. Идеи считаются одной, если доля
+    общих слов (Жаккар) не меньше `threshold`. Идеи одного отчёта
+    разные по определению и между собой не сливаются. Канонической
+    остаётся версия с наибольшим final_score.
+    """
+
+    def __init__(self, path: str = IDEA_INDEX_FILE, threshold: float = IDEA_MATCH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.store = JsonFileCache(path)
+        self._by_fingerprint: Optional[Dict[str, str]] = None
+        self._by_word: Dict[str, Set[str]] = {}
+
+    def _lookups(self):
+        if self._by_fingerprint is not None:
+            return
+        self._by_fingerprint = {}
+        for key, entry in self.store.entries():
+            value = entry["value"]
+            # Слова — по текущим IDEA_TEXT_FIELDS, даже если индекс строился по другим
+            value["words"] = idea_words(value["idea"])
+            self._register(key, value)
+
+    def _register(self, key: str, value: Dict):
+        for digest in value.get("fingerprints", []):
+            self._by_fingerprint[digest] = key
+        for word in value.get("words", []):
+            self._by_word.setdefault(word, set()).add(key)
+
+    def match(self, idea: Dict, date: Optional[str] = None) -> Optional[str]:
+        """
+        Ключ канонической идеи, на которую похожа `idea` (или None)
+
+        Args:
+            date: Дата отчёта идеи — похожие идеи того же отчёта не
+                подходят (точный отпечаток — та же идея, добавленная снова)
+        """
+        self._lookups()
+        words = idea_words(idea)
+        exact = self._by_fingerprint.get(fingerprint(words))
+        if exact is not None:
+            return exact
+
+        words_set = set(words)
+        candidates: Set[str] = set()
+        for word in words_set:
+            candidates |= self._by_word.get(word, set())
+
+        best_key, best_overlap = None, 0.0
+        for key in candidates:
+            value = self.store.get(key)
+            if date is not None and date in value["dates"]:
+                continue
+            other = set(value["words"])
+            overlap = len(words_set & other) / len(words_set | other)
+            if overlap > best_overlap:
+                best_key, best_overlap = key, overlap
+        return best_key if best_overlap >= self.threshold else None
+
+    def add(self, idea: Dict, date: str) -> bool:
+        """
+        Добавляет идею из отчёта за `date`
+
+        Returns:
+            True, если идея новая (не слилась с уже известной)
+        """
+        words = idea_words(idea)
+        digest = fingerprint(words)
+        key = self.match(idea, date)
+
+        if key is None:
+            value = {
+                "idea": idea,
+                "words": words,
+                "fingerprints": [digest],
+                "first_seen": date,
+                "last_seen": date,
+                "dates": [date],
+            }
+            self.store.set(digest, value)
+            self._register(digest, value)
+            return True
+
+        value = self.store.get(key)
+        if date not in value["dates"]:
+            value["dates"] = sorted(value["dates"] + [date])
+            value["first_seen"] = value["dates"][0]
+            value["last_seen"] = value["dates"][-1]
+        if digest not in value["fingerprints"]:
+            value["fingerprints"].append(digest)
+        if _score(idea) > _score(value["idea"]):
+            value["idea"] = idea
+            value["words"] = words
+
+        self.store.set(key, value)
+        self._register(key, value)
+        return False
+
+    def add_report(self, date: str, ideas: List[Dict]) -> Dict[str, int]:
+        """
+        Добавляет идеи отчёта и сохраняет индекс
+
+        Повторное добавление отчёта за ту же дату не увеличивает
+        счётчики появлений.
+        """
+        new = sum(self.add(idea, date) for idea in ideas if isinstance(idea, dict))
+        self.save()
+        logger.info(f"Индекс идей: {new} новых, {len(ideas) - new} уже известных, всего {len(self)}")
+        return {"new": new, "merged": len(ideas) - new}
+
+    def dates(self) -> Set[str]:
+        """Даты отчётов, идеи которых уже в индексе"""
+        return {date for _, entry in self.store.entries() for date in entry["value"]["dates"]}
+
+    def ideas(self, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Канонические идеи по убыванию скора
+
+        Каждая — копия последней лучшей версии с полями first_seen,
+        last_seen, occurrences (в скольких отчётах была) и
+        report_date (= last_seen).
+        """
+        ideas = []
+        for _, entry in self.store.entries():
+            value = entry["value"]
+            idea = dict(value["idea"])
+            idea["first_seen"] = value["first_seen"]
+            idea["last_seen"] = value["last_seen"]
+            idea["report_date"] = value["last_seen"]
+            idea["occurrences"] = len(value["dates"])
+            ideas.append(idea)
+
+        ideas.sort(key=lambda idea: (_score(idea), idea["occurrences"], idea["last_seen"]), reverse=True)
+        return ideas[:limit] if limit is not None else ideas
+
+    def save(self):
+        global _index_mtime
+        self.store.save()
+        if self is _index and os.path.exists(self.path):
+            _index_mtime = os.path.getmtime(self.path)  # свою же запись не перечитываем
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+
+_index: Optional[IdeaIndex] = None
+_index_mtime: Optional[float] = None
+
+
+def get_idea_index() -> IdeaIndex:
+    """
+    Общий индекс процесса
+
+    Перечитывается, если файл изменил другой процесс (например,
+    ежедневный запуск, пока открыт дашборд).
+    """
+    global _index, _index_mtime
+    mtime = os.path.getmtime(IDEA_INDEX_FILE) if os.path.exists(IDEA_INDEX_FILE) else None
+    if _index is None or mtime != _index_mtime:
+        _index = IdeaIndex()
+        _index_mtime = mtime
+    return _index
+
@@ -0,0 +1,203 @@
+"""
+Общий доступ к LLM для анализаторов и ботов
+
+Запросы идут через роутер провайдеров (см. providers.py): он
+выбирает самый быстрый исправный backend и переключается на
+другой при ошибках и таймаутах. Перед отправкой запрос ждёт
+минутный бюджет ключа (см. scheduler.py). Здесь — то, что не
+зависит от провайдера: проверка контекста, LLM-кэш, бюджет и
+разбор ответа.
+"""
+import json
+from typing import AsyncIterator, Dict, List, Optional
+import logging
+
+from .config import LLM_MODEL, LLM_TIMEOUT, LLM_CONTEXT_TOKENS
+from .llm_cache import LLMRequest, get_llm_cache
+from .providers import get_router
+from .scheduler import BATCH, get_scheduler
+
+logger = logging.getLogger(__name__)
+
+
+async def close_async_client():
+    """Закрывает соединения провайдеров в текущем event loop"""
+    await get_router().aclose()
+
+
+def check_context(messages: List[Dict[str, str]], max_tokens: int, context: int = LLM_CONTEXT_TOKENS) -> int:
+    """
+    Оценивает размер промпта до отправки
+
+    Returns:
+        Оценка числа токенов промпта
+
+    Raises:
+        ValueError: если промпт вместе с ответом не влезет в контекст модели
+    """
+    prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+    if prompt_tokens + max_tokens > context:
+        raise ValueError(
+            f"Промпт ~{prompt_tokens} токенов + ответ {max_tokens} не влезают в контекст {context}"
+        )
+    logger.debug(f"Промпт ~{prompt_tokens} токенов")
+    return prompt_tokens
+
+
+def _cached(cache_request: Optional[LLMRequest]):
+    """Кэш и готовый ответ из него (если есть)"""
+    cache = get_llm_cache() if cache_request is not None else None
+    if cache is None:
+        return None, None
+    return cache, cache.lookup(cache_request)
+
+
+def _store(cache, cache_request: LLMRequest, text: str, tokens: int):
+    """Кладёт ответ в кэш, если это валидный JSON"""
+    if cache is None:
+        return
+    try:
+        parse_json_response(text)
+    except ValueError:
+        return  # битый ответ не кэшируем — в следующий раз спросим заново
+    cache.store(cache_request, text, tokens)
+
+
+def _remember(cache, cache_request: LLMRequest, completion) -> str:
+    """Кладёт ответ провайдера в кэш и возвращает его текст"""
+    text, tokens = completion
+    _store(cache, cache_request, text, tokens)
+    return text
+
+
+def complete(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 4000,
+    temperature: float = 0.7,
+    model: str = LLM_MODEL,
+    cache_request: Optional[LLMRequest] = None,
+    priority: str = BATCH
+) -> str:
+    """
+    Синхронный запрос к модели, возвращает текст ответа
+
+    С `cache_request` ответ сначала ищется в LLM-кэше. Без бюджета
+    (см. scheduler.py) поток ждёт своей очереди по `priority`.
+    """
+    cache, cached = _cached(cache_request)
+    if cached is not None:
+        return cached
+
+    prompt_tokens = check_context(messages, max_tokens)
+    ticket = get_scheduler().acquire_sync(prompt_tokens + max_tokens, priority)
+    tokens = 0
+    try:
+        completion = get_router().complete(messages, max_tokens, temperature, model)
+        tokens = completion[1]
+    finally:
+        # И при ошибке: ожидающие в очереди должны проверить бюджет
+        get_scheduler().release(ticket, tokens or None)
+    return _remember(cache, cache_request, completion)
+
+
+async def acomplete(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 4000,
+    temperature: float = 0.7,
+    model: str = LLM_MODEL,
+    timeout: Optional[float] = LLM_TIMEOUT,
+    cache_request: Optional[LLMRequest] = None,
+    priority: str = BATCH
+) -> str:
+    """
+    Асинхронный запрос к модели, не блокирует event loop
+
+    Отмена задачи прерывает и HTTP-запрос к провайдеру.
+    С `cache_request` ответ сначала ищется в LLM-кэше. Без бюджета
+    запрос ждёт своей очереди по `priority`; `timeout` отсчитывается
+    с момента отправки, а не с постановки в очередь.
+
+    Raises:
+        asyncio.TimeoutError: если ни один провайдер не ответил за `timeout` секунд
+    """
+    cache, cached = _cached(cache_request)
+    if cached is not None:
+        return cached
+
+    prompt_tokens = check_context(messages, max_tokens)
+    ticket = await get_scheduler().acquire(prompt_tokens + max_tokens, priority)
+    tokens = 0
+    try:
+        completion = await get_router().acomplete(messages, max_tokens, temperature, model, timeout=timeout)
+        tokens = completion[1]
+    finally:
+        get_scheduler().release(ticket, tokens or None)
+    return _remember(cache, cache_request, completion)
+
+
+async def astream(
+    messages: List[Dict[str, str]],
+    max_tokens: int = 4000,
+    temperature: float = 0.7,
+    model: str = LLM_MODEL,
+    timeout: Optional[float] = LLM_TIMEOUT,
+    cache_request: Optional[LLMRequest] = None,
+    priority: str = BATCH
+) -> AsyncIterator[str]:
+    """
+    Потоковый запрос к модели: отдаёт текст ответа кусками по мере генерации
+
+    `timeout` — на весь ответ, а не на отдельный кусок. Полный текст
+    после окончания потока кладётся в LLM-кэш; при попадании в кэш
+    ответ отдаётся одним куском. Бюджет — как у acomplete.
+
+    Raises:
+        asyncio.TimeoutError: если ответ не закончился за `timeout` секунд
+    """
+    cache, cached = _cached(cache_request)
+    if cached is not None:
+        yield cached
+        return
+
+    prompt_tokens = check_context(messages, max_tokens)
+    ticket = await get_scheduler().acquire(prompt_tokens + max_tokens, priority)
+    parts: List[str] = []
+    tokens = 0
+    try:
+        async for piece, used in get_router().astream(messages, max_tokens, temperature, model, timeout=timeout):
+            tokens = used or tokens
+            if piece:
+                parts.append(piece)
+                yield piece
+    finally:
+        # Поток мог упасть, быть отменён или закрыт раньше конца
+        get_scheduler().release(ticket, tokens or None)
+
+    _store(cache, cache_request, "".join(parts), tokens)
+
+
+def parse_json_response(text: str):
+    """
+    Достаёт JSON из ответа модели
+
+    Иногда модель оборачивает ответ в ```json ... ```.
+
+    Raises:
+        json.JSONDecodeError: если ответ не JSON
+    """
+    if "```json" in text:
+        text = text.split("```json")[1].split("```")[0]
+    elif "```" in text:
+        text = text.split("```")[1].split("```")[0]
+    return json.loads(text.strip())
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Грубая оценка числа токенов без токенизатора
+
+    Латиница — около 4 символов на токен, кириллица и прочее —
+    около 2 (BPE-словари Llama режут их мельче).
+    """
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return (len(text) - non_ascii + 2 * non_ascii) // 4 + 1
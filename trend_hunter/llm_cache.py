@@ -0,0 +1,170 @@
+"""
+Кэш ответов LLM с адресацией по содержимому
+
+Ключ — хэш модели, температуры, шаблона промпта и сериализованных
+входных данных: одинаковый запрос не генерируется повторно.
+В режиме частичного совпадения (LLM_CACHE_MIN_OVERLAP > 0) ответ
+переиспользуется и тогда, когда входные items совпадают с уже
+проанализированными не меньше чем на заданную долю.
+"""
+import atexit
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Set
+import logging
+
+from .cache import JsonFileCache
+from .config import (
+    LLM_CACHE_ENABLED, LLM_CACHE_FILE, LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MIN_OVERLAP
+)
+
+logger = logging.getLogger(__name__)
+
+# Поля, по которым item входных данных узнаётся при частичном совпадении
+_ITEM_ID_FIELDS = ("title", "term", "name")
+
+
+def _digest(value) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def summary_items(data_summary: Dict) -> List[str]:
+    """Идентификаторы items из data_summary ("раздел:название")"""
+    items = []
+    for section, values in data_summary.items():
+        if not isinstance(values, list):
+            continue
+        for value in values:
+            if isinstance(value, dict):
+                label = next((value[f] for f in _ITEM_ID_FIELDS if value.get(f)), None)
+            else:
+                label = value
+            if label:
+                items.append(f"{section}:{label}")
+    return items
+
+
+def _overlap(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class LLMRequest:
+    """Адрес запроса в кэше: точный ключ, область и входные items"""
+
+    def __init__(self, model: str, temperature: float, template: str, data, items: Iterable[str] = ()):
+        # Область — всё, кроме входных данных: частичное совпадение
+        # допустимо только при той же модели, температуре и шаблоне
+        self.scope = _digest({"model": model, "temperature": temperature, "template": template})
+        self.key = _digest({"scope": self.scope, "input": data})
+        self.items = sorted(set(items))
+
+
+class LLMCache:
+    """
+    Дисковый кэш ответов модели
+
+    Записи живут `ttl` секунд, при превышении `max_entries` вытесняются
+    давно не использовавшиеся. Счётчики hits / overlap_hits / misses
+    и сэкономленные токены доступны через stats().
+
+    store() только меняет кэш в памяти: файл переписывается целиком,
+    поэтому на диск он сбрасывается один раз за запуск — flush().
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_FILE,
+        ttl: Optional[float] = LLM_CACHE_TTL,
+        max_entries: Optional[int] = LLM_CACHE_MAX_ENTRIES,
+        min_overlap: float = LLM_CACHE_MIN_OVERLAP
+    ):
+        self.cache = JsonFileCache(path, ttl=ttl, max_entries=max_entries)
+        self.min_overlap = min_overlap
+        self.hits = 0
+        self.overlap_hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+    def lookup(self, request: LLMRequest) -> Optional[str]:
+        """Ответ из кэша: по точному ключу, затем (если включено) по совпадению items"""
+        entry = self.cache.get(request.key)
+        if entry is not None:
+            self.hits += 1
+            self.saved_tokens += entry.get("tokens", 0)
+            logger.info("LLM-кэш: точное попадание")
+            return entry["text"]
+
+        if self.min_overlap > 0 and request.items:
+            best_key, best_overlap = self._best_overlap(request)
+            if best_key is not None and best_overlap >= self.min_overlap:
+                entry = self.cache.get(best_key)
+                self.overlap_hits += 1
+                self.saved_tokens += entry.get("tokens", 0)
+                logger.info(f"LLM-кэш: совпадение входных данных {best_overlap:.0%}")
+                return entry["text"]
+
+        self.misses += 1
+        return None
+
+    def _best_overlap(self, request: LLMRequest):
+        items = set(request.items)
+        best_key, best_overlap = None, 0.0
+        for key, entry in self.cache.entries():
+            value = entry["value"]
+            if value.get("scope") != request.scope:
+                continue
+            overlap = _overlap(items, set(value.get("items", [])))
+            if overlap > best_overlap:
+                best_key, best_overlap = key, overlap
+        return best_key, best_overlap
+
+    def store(self, request: LLMRequest, text: str, tokens: int = 0):
+        """Сохраняет ответ в памяти (на диск — в flush())"""
+        self.cache.set(request.key, {
+            "scope": request.scope,
+            "items": request.items,
+            "text": text,
+            "tokens": tokens,
+        })
+
+    def flush(self):
+        """Пишет кэш на диск, если в нём появились новые ответы"""
+        try:
+            self.cache.save()
+        except OSError as e:
+            logger.error(f"Ошибка записи LLM-кэша: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """Счётчики кэша за время жизни процесса"""
+        lookups = self.hits + self.overlap_hits + self.misses
+        return {
+            "hits": self.hits,
+            "overlap_hits": self.overlap_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.overlap_hits) / lookups, 3) if lookups else 0.0,
+            "saved_tokens": self.saved_tokens,
+            "entries": len(self.cache),
+        }
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Общий кэш процесса (None, если кэш выключен в конфиге)
+
+    Запуски анализа сбрасывают его сами после анализа; всё, что
+    не сброшено явно (боты, скрипты), пишется при выходе из процесса.
+    """
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = LLMCache()
+        atexit.register(_cache.flush)
+    return _cache
@@ -3,16 +3,32 @@ Trend Hunter - Главный скрипт
 Запускает сбор данных, анализ и генерацию отчёта
 """
 import asyncio
+import functools
 import logging
+import os
 import schedule
+import tempfile
 import time
 from datetime import datetime
+from typing import Optional
 
-from .sources.google_trends import fetch_google_trends
-from .sources.reddit import fetch_reddit_trends
-from .analyzer import analyze_trends, rank_ideas
-from .storage import save_daily_report, save_raw_data
-from .config import SUBREDDITS, SEARCH_CATEGORIES, SCHEDULE_TIME
+from .sources.google_trends import stream_google_trends
+from .sources.reddit import stream_reddit_trends
+from .sources.cassette import Cassette, cassette_from_config
+from .sources.http_client import HttpClient
+from .sources.resilience import SourceMonitor, failed_sources
+from .sources.stream import merge_streams, sort_source_items
+from .analyzer import analyze_trends_async, rank_ideas
+from .storage import append_streamed_idea, save_daily_report, save_raw_data
+from .watermarks import Watermarks
+from .llm_cache import get_llm_cache
+from .providers import get_router
+from .relevance import prescan
+from .scheduler import get_scheduler
+from .config import (
+    SUBREDDITS, SEARCH_CATEGORIES, SCHEDULE_TIME, REDDIT_SEARCH_KEYWORDS, REDDIT_BATCHED,
+    HTTP_CASSETTE_PATH, HTTP_CASSETTE_LATENCY_SCALE, INCREMENTAL_COLLECTION
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,12 +38,17 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def run_trend_hunt():
+async def run_trend_hunt(cassette: Optional[Cassette] = None, incremental: bool = INCREMENTAL_COLLECTION):
     """
     Основной процесс поиска трендов
     1. Собирает данные из источников
     2. Анализирует через AI
     3. Сохраняет отчёт
+
+    Args:
+        cassette: Кассета для записи или офлайн-воспроизведения HTTP
+            (по умолчанию — из HTTP_CASSETTE_MODE)
+        incremental: Брать только новое и изменившееся с прошлого запуска
     """
     logger.info("=" * 50)
     logger.info("🚀 Запуск Trend Hunter...")
@@ -35,25 +56,82 @@ async def run_trend_hunt():
 
     start_time = datetime.now()
 
-    # 1. Сбор данных
-    logger.info("\n📊 Сбор данных из Google Trends...")
-    google_trends = await fetch_google_trends(geo="US")
-    logger.info(f"   Получено {len(google_trends)} трендов")
+    # 1. Сбор данных: источники идут параллельно одним потоком
+    # через общий пул соединений
+    logger.info("\n📊 Сбор данных из Google Trends и Reddit...")
+    collected = {"google_trends": [], "reddit": []}
+
+    watermarks = Watermarks() if incremental else None
 
-    logger.info("\n📱 Сбор данных из Reddit...")
-    reddit_posts = await fetch_reddit_trends(
-        subreddits=SUBREDDITS,
-        keywords=["startup idea", "business idea", "side project", "saas idea"]
-    )
+    def since_last_run(source, stream):
+        return watermarks.filter(source, stream) if watermarks else stream
+
+    async with HttpClient(cassette=cassette) as http:
+        monitor = SourceMonitor(http)
+        stream = merge_streams(
+            since_last_run("google_trends", monitor.track("google_trends", stream_google_trends(geo="US", http=http))),
+            since_last_run("reddit", monitor.track("reddit", stream_reddit_trends(
+                subreddits=SUBREDDITS,
+                keywords=REDDIT_SEARCH_KEYWORDS,
+                http=http,
+                batched=REDDIT_BATCHED,
+                known=functools.partial(watermarks.unchanged, "reddit") if watermarks else None
+            )))
+        )
+        async for item in stream:
+            if not any(collected.values()):
+                logger.info(f"   Первые данные через {(datetime.now() - start_time).total_seconds():.1f} с")
+            collected.setdefault(item["source"], []).append(item)
+            # Отбор по релевантности готовится, пока остальные источники качаются
+            prescan(item)
+        source_status = monitor.report()
+    collect_elapsed = (datetime.now() - start_time).total_seconds()
+    logger.info(f"   Сбор данных: {collect_elapsed:.2f} с")
+
+    sort_source_items(collected)
+    google_trends = collected["google_trends"]
+    reddit_posts = collected["reddit"]
+    logger.info(f"   Получено {len(google_trends)} трендов")
     logger.info(f"   Получено {len(reddit_posts)} постов")
+    for source in failed_sources(source_status):
+        status = source_status[source]
+        logger.warning(f"   ⚠️ {source}: {status['status']} ({status['items']} items, {status['failures'] + status['rejected']} ошибок)")
 
-    # 2. Сохраняем сырые данные
-    raw_file = save_raw_data(google_trends, reddit_posts)
-    logger.info(f"\n💾 Сырые данные: {raw_file}")
+    # 2. Сохраняем сырые данные — в потоке, параллельно с AI-анализом
+    save_raw = asyncio.create_task(asyncio.to_thread(
+        save_raw_data, google_trends, reddit_posts,
+        source_status=source_status, incremental=incremental
+    ))
+
+    if incremental and not google_trends and not reddit_posts:
+        raw_file = await save_raw
+        await asyncio.to_thread(watermarks.save)
+        logger.info(f"\n💾 Сырые данные: {raw_file}")
+        logger.info("\n💤 С прошлого запуска ничего нового — анализ пропущен")
+        return {"trends_count": 0, "posts_count": 0, "ideas_count": 0, "source_status": source_status}
 
     # 3. AI-анализ
     logger.info("\n🤖 Анализ трендов через AI...")
-    analysis = analyze_trends(google_trends, reddit_posts)
+    analysis_start = datetime.now()
+    streamed = []
+
+    def on_idea(idea):
+        # Идеи приходят по мере генерации: показываем и сохраняем сразу
+        if not streamed:
+            logger.info(f"   Первая идея через {(datetime.now() - analysis_start).total_seconds():.1f} с")
+        streamed.append(idea)
+        logger.info(f"   💡 {idea.get('name', 'N/A')} (Score: {idea.get('final_score', 0)})")
+        append_streamed_idea(idea)
+
+    llm_cache = get_llm_cache()
+    try:
+        analysis = await analyze_trends_async(google_trends, reddit_posts, on_idea=on_idea)
+    finally:
+        raw_file = await save_raw
+        # Ответы модели — на диск одним заходом, даже если анализ упал
+        if llm_cache is not None:
+            await asyncio.to_thread(llm_cache.flush)
+    logger.info(f"\n💾 Сырые данные: {raw_file}")
 
     if "error" in analysis:
         logger.error(f"   Ошибка анализа: {analysis['error']}")
@@ -64,13 +142,40 @@ async def run_trend_hunt():
     logger.info(f"   Найдено {len(ranked_ideas)} бизнес-идей")
 
     # 5. Сохраняем отчёт
-    report_file = save_daily_report(analysis, ranked_ideas)
+    report_file = await asyncio.to_thread(save_daily_report, analysis, ranked_ideas)
     logger.info(f"\n📄 Отчёт сохранён: {report_file}")
 
+    # Водяные знаки — только после отчёта: если анализ упал, те же
+    # items придут снова в следующем запуске
+    if watermarks:
+        await asyncio.to_thread(watermarks.save)
+
+    if llm_cache is not None:
+        stats = llm_cache.stats()
+        logger.info(
+            f"   LLM-кэш: попаданий {stats['hits'] + stats['overlap_hits']}, "
+            f"промахов {stats['misses']}, сэкономлено ~{stats['saved_tokens']} токенов"
+        )
+
+    for name, provider in get_router().report().items():
+        if provider["requests"]:
+            logger.info(
+                f"   LLM {name}: запросов {provider['requests']}, ошибок {provider['failures']}, "
+                f"p50 {provider['p50_s']} с, дублей {provider['hedges']}"
+            )
+
+    budget = await asyncio.to_thread(get_scheduler().report)
+    batch = budget["priorities"]["batch"]
+    if batch["waited"]:
+        logger.info(
+            f"   LLM-бюджет: {batch['waited']} запросов ждали в очереди, "
+            f"в среднем {batch['wait_avg_s']} с, максимум {batch['wait_max_s']} с"
+        )
+
     # Итоги
-    elapsed = (datetime.now() - start_time).seconds
+    elapsed = (datetime.now() - start_time).total_seconds()
     logger.info("\n" + "=" * 50)
-    logger.info(f"✅ Готово за {elapsed} секунд!")
+    logger.info(f"✅ Готово за {elapsed:.1f} секунд!")
     logger.info("=" * 50)
 
     # Выводим топ-3 идеи
@@ -86,7 +191,10 @@ async def run_trend_hunt():
         "trends_count": len(google_trends),
         "posts_count": len(reddit_posts),
         "ideas_count": len(ranked_ideas),
+        "source_status": source_status,
         "report_file": report_file,
+        "collect_seconds": collect_elapsed,
+        "elapsed_seconds": elapsed,
         "top_ideas": ranked_ideas[:3]
     }
 
@@ -114,12 +222,56 @@ def start_scheduler():
         time.sleep(60)
 
 
+def _cassette_from_args(argv) -> Optional[Cassette]:
+    """
+    Кассета из аргументов командной строки:
+    --record [путь] / --replay [путь] [--latency доля]
+    """
+    for flag, mode in (("--record", "record"), ("--replay", "replay")):
+        if flag not in argv:
+            continue
+        i = argv.index(flag)
+        path = argv[i + 1] if i + 1 < len(argv) and not argv[i + 1].startswith("-") else HTTP_CASSETTE_PATH
+        latency = HTTP_CASSETTE_LATENCY_SCALE
+        if "--latency" in argv:
+            latency = float(argv[argv.index("--latency") + 1])
+        return Cassette(path, mode, latency)
+    return None
+
+
+def _isolate_replay_state() -> str:
+    """
+    Переносит состояние офлайн-прогона во временную папку
+
+    Кэши (LLM, фиды, items HN), водяные знаки, индекс идей, журнал
+    LLM-бюджета и отчёты лежат по относительным путям trend_hunter/data:
+    при воспроизведении кассеты рабочая папка меняется на свежую
+    временную, так что прогон не зависит от состояния настоящих
+    запусков и не портит его. Кассета к этому моменту уже прочитана.
+
+    Returns:
+        Путь к временной папке
+    """
+    sandbox = tempfile.mkdtemp(prefix="trend_hunter_replay_")
+    os.chdir(sandbox)
+    logger.info(f"Офлайн-прогон: кэши, состояние и отчёты — в {sandbox}")
+    return sandbox
+
+
 if __name__ == "__main__":
     import sys
 
-    if "--now" in sys.argv or "-n" in sys.argv:
+    cassette = _cassette_from_args(sys.argv) or cassette_from_config()
+    if cassette is not None and not cassette.recording:
+        _isolate_replay_state()
+    incremental = INCREMENTAL_COLLECTION or "--incremental" in sys.argv
+
+    if cassette is not None:
+        # Запись или офлайн-прогон по кассете
+        asyncio.run(run_trend_hunt(cassette, incremental))
+    elif "--now" in sys.argv or "-n" in sys.argv:
         # Немедленный запуск
-        asyncio.run(run_trend_hunt())
+        asyncio.run(run_trend_hunt(incremental=incremental))
     elif "--daemon" in sys.argv or "-d" in sys.argv:
         # Запуск как демон с расписанием
         start_scheduler()
@@ -128,5 +280,8 @@ if __name__ == "__main__":
         print("Использование:")
         print("  python -m trend_hunter.main --now     # Запустить сейчас")
         print("  python -m trend_hunter.main --daemon  # Запустить по расписанию")
+        print("  python -m trend_hunter.main --record [кассета]  # Записать HTTP-обмены")
+        print("  python -m trend_hunter.main --replay [кассета] [--latency 1.0]  # Прогон без сети")
+        print("  ... --incremental  # Только новое с прошлого запуска")
         print("\nЗапускаю сейчас...")
         asyncio.run(run_trend_hunt())
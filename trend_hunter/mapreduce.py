@@ -0,0 +1,219 @@
+"""
+Map-reduce анализ всего собранного набора данных
+
+Вместо верхних N items каждого источника данные режутся на куски
+в пределах бюджета токенов, куски анализируются моделью параллельно
+(частоту запросов ограничивает общий бюджет LLM, см. scheduler.py),
+а частичные ответы сливаются с удалением повторов в шаге reduce.
+"""
+import asyncio
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+
+from .config import MAP_CHUNK_TOKENS, MAP_MAX_CHUNKS, MAP_CONCURRENCY, LLM_TIMEOUT
+from .llm import acomplete, parse_json_response
+from .llm_cache import LLMRequest
+from .prompting import item_tokens
+from .repair import acontinue_json, parse_validated
+from .schema import Schema
+from .streaming import stream_items
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def chunk_sections(
+    sections: Dict[str, List[Dict]],
+    budget: int = MAP_CHUNK_TOKENS,
+    max_chunks: int = MAP_MAX_CHUNKS
+) -> List[Dict[str, List[Dict]]]:
+    """
+    Режет разделы на куски не больше `budget` токенов каждый
+
+    Items берутся из разделов по очереди (первый из каждого, затем
+    второй...), поэтому каждый кусок содержит смесь источников, а
+    самые важные items попадают в первые куски. Если кусков выходит
+    больше `max_chunks`, хвост отбрасывается.
+    """
+    queues = {name: list(items) for name, items in sections.items() if items}
+    chunks: List[Dict[str, List[Dict]]] = []
+    current: Dict[str, List[Dict]] = {}
+    used = 0
+    dropped = 0
+
+    while any(queues.values()):
+        for name, queue in queues.items():
+            if not queue:
+                continue
+            item = queue.pop(0)
+            cost = item_tokens(item)
+
+            if used + cost > budget and current:
+                chunks.append(current)
+                current, used = {}, 0
+
+            if len(chunks) >= max_chunks:
+                dropped += 1 + len(queue)
+                queue.clear()
+                continue
+
+            current.setdefault(name, []).append(item)
+            used += cost
+
+    if current and len(chunks) < max_chunks:
+        chunks.append(current)
+
+    if dropped:
+        logger.warning(f"Map-reduce: {dropped} items не поместились в {max_chunks} кусков")
+    return chunks
+
+
+async def map_chunks(
+    chunks: List[Dict[str, List[Dict]]],
+    build_messages: Callable[[Dict], List[Dict[str, str]]],
+    build_request: Callable[[Dict], LLMRequest],
+    timeout: Optional[float] = LLM_TIMEOUT,
+    concurrency: int = MAP_CONCURRENCY,
+    stream_key: Optional[str] = None,
+    on_item: Optional[Callable[[Dict], None]] = None,
+    schema: Optional[Schema] = None
+) -> List[Optional[Dict]]:
+    """
+    Анализирует куски параллельно
+
+    Не больше `concurrency` запросов одновременно; минутные лимиты
+    ключа соблюдает общий бюджет LLM (запросы куска — batch). Каждый
+    кусок идёт через LLM-кэш.
+    С `on_item` ответы читаются потоком, и объекты массива
+    `stream_key` отдаются по мере генерации (см. streaming.py).
+    Оборванный ответ дописывается дозапросом хвоста, а со `schema`
+    разбирается с ремонтом и проверкой (см. repair.py).
+
+    Returns:
+        Разобранные ответы в порядке кусков (None — кусок не удался)
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def analyze(index: int, chunk: Dict) -> Optional[Dict]:
+        async with semaphore:
+            messages, request = build_messages(chunk), build_request(chunk)
+            try:
+                if on_item is not None:
+                    text = await stream_items(
+                        messages, stream_key, on_item, timeout=timeout, cache_request=request
+                    )
+                else:
+                    text = await acomplete(
+                        messages, max_tokens=4000, temperature=0.7, timeout=timeout, cache_request=request
+                    )
+                text = await acontinue_json(messages, text, timeout=timeout, cache_request=request)
+                result = parse_validated(text, schema) if schema is not None else parse_json_response(text)
+            except Exception as e:
+                logger.error(f"Map-reduce: кусок {index + 1}/{len(chunks)} не удался: {str(e) or type(e).__name__}")
+                return None
+
+        if not isinstance(result, dict):
+            logger.error(f"Map-reduce: кусок {index + 1}/{len(chunks)} вернул не объект")
+            return None
+        return result
+
+    return await asyncio.gather(*(analyze(i, chunk) for i, chunk in enumerate(chunks)))
+
+
+def _words(text: str) -> set:
+    return set(_WORD_RE.findall((text or "").lower()))
+
+
+def _similar(a: set, b: set, threshold: float) -> bool:
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+
+def dedupe_ideas(
+    ideas: Iterable[Dict],
+    text_of: Callable[[Dict], str],
+    score_of: Callable[[Dict], float],
+    list_fields: Iterable[str] = (),
+    threshold: float = 0.6
+) -> List[Dict]:
+    """
+    Сливает повторяющиеся идеи из разных кусков
+
+    Идеи считаются одной, если пересечение слов их текста
+    (`text_of`) не меньше `threshold` по Жаккару. Остаётся идея с
+    большим скором, списочные поля объединяются. Порядок результата
+    детерминирован: по убыванию скора, затем по тексту.
+    """
+    merged: List[Dict] = []
+    signatures: List[set] = []
+
+    ordered = sorted(ideas, key=lambda idea: (-score_of(idea), text_of(idea)))
+    for idea in ordered:
+        words = _words(text_of(idea))
+        for kept, kept_words in zip(merged, signatures):
+            if _similar(words, kept_words, threshold):
+                for field in list_fields:
+                    values = kept.get(field)
+                    extra = idea.get(field)
+                    if isinstance(values, list) and isinstance(extra, list):
+                        kept[field] = values + [v for v in extra if v not in values]
+                kept["mentions"] = kept.get("mentions", 1) + 1
+                break
+        else:
+            merged.append(dict(idea))
+            signatures.append(words)
+
+    return merged
+
+
+def unique_items(
+    on_item: Callable[[Dict], None],
+    text_of: Callable[[Dict], str],
+    threshold: float = 0.6
+) -> Callable[[Dict], None]:
+    """
+    Обёртка над обработчиком потока: пропускает идеи, похожие на уже
+    отданные (разные куски map-reduce часто предлагают одно и то же)
+    """
+    seen: List[set] = []
+
+    def emit(item: Dict):
+        words = _words(text_of(item))
+        if any(_similar(words, other, threshold) for other in seen):
+            return
+        seen.append(words)
+        on_item(item)
+
+    return emit
+
+
+def merge_lists(partials: List[Dict], field: str, limit: int = 10) -> List:
+    """Объединяет списки из частичных ответов: чаще встречающиеся — раньше"""
+    counts: Dict[str, int] = {}
+    first_seen: Dict[str, int] = {}
+    values: Dict[str, object] = {}
+
+    for partial in partials:
+        for value in partial.get(field) or []:
+            key = str(value).strip().lower()
+            if not key:
+                continue
+            counts[key] = counts.get(key, 0) + 1
+            first_seen.setdefault(key, len(first_seen))
+            values.setdefault(key, value)
+
+    ordered = sorted(counts, key=lambda key: (-counts[key], first_seen[key]))
+    return [values[key] for key in ordered[:limit]]
+
+
+def merge_texts(partials: List[Dict], field: str) -> str:
+    """Склеивает текстовые поля частичных ответов без повторов"""
+    texts = []
+    for partial in partials:
+        text = (partial.get(field) or "").strip()
+        if text and text not in texts:
+            texts.append(text)
+    return " ".join(texts)
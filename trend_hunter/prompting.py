@@ -0,0 +1,131 @@
+"""
+Компактная упаковка данных в промпт
+
+Вместо json.dumps(..., indent=2), где заметная часть токенов уходит
+на пробелы, кавычки и повторяющиеся ключи, каждый раздел данных
+кодируется таблицей: строка-заголовок с названиями колонок, затем
+по одной строке на item со значениями через " | ".
+
+    [reddit_discussions] title | subreddit | score | preview
+    Built a CRM for plumbers | SaaS | 412 | After 6 months...
+
+Колонки с одинаковым значением у всех строк выносятся в заголовок.
+Данные добавляются в промпт по приоритету, пока не кончится бюджет.
+"""
+import re
+from typing import Dict, List, Tuple
+import logging
+
+from .config import PROMPT_TOKEN_BUDGET
+from .llm import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с форматом — входит в ключ LLM-кэша
+PROMPT_ENCODING = "lines-v1"
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = ", ".join(str(v) for v in value)
+    return _SPACE_RE.sub(" ", str(value)).replace("|", "/").strip()
+
+
+def _columns(items: List[Dict]) -> List[str]:
+    columns: List[str] = []
+    for item in items:
+        for key in item:
+            if key not in columns:
+                columns.append(key)
+    return columns
+
+
+def encode_row(item: Dict, columns: List[str]) -> str:
+    """Одна строка таблицы"""
+    return " | ".join(_cell(item.get(column)) for column in columns)
+
+
+def encode_section(name: str, items: List[Dict]) -> str:
+    """Раздел данных: заголовок с колонками и строки items"""
+    columns = _columns(items)
+
+    constants = []
+    if len(items) > 1:
+        for column in list(columns):
+            values = {_cell(item.get(column)) for item in items}
+            if len(values) == 1:
+                constants.append(f"{column}={values.pop()}")
+                columns.remove(column)
+
+    header = f"[{name}]"
+    if constants:
+        header += " " + "; ".join(constants) + ";"
+    header += " " + " | ".join(columns)
+
+    return "\n".join([header] + [encode_row(item, columns) for item in items])
+
+
+def encode_sections(sections: Dict[str, List[Dict]]) -> str:
+    """Все разделы данных в компактном табличном виде"""
+    return "\n\n".join(
+        encode_section(name, items) for name, items in sections.items() if items
+    )
+
+
+def item_tokens(item: Dict) -> int:
+    """Сколько токенов займёт item строкой таблицы"""
+    return estimate_tokens(encode_row(item, list(item))) + 1
+
+
+def data_budget(template: str, system: str = "", budget: int = PROMPT_TOKEN_BUDGET) -> int:
+    """
+    Сколько токенов остаётся на данные в промпте по шаблону
+
+    Raises:
+        ValueError: если сам шаблон не помещается в бюджет
+    """
+    overhead = estimate_tokens(template.format(data="")) + estimate_tokens(system)
+    if overhead >= budget:
+        raise ValueError(f"Шаблон промпта (~{overhead} токенов) не помещается в бюджет {budget}")
+    return budget - overhead
+
+
+def fit_sections(sections: Dict[str, List[Dict]], budget: int) -> Dict[str, List[Dict]]:
+    """
+    Жадно заполняет бюджет токенов items по приоритету
+
+    Внутри раздела приоритет — порядок items. Между разделами места
+    делятся пропорционально: item на позиции i раздела длины n имеет
+    приоритет i / n, так что верх каждого раздела попадает в промпт
+    раньше хвоста любого другого. Не поместившийся item пропускается,
+    следующие (более короткие) ещё могут поместиться.
+    """
+    candidates: List[Tuple[float, int, int, str, Dict]] = []
+    for rank, (name, items) in enumerate(sections.items()):
+        for position, item in enumerate(items):
+            candidates.append((position / len(items), rank, position, name, item))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    fitted: Dict[str, List[Dict]] = {}
+    used = 0
+    skipped = 0
+
+    for _, _, _, name, item in candidates:
+        cost = item_tokens(item)
+        if name not in fitted:
+            cost += estimate_tokens(f"[{name}] " + " | ".join(item)) + 1
+        if used + cost > budget:
+            skipped += 1
+            continue
+        fitted.setdefault(name, []).append(item)
+        used += cost
+
+    if skipped:
+        logger.info(f"Промпт: {sum(len(v) for v in fitted.values())} items (~{used} токенов), {skipped} не поместились")
+
+    # Порядок разделов — как во входных данных
+    return {name: fitted[name] for name in sections if name in fitted}
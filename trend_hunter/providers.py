@@ -0,0 +1,718 @@
+"""
+Провайдеры LLM и маршрутизация между ними
+
+Анализаторы и боты не ходят к Groq напрямую: запрос получает
+роутер, который выбирает самый быстрый исправный провайдер по
+скользящей статистике (медиана задержки и доля ошибок за последние
+LLM_STATS_WINDOW запросов). Если ответа долго нет, запрос
+дублируется на следующий провайдер (hedging) и берётся первый
+ответ; при ошибке — переход к следующему (failover). Провайдер,
+который раз за разом падает, отключается circuit breaker'ом.
+
+Провайдеры (LLM_PROVIDERS):
+    groq   — Groq SDK (модель запроса, по умолчанию LLM_MODEL)
+    openai — любой OpenAI-совместимый HTTP API (LLM_OPENAI_*)
+    stub   — локальная детерминированная заглушка для тестов и
+             бенчмарков без сети и ключей
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import urllib.request
+import weakref
+from collections import Counter, deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import logging
+
+import aiohttp
+from groq import AsyncGroq, Groq
+
+from .config import (
+    GROQ_API_KEY, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_PROVIDERS,
+    LLM_OPENAI_BASE_URL, LLM_OPENAI_API_KEY, LLM_OPENAI_MODEL,
+    LLM_STUB_LATENCY, LLM_STUB_FAILURE_RATE, LLM_STATS_WINDOW,
+    LLM_HEDGE_ENABLED, LLM_HEDGE_DELAY, LLM_HEDGE_MIN_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+from .sources.resilience import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Ответ провайдера: (текст, израсходовано токенов)
+Completion = Tuple[str, int]
+
+
+class NoProviderError(RuntimeError):
+    """Все провайдеры LLM отключены circuit breaker'ом"""
+
+
+class Provider:
+    """
+    Backend LLM
+
+    Наследники реализуют complete / acomplete / astream. astream
+    отдаёт пары (кусок текста, токены): токены — 0, пока провайдер
+    не сообщил итог (обычно в последнем куске).
+    """
+
+    name = "provider"
+
+    def model_for(self, model: str) -> str:
+        """Модель, которую провайдер реально вызовет вместо запрошенной"""
+        return model
+
+    def complete(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str) -> Completion:
+        raise NotImplementedError
+
+    async def acomplete(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str) -> Completion:
+        raise NotImplementedError
+
+    async def astream(
+        self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str
+    ) -> AsyncIterator[Completion]:
+        raise NotImplementedError
+        yield
+
+    async def aclose(self):
+        """Закрывает соединения текущего event loop"""
+
+
+class GroqProvider(Provider):
+    """
+    Groq через официальный SDK
+
+    Клиенты создаются лениво и переиспользуются: синхронный — один
+    на процесс, асинхронный — один на event loop (его пул соединений
+    привязан к циклу, в котором создан).
+    """
+
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = GROQ_API_KEY, timeout: float = LLM_TIMEOUT, max_retries: int = LLM_MAX_RETRIES):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._client = None
+        self._async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def client(self):
+        if self._client is None:
+            self._client = Groq(api_key=self.api_key, timeout=self.timeout, max_retries=self.max_retries)
+        return self._client
+
+    def async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncGroq(api_key=self.api_key, timeout=self.timeout, max_retries=self.max_retries)
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _result(response) -> Completion:
+        usage = getattr(response, "usage", None)
+        return response.choices[0].message.content, getattr(usage, "total_tokens", 0) or 0
+
+    def complete(self, messages, max_tokens, temperature, model) -> Completion:
+        response = self.client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature
+        )
+        return self._result(response)
+
+    async def acomplete(self, messages, max_tokens, temperature, model) -> Completion:
+        response = await self.async_client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature
+        )
+        return self._result(response)
+
+    async def astream(self, messages, max_tokens, temperature, model) -> AsyncIterator[Completion]:
+        stream = await self.async_client().chat.completions.create(
+            model=model, messages=messages, max_tokens=max_tokens, temperature=temperature, stream=True
+        )
+        try:
+            async for chunk in stream:
+                # Groq присылает usage в последнем куске (x_groq), OpenAI-совместимые — в usage
+                usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+                tokens = (getattr(usage, "total_tokens", 0) or 0) if usage is not None else 0
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text or tokens:
+                    yield text or "", tokens
+        finally:
+            await stream.close()
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+
+class OpenAICompatibleProvider(Provider):
+    """
+    Любой API с OpenAI-совместимым /chat/completions (OpenAI,
+    OpenRouter, Together, локальный vLLM / Ollama и т.п.)
+
+    Модель провайдера фиксирована (`model`): имя модели Groq
+    из запроса другому API ничего не скажет.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, timeout: float = LLM_TIMEOUT):
+        self.name = name
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self._sessions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def model_for(self, model: str) -> str:
+        return self.model
+
+    def _payload(self, messages, max_tokens, temperature, stream: bool = False) -> Dict:
+        payload = {"model": self.model, "messages": messages, "max_tokens": max_tokens, "temperature": temperature}
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    @staticmethod
+    def _result(data: Dict) -> Completion:
+        return data["choices"][0]["message"]["content"], (data.get("usage") or {}).get("total_tokens", 0) or 0
+
+    def _session(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout), headers=self._headers())
+            self._sessions[loop] = session
+        return session
+
+    def complete(self, messages, max_tokens, temperature, model) -> Completion:
+        request = urllib.request.Request(
+            self.url, data=json.dumps(self._payload(messages, max_tokens, temperature)).encode("utf-8"),
+            headers=self._headers(), method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return self._result(json.load(response))
+
+    async def acomplete(self, messages, max_tokens, temperature, model) -> Completion:
+        async with self._session().post(self.url, json=self._payload(messages, max_tokens, temperature)) as response:
+            response.raise_for_status()
+            return self._result(await response.json())
+
+    async def astream(self, messages, max_tokens, temperature, model) -> AsyncIterator[Completion]:
+        payload = self._payload(messages, max_tokens, temperature, stream=True)
+        async with self._session().post(self.url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.content:
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                tokens = (chunk.get("usage") or {}).get("total_tokens", 0) or 0
+                choices = chunk.get("choices") or []
+                text = (choices[0].get("delta") or {}).get("content") if choices else None
+                if text or tokens:
+                    yield text or "", tokens
+
+    async def aclose(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+_WORD_RE = re.compile(r"[^\W\d_]{5,}", re.UNICODE)
+
+
+class StubProvider(Provider):
+    """
+    Локальная детерминированная заглушка: без сети и ключей
+
+    Ответ зависит только от сообщений. На промпт анализа (в нём есть
+    "saas_ideas" или "trends") — валидный JSON с идеями из самых
+    частых слов данных, на остальное — короткий текст. `latency` и
+    `failure_rate` имитируют медленного или нестабильного провайдера;
+    ошибки тоже детерминированы (`seed`).
+    """
+
+    def __init__(self, name: str = "stub", latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def model_for(self, model: str) -> str:
+        return "stub"
+
+    def _fail(self):
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise RuntimeError(f"{self.name}: имитация ошибки провайдера")
+
+    def respond(self, messages: List[Dict[str, str]]) -> str:
+        """Детерминированный ответ на сообщения"""
+        prompt = messages[-1]["content"] if messages else ""
+        words = sorted(Counter(w.lower() for w in _WORD_RE.findall(prompt)).items(), key=lambda kv: (-kv[1], kv[0]))
+        topics = [word for word, _ in words[:6]] or ["automation"]
+
+        if '"saas_ideas"' in prompt:
+            return json.dumps({
+                "saas_ideas": [_stub_saas_idea(topic) for topic in topics],
+                "market_insights": f"Чаще всего обсуждают: {', '.join(topics[:3])}.",
+                "hot_niches": topics[:3],
+                "avoid": ["Generic AI wrappers"],
+            }, ensure_ascii=False)
+        if '"trends"' in prompt:
+            return json.dumps({
+                "trends": [_stub_trend(topic) for topic in topics],
+                "summary": f"Чаще всего обсуждают: {', '.join(topics[:3])}.",
+                "top_opportunity": f"{topics[0].title()} Assistant",
+            }, ensure_ascii=False)
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"[stub {digest}] {' '.join(topics[:3])}"
+
+    def complete(self, messages, max_tokens, temperature, model) -> Completion:
+        time.sleep(self.latency)
+        self._fail()
+        text = self.respond(messages)
+        return text, len(text) // 4
+
+    async def acomplete(self, messages, max_tokens, temperature, model) -> Completion:
+        await asyncio.sleep(self.latency)
+        self._fail()
+        text = self.respond(messages)
+        return text, len(text) // 4
+
+    async def astream(self, messages, max_tokens, temperature, model) -> AsyncIterator[Completion]:
+        await asyncio.sleep(self.latency)
+        self._fail()
+        text = self.respond(messages)
+        for start in range(0, len(text), 40):
+            yield text[start:start + 40], 0
+            await asyncio.sleep(0)
+        yield "", len(text) // 4
+
+
+def _stub_score(topic: str) -> int:
+    return int(hashlib.sha1(topic.encode("utf-8")).hexdigest(), 16)
+
+
+def _stub_saas_idea(topic: str) -> Dict:
+    h = _stub_score(topic)
+    return {
+        "name": f"{topic.title()} Autopilot",
+        "problem": f"Команды вручную разбираются с {topic}",
+        "target_audience": "Small B2B teams",
+        "pricing_model": "subscription",
+        "price_range": "$19-49/месяц",
+        "competitors": ["Zapier"],
+        "differentiation": f"Готовые сценарии под {topic} без настройки",
+        "mvp_features": ["Импорт данных", "Правила", "Отчёты"],
+        "mvp_complexity": ("low", "medium", "high")[h % 3],
+        "mvp_timeline": f"{2 + h % 6} недель для MVP",
+        "tech_stack": ["Python", "React"],
+        "potential_score": 5 + h % 5,
+        "market_size": ("small", "medium", "large")[h // 3 % 3],
+        "why_now": f"Рост обсуждений {topic}",
+        "risks": ["Конкуренция"],
+        "first_users": "Reddit, Indie Hackers",
+    }
+
+
+def _stub_trend(topic: str) -> Dict:
+    h = _stub_score(topic)
+    return {
+        "name": topic.title(),
+        "description": f"Всплеск обсуждений {topic}",
+        "business_idea": {
+            "name": f"{topic.title()} Assistant",
+            "description": f"Сервис, который автоматизирует {topic}",
+            "target_audience": "Small B2B teams",
+            "monetization": "Подписка $19/месяц",
+            "mvp_complexity": ("low", "medium", "high")[h % 3],
+            "potential_score": 5 + h % 5,
+        },
+        "why_now": f"Рост обсуждений {topic}",
+        "risks": "Конкуренция",
+    }
+
+
+class ProviderStats:
+    """
+    Скользящая статистика провайдера за последние `window` запросов
+
+    Задержка — по успешным ответам; ранжирование — по ожидаемому
+    времени до успешного ответа: медиана / (1 − доля ошибок).
+    """
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.requests = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float, ok: bool):
+        self.requests += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+
+    def record_cancelled(self, elapsed: float):
+        """
+        Запрос отменён (проиграл в hedging): ответа не было как минимум
+        `elapsed` секунд — это нижняя оценка задержки, а не ошибка
+        """
+        self.latencies.append(elapsed)
+
+    def _quantile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def median(self) -> Optional[float]:
+        return self._quantile(0.5)
+
+    @property
+    def p90(self) -> Optional[float]:
+        return self._quantile(0.9)
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def measured(self) -> bool:
+        return bool(self.latencies)
+
+    def expected_latency(self) -> float:
+        """Ожидаемое время до успеха (у незамеренного провайдера — доля ошибок)"""
+        median = self.median
+        if median is None:
+            return self.error_rate
+        return median / max(0.05, 1 - self.error_rate)
+
+    def to_dict(self) -> Dict:
+        median, p90 = self.median, self.p90
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "error_rate": round(self.error_rate, 3),
+            "p50_s": round(median, 3) if median is not None else None,
+            "p90_s": round(p90, 3) if p90 is not None else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class Router:
+    """
+    Выбор провайдера на каждый запрос
+
+    Провайдеры ранжируются по ProviderStats.expected_latency (при
+    равенстве — в порядке списка); ещё не замеренные идут после
+    замеренных (их задержку измерят hedging и failover), отключённые
+    circuit breaker'ом пропускаются до пробного запроса.
+
+    `timeout` — на весь запрос вместе с failover и hedging; не
+    ответившие к дедлайну провайдеры записываются в ошибки.
+    Асинхронный запрос, не получивший ответа за p90 задержки
+    основного провайдера (не раньше `hedge_min_delay`, до первых
+    замеров — `hedge_delay`), дублируется на следующий провайдер.
+    """
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge: bool = LLM_HEDGE_ENABLED,
+        hedge_delay: float = LLM_HEDGE_DELAY,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+        window: int = LLM_STATS_WINDOW,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT
+    ):
+        if not providers:
+            raise ValueError("Нужен хотя бы один провайдер LLM")
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.stats: Dict[str, ProviderStats] = {p.name: ProviderStats(window) for p in providers}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            p.name: CircuitBreaker(failure_threshold, reset_timeout) for p in providers
+        }
+
+    def ranked(self) -> List[Provider]:
+        """Провайдеры от лучшего к худшему"""
+        order = {p.name: i for i, p in enumerate(self.providers)}
+        return sorted(
+            self.providers,
+            key=lambda p: (
+                self.breakers[p.name].state != "closed",
+                not self.stats[p.name].measured,
+                self.stats[p.name].expected_latency(),
+                order[p.name]
+            )
+        )
+
+    def _take(self, candidates: List[Provider]) -> Optional[Provider]:
+        """Следующий провайдер, которого пропускает circuit breaker"""
+        while candidates:
+            provider = candidates.pop(0)
+            if self.breakers[provider.name].allow():
+                return provider
+            logger.debug(f"LLM: {provider.name} отключён, пропускаем")
+        return None
+
+    def _record(self, provider: Provider, started: float, error: Optional[BaseException] = None):
+        self.stats[provider.name].record(time.monotonic() - started, error is None)
+        if error is None:
+            self.breakers[provider.name].record_success()
+        else:
+            self.breakers[provider.name].record_failure()
+            logger.warning(f"LLM: {provider.name} не ответил: {str(error) or type(error).__name__}")
+
+    def _abandon(self, provider: Provider, started: float):
+        """
+        Запрос брошен без исхода (проиграл в hedging, отменён вызывающим,
+        поток закрыт раньше конца): ошибкой это не считается, но пробный
+        запрос half-open отпускается — иначе провайдер не вернётся
+        """
+        self.stats[provider.name].record_cancelled(time.monotonic() - started)
+        self.breakers[provider.name].release_probe()
+
+    def _hedge_after(self, provider: Provider) -> float:
+        p90 = self.stats[provider.name].p90
+        return self.hedge_delay if p90 is None else max(self.hedge_min_delay, p90)
+
+    def complete(
+        self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str
+    ) -> Completion:
+        """Синхронный запрос с failover (без hedging)"""
+        candidates = self.ranked()
+        error: Optional[BaseException] = None
+        while True:
+            provider = self._take(candidates)
+            if provider is None:
+                break
+            started = time.monotonic()
+            try:
+                result = provider.complete(messages, max_tokens, temperature, provider.model_for(model))
+            except Exception as e:
+                self._record(provider, started, e)
+                error = e
+                continue
+            except BaseException:
+                self._abandon(provider, started)
+                raise
+            self._record(provider, started)
+            return result
+        raise error or NoProviderError("Все провайдеры LLM отключены")
+
+    async def acomplete(
+        self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str,
+        timeout: Optional[float] = LLM_TIMEOUT
+    ) -> Completion:
+        """
+        Асинхронный запрос с hedging и failover
+
+        Raises:
+            asyncio.TimeoutError: если за `timeout` не ответил ни один провайдер
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        candidates = self.ranked()
+        running: Dict[asyncio.Task, Tuple[Provider, float]] = {}
+        hedges = set()
+        error: Optional[BaseException] = None
+        timed_out = False
+
+        def launch() -> Optional[asyncio.Task]:
+            provider = self._take(candidates)
+            if provider is None:
+                return None
+            task = asyncio.ensure_future(
+                provider.acomplete(messages, max_tokens, temperature, provider.model_for(model))
+            )
+            running[task] = (provider, time.monotonic())
+            return task
+
+        try:
+            launch()
+            while running:
+                wait = None if deadline is None else max(0.0, deadline - loop.time())
+                primary = next(iter(running.values()))[0]
+                hedging = self.hedge and len(running) == 1 and bool(candidates)
+                if hedging:
+                    after = self._hedge_after(primary)
+                    wait = after if wait is None else min(wait, after)
+
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if deadline is not None and loop.time() >= deadline:
+                        timed_out = True
+                        raise asyncio.TimeoutError()
+                    task = launch() if hedging else None
+                    if task is not None:
+                        hedges.add(task)
+                        self.stats[primary.name].hedges += 1
+                        logger.info(f"LLM: {primary.name} отвечает дольше обычного, дублируем запрос")
+                    continue
+
+                for task in done:
+                    provider, started = running.pop(task)
+                    if task.exception() is not None:
+                        self._record(provider, started, task.exception())
+                        error = task.exception()
+                        continue
+                    self._record(provider, started)
+                    if task in hedges:
+                        self.stats[provider.name].hedge_wins += 1
+                    return task.result()
+
+                if not running:
+                    launch()  # failover
+        finally:
+            for task, (provider, started) in running.items():
+                task.cancel()
+                if timed_out:
+                    # Не ответил до дедлайна — это ошибка провайдера, медленный
+                    # провайдер должен отключаться circuit breaker'ом
+                    self._record(provider, started, asyncio.TimeoutError(f"нет ответа за {timeout:g} с"))
+                else:
+                    self._abandon(provider, started)
+
+        raise error or NoProviderError("Все провайдеры LLM отключены")
+
+    async def astream(
+        self, messages: List[Dict[str, str]], max_tokens: int, temperature: float, model: str,
+        timeout: Optional[float] = LLM_TIMEOUT
+    ) -> AsyncIterator[Completion]:
+        """
+        Потоковый запрос: failover возможен только до первого куска
+
+        Raises:
+            asyncio.TimeoutError: если ответ не закончился за `timeout` секунд
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(0.0, deadline - loop.time())
+
+        candidates = self.ranked()
+        error: Optional[BaseException] = None
+        while True:
+            provider = self._take(candidates)
+            if provider is None:
+                break
+            started = time.monotonic()
+            chunks = provider.astream(messages, max_tokens, temperature, provider.model_for(model)).__aiter__()
+            first = True
+            try:
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(chunks.__anext__(), remaining())
+                    except StopAsyncIteration:
+                        break
+                    first = False
+                    yield piece
+            except Exception as e:
+                self._record(provider, started, e)  # в том числе таймаут дедлайна
+                if first and not isinstance(e, asyncio.TimeoutError):
+                    error = e
+                    continue  # ещё ничего не отдано — пробуем следующий
+                raise
+            except BaseException:
+                # Отмена или закрытие потока вызывающим (GeneratorExit)
+                self._abandon(provider, started)
+                raise
+            finally:
+                await chunks.aclose()
+            self._record(provider, started)
+            return
+        raise error or NoProviderError("Все провайдеры LLM отключены")
+
+    def report(self) -> Dict[str, Dict]:
+        """Состояние провайдеров: статистика и состояние circuit breaker"""
+        return {
+            p.name: {**self.stats[p.name].to_dict(), "state": self.breakers[p.name].state}
+            for p in self.providers
+        }
+
+    async def aclose(self):
+        """Закрывает соединения всех провайдеров в текущем event loop"""
+        for provider in self.providers:
+            await provider.aclose()
+
+
+def build_provider(name: str) -> Provider:
+    """Провайдер по имени из LLM_PROVIDERS"""
+    if name == "groq":
+        return GroqProvider()
+    if name == "openai":
+        return OpenAICompatibleProvider("openai", LLM_OPENAI_BASE_URL, LLM_OPENAI_API_KEY, LLM_OPENAI_MODEL)
+    if name == "stub":
+        return StubProvider(latency=LLM_STUB_LATENCY, failure_rate=LLM_STUB_FAILURE_RATE)
+    raise ValueError(f"Неизвестный провайдер LLM: {name}")
+
+
+_router: Optional[Router] = None
+
+
+def get_router() -> Router:
+    """Общий роутер процесса (провайдеры из LLM_PROVIDERS)"""
+    global _router
+    if _router is None:
+        _router = Router([build_provider(name) for name in LLM_PROVIDERS])
+    return _router
+
+
+if __name__ == "__main__":
+    # python -m trend_hunter.providers [запросов] [--configured]
+    # Без --configured — офлайн-бенчмарк роутера на заглушках
+    import sys
+
+    logging.basicConfig(level=logging.WARNING)
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    count = int(args[0]) if args else 50
+    if "--configured" in sys.argv:
+        router = get_router()
+    else:
+        router = Router([
+            StubProvider("stub-flaky", latency=0.02, failure_rate=0.3, seed=1),
+            StubProvider("stub-fast", latency=0.05, seed=2),
+            StubProvider("stub-slow", latency=0.3, seed=3),
+        ], hedge_delay=0.1, hedge_min_delay=0.05)
+
+    async def bench():
+        messages = [{"role": "user", "content": "Верни JSON с ключом \"saas_ideas\": invoices automation invoices"}]
+        started = time.monotonic()
+        latencies = []
+        for _ in range(count):
+            begin = time.monotonic()
+            await router.acomplete(messages, 500, 0.7, "llama-3.3-70b-versatile", timeout=10)
+            latencies.append(time.monotonic() - begin)
+        await router.aclose()
+        latencies.sort()
+        print(f"{count} запросов за {time.monotonic() - started:.2f} с; "
+              f"p50 {latencies[len(latencies) // 2] * 1000:.0f} мс, p90 {latencies[int(len(latencies) * 0.9)] * 1000:.0f} мс")
+        for name, row in router.report().items():
+            print(f"  {name:<12} {row}")
+
+    asyncio.run(bench())
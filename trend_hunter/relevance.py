@@ -0,0 +1,220 @@
+"""
+Локальный отбор релевантных items до запроса к LLM
+
+Каждый собранный item (все источники вместе) оценивается по BM25
+против тематических профилей (RELEVANCE_PROFILES, по одному на
+категорию из SEARCH_CATEGORIES). Оценка item — лучший из профилей.
+В модель уходят только верхние RELEVANCE_TOP_K items, причём лучшие
+RELEVANCE_MIN_PER_SOURCE из каждого источника — всегда.
+
+Текст не токенизируется целиком: регулярное выражение ищет в нём
+только слова профилей, а всё остальное (tf, df, idf, нормировка по
+длине, оценки по профилям) считается массивами NumPy.
+"""
+import re
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Callable, Dict, List, Tuple
+import logging
+
+import numpy as np
+
+from .config import RELEVANCE_PROFILES, RELEVANCE_TOP_K, RELEVANCE_MIN_PER_SOURCE
+
+logger = logging.getLogger(__name__)
+
+# Текст, по которому оценивается item каждого источника
+SOURCE_TEXT: Dict[str, Callable[[Dict], str]] = {
+    "google_trends": lambda t: t.get("title") or "",
+    "reddit": lambda p: f"{p.get('title') or ''} {(p.get('selftext') or '')[:300]}",
+    "hackernews": lambda h: f"{h.get('title') or ''} {(h.get('text') or '')[:300]}",
+    "producthunt": lambda p: f"{p.get('name') or ''} {p.get('tagline') or ''} {p.get('category') or ''}",
+}
+
+
+class RelevanceScorer:
+    """
+    BM25 по тематическим профилям
+
+    Профиль — набор слов (запрос). Названия профилей тоже входят
+    в их слова. Длина документа для нормировки — в символах: в BM25
+    важно только отношение к средней длине.
+
+    Поиск слов профилей в тексте — единственная часть, линейная по
+    объёму текста; её результат кэшируется по тексту, так что
+    повторная оценка тех же items (следующий запуск, другой
+    анализатор) — только арифметика NumPy.
+    """
+
+    def __init__(
+        self,
+        profiles: Dict[str, List[str]] = RELEVANCE_PROFILES,
+        k1: float = 1.2,
+        b: float = 0.75,
+        cache_size: int = 100_000
+    ):
+        self.topics = list(profiles)
+        self.k1 = k1
+        self.b = b
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[List[int], int]]" = OrderedDict()
+
+        terms: Dict[str, int] = {}
+        pairs: List[Tuple[int, int]] = []
+        for topic_index, (topic, words) in enumerate(profiles.items()):
+            for word in [topic.lower(), *words]:
+                word = word.strip().lower()
+                if not word:
+                    continue
+                term_index = terms.setdefault(word, len(terms))
+                pairs.append((term_index, topic_index))
+
+        self.terms = terms
+        # Вес слова в профиле: 1, если слово в него входит
+        self.weights = np.zeros((len(terms), len(self.topics)))
+        for term_index, topic_index in pairs:
+            self.weights[term_index, topic_index] = 1.0
+
+        # Длинные варианты раньше: "no-code" не должен матчиться как "no"
+        alternatives = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+        self.pattern = re.compile(rf"(?<![\w-])({alternatives})(?![\w-])") if terms else None
+
+    def _postings(self, text: str) -> Tuple[List[int], int]:
+        """Слова профилей в тексте и длина текста (с кэшем по тексту)"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+
+        lowered = text.lower()
+        cached = ([self.terms[word] for word in self.pattern.findall(lowered)], len(lowered) + 1)
+        self._cache[text] = cached
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return cached
+
+    def scores(self, texts: List[str]) -> np.ndarray:
+        """Матрица оценок (items × профили)"""
+        n = len(texts)
+        scores = np.zeros((n, len(self.topics)))
+        if n == 0 or self.pattern is None:
+            return scores
+
+        postings = [self._postings(text) for text in texts]
+        counts = np.fromiter((len(found) for found, _ in postings), dtype=np.int64, count=n)
+        if not counts.any():
+            return scores
+        lengths = np.fromiter((length for _, length in postings), dtype=np.float64, count=n)
+
+        vocabulary = len(self.terms)
+        docs = np.repeat(np.arange(n), counts)
+        found = np.fromiter(chain.from_iterable(found for found, _ in postings), dtype=np.int64, count=int(counts.sum()))
+        keys, tf = np.unique(docs * vocabulary + found, return_counts=True)
+        doc, term = np.divmod(keys, vocabulary)
+
+        df = np.bincount(term, minlength=vocabulary)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths[doc] / lengths.mean())
+        weight = idf[term] * tf * (self.k1 + 1) / (tf + norm)
+
+        for topic_index in range(len(self.topics)):
+            scores[:, topic_index] = np.bincount(
+                doc, weights=weight * self.weights[term, topic_index], minlength=n
+            )
+        return scores
+
+    def best(self, texts: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """Лучшая оценка каждого item и профиль, которому она принадлежит"""
+        scores = self.scores(texts)
+        if not self.topics:
+            return np.zeros(len(texts)), [""] * len(texts)
+        best = scores.argmax(axis=1)
+        return scores.max(axis=1), [self.topics[i] for i in best]
+
+
+_scorer = None
+
+
+def get_scorer() -> RelevanceScorer:
+    """Общий scorer процесса (регулярка собирается один раз)"""
+    global _scorer
+    if _scorer is None:
+        _scorer = RelevanceScorer()
+    return _scorer
+
+
+def prescan(item: Dict, scorer: RelevanceScorer = None):
+    """
+    Ищет слова профилей в тексте item заранее (результат кэшируется)
+
+    Вызывается из потока сбора по мере поступления items, пока
+    остальные источники ещё качаются: к моменту select_relevant
+    линейная по тексту часть уже сделана.
+    """
+    scorer = scorer or get_scorer()
+    if scorer.pattern is None:
+        return
+    text_of = SOURCE_TEXT.get(item.get("source"), lambda item: str(item.get("title") or ""))
+    scorer._postings(text_of(item))
+
+
+def select_relevant(
+    sources: Dict[str, List[Dict]],
+    top_k: int = RELEVANCE_TOP_K,
+    min_per_source: int = RELEVANCE_MIN_PER_SOURCE,
+    scorer: RelevanceScorer = None
+) -> Dict[str, List[Dict]]:
+    """
+    Отбирает самые релевантные items всех источников
+
+    Args:
+        sources: источник -> items (ключи как в SOURCE_TEXT)
+        top_k: сколько items оставить всего
+        min_per_source: сколько лучших items каждого источника оставить всегда
+
+    Returns:
+        Те же источники, items в каждом — по убыванию релевантности
+        (при равной оценке — в исходном порядке)
+    """
+    scorer = scorer or get_scorer()
+    started = time.perf_counter()
+
+    names = [name for name, items in sources.items() if items]
+    texts: List[str] = []
+    bounds: List[Tuple[int, int]] = []
+    for name in names:
+        text_of = SOURCE_TEXT.get(name, lambda item: str(item.get("title") or ""))
+        start = len(texts)
+        texts.extend(text_of(item) for item in sources[name])
+        bounds.append((start, len(texts)))
+
+    scores, _ = scorer.best(texts)
+    total = len(texts)
+
+    # Глобальный порядок: по убыванию оценки, при равенстве — по позиции
+    order = np.lexsort((np.arange(total), -scores))
+    keep = np.zeros(total, dtype=bool)
+
+    local_orders = []
+    for start, end in bounds:
+        local = np.lexsort((np.arange(end - start), -scores[start:end]))
+        keep[start + local[:min_per_source]] = True
+        local_orders.append(local)
+
+    room = top_k - int(keep.sum())
+    if room > 0:
+        rest = order[~keep[order]]
+        keep[rest[:room]] = True
+
+    selected = {name: [] for name in sources}
+    for name, (start, _), local in zip(names, bounds, local_orders):
+        items = sources[name]
+        selected[name] = [items[i] for i in local if keep[start + i]]
+
+    kept = int(keep.sum())
+    logger.info(
+        f"Релевантность: {kept}/{total} items в анализ "
+        f"({(time.perf_counter() - started) * 1000:.1f} мс)"
+    )
+    return selected
@@ -0,0 +1,280 @@
+"""
+Ремонт JSON из ответов модели
+
+Модель иногда отвечает почти-JSON: в ```json-обёртке, с
+пояснениями до или после, с висячими запятыми, или обрывается
+на max_tokens посреди массива идей. Раньше такой ответ целиком
+превращался в {"error": ...}, и запуск (вместе с 4000 токенов
+генерации) приходилось повторять.
+
+repair_json спасает всё, что успело закрыться; continue_json
+дозапрашивает у модели только недостающий хвост; parse_validated
+сверяет результат со схемой (см. schema.py).
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from .config import LLM_CONTINUATION_TOKENS, LLM_MAX_CONTINUATIONS, LLM_TIMEOUT
+from .llm import acomplete, complete, parse_json_response
+from .llm_cache import LLMRequest, get_llm_cache
+from .schema import Schema
+
+logger = logging.getLogger(__name__)
+
+CONTINUE_PROMPT = (
+    "Ответ оборвался. Продолжи JSON ровно с символа, на котором он оборвался: "
+    "без повтора уже написанного, без markdown и пояснений."
+)
+
+_CLOSING = {"{": "}", "[": "]"}
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*", re.IGNORECASE)
+_DECODER = json.JSONDecoder(strict=False)
+
+# Сколько точек среза пробовать с конца, прежде чем сдаться
+_MAX_CUTS = 20
+
+
+def _at_top(stack: List[str]) -> bool:
+    """Значение лежит прямо в корневом объекте или в его массиве"""
+    return len(stack) == 1 or (len(stack) == 2 and stack[-1] == "[")
+
+
+def _drop_trailing_comma(out: List[str]):
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+
+def _scan(text: str, start: int) -> Tuple[str, List[str], List[Tuple[int, Tuple[str, ...]]]]:
+    """
+    Один проход по JSON с позиции `start`
+
+    Висячие запятые выбрасываются, всё после закрытия корня (```,
+    пояснения) отбрасывается.
+
+    Returns:
+        (очищенный текст, незакрытые скобки, точки среза). Точка
+        среза — (длина текста, открытые скобки) сразу после значения,
+        законченного в корне или в массиве корня: обрезав там и закрыв
+        скобки, получим JSON без недописанных идей.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = escaped = False
+    last = ""  # последний значимый символ вне строк
+
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if _at_top(stack) and (last == ":" or stack[-1] == "["):
+                    cuts.append((len(out), tuple(stack)))
+                last = ch
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+            last = ch
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            out.append(_CLOSING[stack.pop()])
+            last = ch
+            if not stack:
+                break
+            if _at_top(stack):
+                cuts.append((len(out), tuple(stack)))
+        else:
+            out.append(ch)
+            if not ch.isspace():
+                last = ch
+
+    return "".join(out), stack, cuts
+
+
+def _decode_strict(text: str, start: int) -> Optional[Any]:
+    """Быстрый путь: валидный JSON с позиции start (текст после него не мешает)"""
+    try:
+        return _DECODER.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def repair_json(text: str) -> Tuple[Any, bool]:
+    """
+    Достаёт JSON из ответа модели, чиня то, что можно
+
+    Returns:
+        (значение, был ли ответ оборван). У оборванного ответа
+        остаются только законченные значения корня и законченные
+        элементы его массивов.
+
+    Raises:
+        json.JSONDecodeError: если спасти нечего
+    """
+    start = text.find("{")
+    if start < 0:
+        raise json.JSONDecodeError("в ответе нет JSON-объекта", text, 0)
+
+    value = _decode_strict(text, start)
+    if value is not None:
+        return value, False
+
+    cleaned, stack, cuts = _scan(text, start)
+    if not stack:
+        return json.loads(cleaned, strict=False), False
+
+    for length, open_brackets in reversed(cuts[-_MAX_CUTS:]):
+        head = cleaned[:length].rstrip().rstrip(",")
+        candidate = head + "".join(_CLOSING[bracket] for bracket in reversed(open_brackets))
+        try:
+            return json.loads(candidate, strict=False), True
+        except json.JSONDecodeError:
+            continue
+    raise json.JSONDecodeError("ответ оборван до первого законченного значения", text, len(text))
+
+
+def is_truncated(text: str) -> bool:
+    """Оборван ли JSON в ответе (корневой объект не закрыт)"""
+    start = text.find("{")
+    if start < 0 or _decode_strict(text, start) is not None:
+        return False
+    return bool(_scan(text, start)[1])
+
+
+def continuation_messages(messages: List[Dict[str, str]], text: str) -> List[Dict[str, str]]:
+    """Сообщения для дозапроса хвоста: исходный диалог + оборванный ответ"""
+    return messages + [
+        {"role": "assistant", "content": text},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def _join_tail(text: str, tail: str) -> str:
+    """Приклеивает дописанный хвост; если модель начала ответ заново — берёт его"""
+    tail = _FENCE_RE.sub("", tail, count=1)
+    joined = text + tail
+    if is_truncated(joined) and tail.lstrip().startswith("{") and not is_truncated(tail):
+        return tail
+    return joined
+
+
+def _remember_repaired(text: str, cache_request: Optional[LLMRequest], continued: bool):
+    """Кладёт в LLM-кэш исправленный ответ, чтобы не чинить и не дописывать его снова"""
+    cache = get_llm_cache() if cache_request is not None else None
+    if cache is None or is_truncated(text):
+        return
+    if not continued:
+        try:
+            parse_json_response(text)
+            return  # ответ и так валиден — его уже закэшировал llm
+        except ValueError:
+            pass
+    try:
+        value, _ = repair_json(text)
+    except ValueError:
+        return
+    cache.store(cache_request, json.dumps(value, ensure_ascii=False))
+
+
+def continue_json(
+    messages: List[Dict[str, str]],
+    text: str,
+    cache_request: Optional[LLMRequest] = None,
+    max_continuations: int = LLM_MAX_CONTINUATIONS
+) -> str:
+    """
+    Дописывает оборванный JSON-ответ дозапросом хвоста
+
+    Дозапрос ограничен LLM_CONTINUATION_TOKENS: модель не генерирует
+    ответ заново, а продолжает с места обрыва. Ошибка дозапроса не
+    фатальна — останется то, что спасёт repair_json.
+
+    Returns:
+        Текст ответа (дописанный, если удалось)
+    """
+    continued = False
+    for attempt in range(max_continuations):
+        if not is_truncated(text):
+            break
+        logger.warning(f"Ответ модели оборван на {len(text)} символах, дозапрос хвоста ({attempt + 1})")
+        try:
+            tail = complete(
+                continuation_messages(messages, text),
+                max_tokens=LLM_CONTINUATION_TOKENS, temperature=0.2
+            )
+        except Exception as e:
+            logger.error(f"Дозапрос хвоста не удался: {str(e) or type(e).__name__}")
+            break
+        text = _join_tail(text, tail)
+        continued = True
+
+    _remember_repaired(text, cache_request, continued)
+    return text
+
+
+async def acontinue_json(
+    messages: List[Dict[str, str]],
+    text: str,
+    timeout: Optional[float] = LLM_TIMEOUT,
+    cache_request: Optional[LLMRequest] = None,
+    max_continuations: int = LLM_MAX_CONTINUATIONS
+) -> str:
+    """Асинхронная версия continue_json"""
+    continued = False
+    for attempt in range(max_continuations):
+        if not is_truncated(text):
+            break
+        logger.warning(f"Ответ модели оборван на {len(text)} символах, дозапрос хвоста ({attempt + 1})")
+        try:
+            tail = await acomplete(
+                continuation_messages(messages, text),
+                max_tokens=LLM_CONTINUATION_TOKENS, temperature=0.2, timeout=timeout
+            )
+        except Exception as e:
+            logger.error(f"Дозапрос хвоста не удался: {str(e) or type(e).__name__}")
+            break
+        text = _join_tail(text, tail)
+        continued = True
+
+    _remember_repaired(text, cache_request, continued)
+    return text
+
+
+def parse_validated(text: str, schema: Schema) -> Dict:
+    """
+    Разбирает ответ модели по схеме, спасая всё законченное
+
+    Если что-то пришлось чинить, в результат добавляется поле
+    repair: {"truncated": оборван ли ответ, "fixes": число исправлений}.
+
+    Raises:
+        json.JSONDecodeError: если в ответе нечего спасти
+        ValueError: если ответ не подходит под схему даже после исправлений
+    """
+    value, truncated = repair_json(text)
+    data, problems = schema.validate(value)
+    if data is None:
+        raise ValueError(f"Ответ не подходит под схему: {'; '.join(problems[:3])}")
+
+    if truncated or problems:
+        logger.warning(
+            f"Ответ модели исправлен: {'оборван, ' if truncated else ''}{len(problems)} исправлений"
+            + (f" ({'; '.join(problems[:3])}{'; ...' if len(problems) > 3 else ''})" if problems else "")
+        )
+        data["repair"] = {"truncated": truncated, "fixes": len(problems)}
+    return data
@@ -6,16 +6,22 @@ SaaS Ideas Analyzer
 import json
 import logging
 import os
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from datetime import datetime
-from groq import Groq
-from .config import GROQ_API_KEY
+from .config import DEDUPE_ENABLED, LLM_MODEL, LLM_TIMEOUT, MAP_CHUNK_TOKENS, SAAS_SCORE_WEIGHTS
+from .dedupe import cluster_fields, collapse_duplicates, engagement_score
+from .llm import acomplete, complete
+from .llm_cache import LLMRequest, summary_items
+from .mapreduce import chunk_sections, dedupe_ideas, map_chunks, merge_lists, merge_texts, unique_items
+from .prompting import PROMPT_ENCODING, data_budget, encode_sections, fit_sections
+from .relevance import select_relevant
+from .repair import acontinue_json, continue_json, parse_validated
+from .schema import Field, Schema
+from .scoring import rank, score_ideas
+from .streaming import stream_items
 
 logger = logging.getLogger(__name__)
 
-# Инициализация Groq (бесплатно)
-client = Groq(api_key=GROQ_API_KEY)
-
 
 SAAS_ANALYSIS_PROMPT = """Ты эксперт по SaaS-бизнесам и стартапам. Проанализируй данные и найди перспективные SaaS-идеи.
 
@@ -66,108 +72,145 @@ SAAS_ANALYSIS_PROMPT = """Ты эксперт по SaaS-бизнесам и ст
 Отвечай ТОЛЬКО валидным JSON."""
 
 
-def analyze_for_saas(
+SAAS_SYSTEM = "Ты эксперт по SaaS. Отвечай только валидным JSON."
+
+# Схема ответа на SAAS_ANALYSIS_PROMPT
+_TEXT_LIST = Field("list", items=Field("str"))
+
+SAAS_IDEA_SCHEMA = Schema({
+    "name": Field("str", required=True),
+    "problem": Field("str", required=True),
+    "target_audience": Field("str"),
+    "pricing_model": Field("str"),
+    "price_range": Field("str"),
+    "competitors": _TEXT_LIST,
+    "differentiation": Field("str"),
+    "mvp_features": _TEXT_LIST,
+    "mvp_complexity": Field("str", choices=("low", "medium", "high"), default="medium"),
+    "mvp_timeline": Field("str"),
+    "tech_stack": _TEXT_LIST,
+    "potential_score": Field("number", bounds=(1, 10), default=5),
+    "market_size": Field("str", choices=("small", "medium", "large"), default="medium"),
+    "why_now": Field("str"),
+    "risks": _TEXT_LIST,
+    "first_users": Field("str"),
+})
+
+SAAS_SCHEMA = Schema({
+    "saas_ideas": Field("list", required=True, items=Field("object", items=SAAS_IDEA_SCHEMA)),
+    "market_insights": Field("str", default=""),
+    "hot_niches": _TEXT_LIST,
+    "avoid": _TEXT_LIST,
+})
+
+
+def build_saas_sections(
     google_trends: List[Dict] = None,
     reddit_posts: List[Dict] = None,
     hackernews: List[Dict] = None,
     producthunt: List[Dict] = None
-) -> Dict:
+) -> Dict[str, List[Dict]]:
     """
-    Анализирует данные для поиска SaaS-идей
+    Все собранные данные в виде разделов для модели
 
-    Args:
-        google_trends: Тренды из Google
-        reddit_posts: Посты из Reddit
-        hackernews: Истории из HackerNews
-        producthunt: Продукты из Product Hunt
-
-    Returns:
-        Структурированный анализ с SaaS-идеями
+    Почти-дубликаты между источниками сливаются (см. dedupe.py), затем
+    items отбираются и упорядочиваются локально по релевантности
+    тематическим профилям (см. relevance.py) — до любого запроса к модели.
     """
-
-    # Собираем данные для анализа
-    data_summary = {}
+    sources = {
+        "google_trends": google_trends or [],
+        "reddit": reddit_posts or [],
+        "hackernews": hackernews or [],
+        "producthunt": producthunt or [],
+    }
+    if DEDUPE_ENABLED:
+        sources = collapse_duplicates(sources)
+
+    ranked = select_relevant(sources)
+    google_trends = ranked["google_trends"]
+    reddit_posts = ranked["reddit"]
+    hackernews = ranked["hackernews"]
+    producthunt = ranked["producthunt"]
+
+    sections = {}
 
     if google_trends:
-        data_summary["search_trends"] = [
+        sections["search_trends"] = [
             {"term": t.get("title"), "traffic": t.get("traffic")}
-            for t in google_trends[:15]
+            for t in google_trends
         ]
 
     if reddit_posts:
-        # Фокус на SaaS-релевантных постах
-        saas_keywords = ["saas", "tool", "app", "software", "automate", "api", "startup", "mvp", "product"]
-        relevant_posts = [
-            p for p in reddit_posts
-            if any(kw in p.get("title", "").lower() for kw in saas_keywords)
-        ][:20]
-
-        data_summary["reddit_discussions"] = [
+        sections["reddit_discussions"] = [
             {
                 "title": p.get("title"),
                 "subreddit": p.get("subreddit"),
-                "score": p.get("score"),
-                "preview": p.get("selftext", "")[:150]
+                "score": engagement_score(p),
+                "preview": p.get("selftext", "")[:150],
+                **cluster_fields(p)
             }
-            for p in (relevant_posts if relevant_posts else reddit_posts[:20])
+            for p in reddit_posts
         ]
 
     if hackernews:
         # Show HN особенно ценен
         show_hn = [h for h in hackernews if h.get("is_show_hn")]
-        top_stories = [h for h in hackernews if not h.get("is_show_hn")][:10]
+        top_stories = [h for h in hackernews if not h.get("is_show_hn")]
 
-        data_summary["hackernews_products"] = [
-            {"title": h.get("title"), "score": h.get("score"), "type": "Show HN"}
-            for h in show_hn[:15]
+        sections["hackernews_products"] = [
+            {"title": h.get("title"), "score": engagement_score(h), "type": "Show HN", **cluster_fields(h)}
+            for h in show_hn
         ]
-        data_summary["hackernews_trending"] = [
-            {"title": h.get("title"), "score": h.get("score")}
+        sections["hackernews_trending"] = [
+            {"title": h.get("title"), "score": engagement_score(h), **cluster_fields(h)}
             for h in top_stories
         ]
 
     if producthunt:
-        data_summary["new_products"] = [
+        sections["new_products"] = [
             {
                 "name": p.get("name"),
                 "tagline": p.get("tagline"),
-                "category": p.get("category")
+                "category": p.get("category"),
+                **cluster_fields(p)
             }
-            for p in producthunt[:20]
+            for p in producthunt
         ]
 
-    # Формируем промпт
-    prompt = SAAS_ANALYSIS_PROMPT.format(
-        data=json.dumps(data_summary, ensure_ascii=False, indent=2)
-    )
+    return sections
+
+
+def build_saas_summary(
+    google_trends: List[Dict] = None,
+    reddit_posts: List[Dict] = None,
+    hackernews: List[Dict] = None,
+    producthunt: List[Dict] = None
+) -> Dict:
+    """Выборка данных всех источников для одиночного запроса: столько, сколько влезает в бюджет промпта"""
+    sections = build_saas_sections(google_trends, reddit_posts, hackernews, producthunt)
+    return fit_sections(sections, data_budget(SAAS_ANALYSIS_PROMPT, SAAS_SYSTEM))
+
+
+def build_saas_messages(data_summary: Dict) -> List[Dict[str, str]]:
+    """Собирает сообщения для модели"""
+    prompt = SAAS_ANALYSIS_PROMPT.format(data=encode_sections(data_summary))
+    return [
+        {"role": "system", "content": SAAS_SYSTEM},
+        {"role": "user", "content": prompt}
+    ]
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "Ты эксперт по SaaS. Отвечай только валидным JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4000,
-            temperature=0.7
-        )
 
-        result_text = response.choices[0].message.content
+def _saas_request(data_summary: Dict) -> LLMRequest:
+    """Адрес запроса в LLM-кэше"""
+    return LLMRequest(LLM_MODEL, 0.7, PROMPT_ENCODING + SAAS_ANALYSIS_PROMPT, data_summary, summary_items(data_summary))
 
-        # Парсим JSON
-        if "```json" in result_text:
-            result_text = result_text.split("```json")[1].split("```")[0]
-        elif "```" in result_text:
-            result_text = result_text.split("```")[1].split("```")[0]
 
-        analysis = json.loads(result_text.strip())
+def _parse_saas_analysis(result_text: str, sources: Dict[str, int]) -> Dict:
+    """Разбирает ответ модели в анализ (или в словарь с ошибкой)"""
+    try:
+        analysis = parse_validated(result_text, SAAS_SCHEMA)
         analysis["analyzed_at"] = datetime.now().isoformat()
-        analysis["sources"] = {
-            "google_trends": len(google_trends or []),
-            "reddit": len(reddit_posts or []),
-            "hackernews": len(hackernews or []),
-            "producthunt": len(producthunt or [])
-        }
+        analysis["sources"] = sources
 
         logger.info(f"Найдено {len(analysis.get('saas_ideas', []))} SaaS-идей")
         return analysis
@@ -181,43 +224,169 @@ def analyze_for_saas(
         return {"error": str(e)}
 
 
+def _source_counts(google_trends, reddit_posts, hackernews, producthunt) -> Dict[str, int]:
+    return {
+        "google_trends": len(google_trends or []),
+        "reddit": len(reddit_posts or []),
+        "hackernews": len(hackernews or []),
+        "producthunt": len(producthunt or [])
+    }
+
+
+def analyze_for_saas(
+    google_trends: List[Dict] = None,
+    reddit_posts: List[Dict] = None,
+    hackernews: List[Dict] = None,
+    producthunt: List[Dict] = None
+) -> Dict:
+    """
+    Анализирует данные для поиска SaaS-идей
+
+    Args:
+        google_trends: Тренды из Google
+        reddit_posts: Посты из Reddit
+        hackernews: Истории из HackerNews
+        producthunt: Продукты из Product Hunt
+
+    Returns:
+        Структурированный анализ с SaaS-идеями
+    """
+    data_summary = build_saas_summary(google_trends, reddit_posts, hackernews, producthunt)
+    messages = build_saas_messages(data_summary)
+
+    request = _saas_request(data_summary)
+
+    try:
+        result_text = complete(messages, max_tokens=4000, temperature=0.7, cache_request=request)
+        result_text = continue_json(messages, result_text, cache_request=request)
+    except Exception as e:
+        logger.error(f"Ошибка анализа: {e}")
+        return {"error": str(e)}
+
+    return _parse_saas_analysis(
+        result_text, _source_counts(google_trends, reddit_posts, hackernews, producthunt)
+    )
+
+
+async def analyze_for_saas_async(
+    google_trends: List[Dict] = None,
+    reddit_posts: List[Dict] = None,
+    hackernews: List[Dict] = None,
+    producthunt: List[Dict] = None,
+    timeout: Optional[float] = LLM_TIMEOUT,
+    on_idea: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    Асинхронная версия analyze_for_saas: не блокирует event loop
+
+    В отличие от синхронной версии, анализирует все собранные данные:
+    если они не помещаются в один запрос, работает map-reduce —
+    куски анализируются параллельно, а идеи сливаются без повторов.
+
+    Args:
+        timeout: Сколько секунд ждать ответа модели
+        on_idea: Вызывается для каждой SaaS-идеи (со скором) сразу,
+            как модель её допишет — ещё до конца ответа
+        (остальные — как у analyze_for_saas)
+
+    Returns:
+        Структурированный анализ с SaaS-идеями
+    """
+    emit = _saas_emitter(on_idea) if on_idea is not None else None
+
+    sources = _source_counts(google_trends, reddit_posts, hackernews, producthunt)
+    chunks = chunk_sections(
+        build_saas_sections(google_trends, reddit_posts, hackernews, producthunt),
+        budget=min(MAP_CHUNK_TOKENS, data_budget(SAAS_ANALYSIS_PROMPT, SAAS_SYSTEM))
+    )
+    if len(chunks) > 1:
+        partials = await map_chunks(
+            chunks, build_saas_messages, _saas_request, timeout,
+            stream_key="saas_ideas", on_item=emit, schema=SAAS_SCHEMA
+        )
+        return _reduce_saas_analyses(partials, sources)
+
+    data_summary = chunks[0] if chunks else {}
+    messages = build_saas_messages(data_summary)
+    request = _saas_request(data_summary)
+
+    try:
+        if emit is not None:
+            result_text = await stream_items(messages, "saas_ideas", emit, timeout=timeout, cache_request=request)
+        else:
+            result_text = await acomplete(
+                messages, max_tokens=4000, temperature=0.7, timeout=timeout, cache_request=request
+            )
+        result_text = await acontinue_json(messages, result_text, timeout=timeout, cache_request=request)
+    except Exception as e:
+        message = str(e) or type(e).__name__  # у TimeoutError пустой текст
+        logger.error(f"Ошибка анализа: {message}")
+        return {"error": message}
+
+    return _parse_saas_analysis(result_text, sources)
+
+
+def _saas_text(idea: Dict) -> str:
+    return f"{idea.get('name', '')} {idea.get('problem', '')}"
+
+
+def _saas_emitter(on_idea: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    """Обработчик потока: отдаёт SaaS-идеи со скором, без повторов"""
+    def emit(idea: Dict):
+        idea, _ = SAAS_IDEA_SCHEMA.validate(idea)
+        if idea:
+            idea["final_score"] = score_saas_idea(idea)
+            on_idea(idea)
+
+    return unique_items(emit, text_of=_saas_text)
+
+
+def _potential(idea: Dict) -> float:
+    try:
+        return float(idea.get("potential_score", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _reduce_saas_analyses(partials: List[Optional[Dict]], sources: Dict[str, int]) -> Dict:
+    """Шаг reduce: сливает анализы отдельных кусков в один"""
+    succeeded = [partial for partial in partials if partial]
+    if not succeeded:
+        logger.error("Ошибка анализа: ни один кусок map-reduce не проанализирован")
+        return {"error": "ни один кусок map-reduce не проанализирован"}
+
+    ideas = dedupe_ideas(
+        (idea for partial in succeeded for idea in partial.get("saas_ideas", []) if isinstance(idea, dict)),
+        text_of=_saas_text,
+        score_of=_potential,
+        list_fields=("competitors", "mvp_features", "tech_stack", "risks")
+    )
+
+    analysis = {
+        "saas_ideas": ideas,
+        "market_insights": merge_texts(succeeded, "market_insights"),
+        "hot_niches": merge_lists(succeeded, "hot_niches"),
+        "avoid": merge_lists(succeeded, "avoid"),
+        "analyzed_at": datetime.now().isoformat(),
+        "sources": sources,
+        "map_reduce": {"chunks": len(partials), "failed": len(partials) - len(succeeded)}
+    }
+
+    logger.info(f"Найдено {len(ideas)} SaaS-идей в {len(succeeded)}/{len(partials)} кусках")
+    return analysis
+
+
 def score_saas_idea(idea: Dict) -> float:
     """
     Рассчитывает финальный скор SaaS-идеи
 
-    Формула:
+    Формула — веса SAAS_SCORE_WEIGHTS (см. config.py):
     - Потенциал (0-40)
     - Сложность MVP (0-30)
     - Размер рынка (0-15)
     - Дифференциация (0-15)
     """
-    score = 0
-
-    # Потенциал от AI (1-10 → 0-40)
-    potential = idea.get("potential_score", 5)
-    score += potential * 4
-
-    # Сложность MVP
-    complexity = idea.get("mvp_complexity", "medium")
-    if complexity == "low":
-        score += 30
-    elif complexity == "medium":
-        score += 15
-
-    # Размер рынка
-    market = idea.get("market_size", "medium")
-    if market == "large":
-        score += 15
-    elif market == "medium":
-        score += 10
-    else:
-        score += 5
-
-    # Дифференциация (есть ли уникальность)
-    if idea.get("differentiation") and len(idea["differentiation"]) > 20:
-        score += 15
-
-    return min(score, 100)
+    return score_ideas([idea], SAAS_SCORE_WEIGHTS)[0]
 
 
 def rank_saas_ideas(analysis: Dict) -> List[Dict]:
@@ -227,13 +396,22 @@ def rank_saas_ideas(analysis: Dict) -> List[Dict]:
     Returns:
         Отсортированный список идей
     """
-    ideas = analysis.get("saas_ideas", [])
+    return rank(analysis.get("saas_ideas", []), SAAS_SCORE_WEIGHTS)
+
+
+def telegram_stream(send: Callable[[str], None]) -> Callable[[Dict], None]:
+    """
+    Обработчик on_idea для analyze_for_saas_async: форматирует каждую
+    идею для Telegram и передаёт в `send`, как только она сгенерирована
+    """
+    count = 0
 
-    for idea in ideas:
-        idea["final_score"] = score_saas_idea(idea)
+    def on_idea(idea: Dict):
+        nonlocal count
+        count += 1
+        send(format_idea_for_telegram(idea, count))
 
-    ideas.sort(key=lambda x: x["final_score"], reverse=True)
-    return ideas
+    return on_idea
 
 
 def format_idea_for_telegram(idea: Dict, rank: int) -> str:
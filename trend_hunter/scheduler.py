@@ -0,0 +1,404 @@
+"""
+Общий бюджет запросов к LLM (RPM / TPM)
+
+Боты и анализаторы ходят с одним ключом Groq, а лимиты провайдера
+считаются на ключ: утренний запуск trend_hunter мог выбрать всю
+минутную квоту, пока пользователи ботов ждали ответа. Теперь
+каждый запрос сначала резервирует бюджет: один запрос и оценку
+токенов (промпт + max_tokens). Если бюджета нет — запрос ждёт в
+очереди, а не падает с 429.
+
+Приоритеты:
+    interactive — боты: идут первыми в очереди своего процесса и
+                  могут брать весь бюджет
+    batch       — анализ: последняя доля бюджета
+                  (LLM_INTERACTIVE_RESERVE) оставлена ботам
+
+Расход за последнюю минуту пишется в общий файл (LLM_BUDGET_FILE,
+под flock), поэтому бюджет делят и разные процессы. Без fcntl
+(Windows) бюджет считается в пределах процесса. Запросы к локальной
+заглушке (LLM_PROVIDERS=stub) квоту ключа не тратят и общий журнал
+не трогают.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .config import (
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_INTERACTIVE_RESERVE,
+    LLM_BUDGET_FILE, LLM_BUDGET_SHARED, LLM_PROVIDERS
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = {INTERACTIVE: 0, BATCH: 1}
+
+WINDOW = 60.0  # лимиты провайдера — поминутные
+
+# Ожидающий ждёт не дольше этого между проверками бюджета; раньше —
+# если в этом процессе завершился запрос (бюджет мог освободиться)
+_MAX_POLL = 0.5
+_TICK = 0.02
+# Ожидание дольше этого попадает в лог
+_LOG_WAIT = 1.0
+
+# Провайдеры, которые не ходят с ключом Groq и не тратят его квоту
+_UNMETERED_PROVIDERS = {"stub"}
+
+
+class BudgetLedger:
+    """
+    Журнал расхода за последнюю минуту: [время, токены, id] на запрос
+
+    С `path` журнал общий для процессов: каждое чтение-изменение
+    файла идёт под эксклюзивным flock, запись — через временный файл.
+    Методы блокирующие: из event loop их зовут через asyncio.to_thread.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path if path and fcntl is not None else None
+        self._entries: List[List] = []
+        self._lock = threading.Lock()  # между потоками процесса
+        if path and fcntl is None:
+            logger.info("LLM-бюджет: нет fcntl, бюджет считается в пределах процесса")
+
+    def _read(self) -> List[List]:
+        if self.path is None:
+            return self._entries
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", [])
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            logger.error(f"Ошибка чтения LLM-бюджета {self.path}: {e}")
+            return []
+
+    def _write(self, entries: List[List]):
+        if self.path is None:
+            self._entries = entries
+            return
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, change):
+        """Читает журнал, применяет change(entries, now) и сохраняет — под блокировкой"""
+        with self._lock:
+            if self.path is None:
+                now = time.time()
+                entries = [e for e in self._entries if now - e[0] < WINDOW]
+                result = change(entries, now)
+                self._entries = entries
+                return result
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    now = time.time()
+                    entries = [e for e in self._read() if now - e[0] < WINDOW]
+                    result = change(entries, now)
+                    self._write(entries)
+                    return result
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def try_reserve(self, entry_id: str, tokens: int, rpm: float, tpm: float) -> Tuple[bool, float]:
+        """
+        Резервирует запрос и `tokens`, если они влезают в минутный бюджет
+
+        Returns:
+            (зарезервировано ли; через сколько секунд есть смысл повторить)
+        """
+        def change(entries: List[List], now: float) -> Tuple[bool, float]:
+            used = sum(e[1] for e in entries)
+            fits_requests = rpm <= 0 or len(entries) + 1 <= rpm
+            fits_tokens = tpm <= 0 or used + tokens <= tpm
+            if fits_requests and fits_tokens:
+                entries.append([now, tokens, entry_id])
+                return True, 0.0
+            return False, _free_after(entries, now, rpm, tpm, tokens)
+
+        return self._update(change)
+
+    def settle(self, entry_id: str, tokens: int):
+        """Заменяет оценку токенов запроса фактическим расходом"""
+        def change(entries: List[List], now: float):
+            for entry in entries:
+                if entry[2] == entry_id:
+                    entry[1] = tokens
+                    break
+
+        self._update(change)
+
+    def discard(self, entry_id: str):
+        """Убирает резерв запроса, который так и не был отправлен"""
+        def change(entries: List[List], now: float):
+            entries[:] = [entry for entry in entries if entry[2] != entry_id]
+
+        self._update(change)
+
+    def usage(self) -> Dict[str, int]:
+        """Расход за последнюю минуту (всех процессов)"""
+        def change(entries: List[List], now: float) -> Dict[str, int]:
+            return {"requests": len(entries), "tokens": sum(e[1] for e in entries)}
+
+        return self._update(change)
+
+
+def _free_after(entries: List[List], now: float, rpm: float, tpm: float, tokens: int) -> float:
+    """Через сколько секунд из окна уйдёт достаточно старых запросов"""
+    requests, used = len(entries), sum(e[1] for e in entries)
+    for ts, spent, _ in sorted(entries):
+        requests -= 1
+        used -= spent
+        if (rpm <= 0 or requests + 1 <= rpm) and (tpm <= 0 or used + tokens <= tpm):
+            return max(0.0, ts + WINDOW - now)
+    return WINDOW
+
+
+class Ticket:
+    """Зарезервированный бюджет одного запроса"""
+
+    def __init__(self, entry_id: str, tokens: int, priority: str, waited: float):
+        self.entry_id = entry_id
+        self.tokens = tokens
+        self.priority = priority
+        self.waited = waited
+
+
+class LLMScheduler:
+    """
+    Очередь запросов к LLM с минутными лимитами
+
+    В процессе ожидающие упорядочены по приоритету, затем по времени
+    прихода; бюджет проверяет только голова очереди, так что batch
+    не обгоняет interactive, а большой запрос — не голодает за
+    мелкими. `reserve` — доля бюджета, которую batch не трогает.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        reserve: float = LLM_INTERACTIVE_RESERVE,
+        ledger: Optional[BudgetLedger] = None
+    ):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self.reserve = reserve
+        self.ledger = ledger or BudgetLedger()
+        self._queue: List[Tuple[int, int]] = []  # (приоритет, номер) ожидающих
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._released = 0  # растёт с каждым release: ожидающим пора проверить бюджет
+        self._stats = {name: {"requests": 0, "waited": 0, "wait_total_s": 0.0, "wait_max_s": 0.0} for name in PRIORITIES}
+
+    def _limits(self, priority: str) -> Tuple[float, float]:
+        if priority == INTERACTIVE:
+            return self.rpm, self.tpm
+        share = 1 - self.reserve
+        return (max(1, self.rpm * share) if self.rpm > 0 else 0,
+                max(1, self.tpm * share) if self.tpm > 0 else 0)
+
+    def _enqueue(self, priority: str) -> Tuple[int, int]:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Неизвестный приоритет LLM: {priority}")
+        key = (PRIORITIES[priority], next(self._ids))
+        if self._unlimited():
+            return key  # без лимитов очередь не нужна
+        with self._lock:
+            heapq.heappush(self._queue, key)
+        return key
+
+    def _unlimited(self) -> bool:
+        return self.rpm <= 0 and self.tpm <= 0
+
+    def _is_head(self, key: Tuple[int, int]) -> bool:
+        with self._lock:
+            return bool(self._queue) and self._queue[0] == key
+
+    @staticmethod
+    def _entry_id(key: Tuple[int, int]) -> str:
+        return f"{os.getpid()}-{key[1]}"
+
+    def _try(self, key: Tuple[int, int], tokens: int, priority: str) -> Tuple[bool, float]:
+        """
+        Пробует зарезервировать бюджет, если `key` — голова очереди
+
+        Журнал (файл под flock) читается без self._lock: другой процесс
+        может держать flock, и ждать его должен только этот запрос.
+        """
+        if not self._is_head(key):
+            return False, _TICK
+        rpm, tpm = self._limits(priority)
+        ok, retry_after = self.ledger.try_reserve(self._entry_id(key), min(tokens, tpm) if tpm else tokens, rpm, tpm)
+        if ok:
+            self._dequeue(key)
+        return ok, retry_after
+
+    def _dequeue(self, key: Tuple[int, int]):
+        with self._lock:
+            if key in self._queue:
+                self._queue.remove(key)
+                heapq.heapify(self._queue)
+
+    def _ticket(self, key: Tuple[int, int], tokens: int, priority: str, started: float) -> Ticket:
+        waited = time.monotonic() - started
+        stats = self._stats[priority]
+        stats["requests"] += 1
+        if waited >= 0.01:
+            stats["waited"] += 1
+            stats["wait_total_s"] += waited
+            stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        if waited >= _LOG_WAIT:
+            logger.info(f"LLM: запрос {priority} ждал бюджета {waited:.1f} с (в очереди ещё {len(self._queue)})")
+        return Ticket(self._entry_id(key), tokens, priority, waited)
+
+    async def acquire(self, tokens: int, priority: str = BATCH) -> Ticket:
+        """
+        Ждёт бюджет под запрос на `tokens` токенов, не блокируя event loop
+
+        Журнал читается в потоке (asyncio.to_thread): пока другой
+        процесс держит flock, event loop ботов продолжает работать.
+        """
+        key = self._enqueue(priority)
+        started = time.monotonic()
+        if self._unlimited():
+            return self._ticket(key, tokens, priority, started)
+        attempt: Optional[asyncio.Future] = None
+        try:
+            while True:
+                retry_after = _TICK
+                if self._is_head(key):
+                    attempt = asyncio.ensure_future(asyncio.to_thread(self._try, key, tokens, priority))
+                    ok, retry_after = await asyncio.shield(attempt)
+                    attempt = None
+                    if ok:
+                        return self._ticket(key, tokens, priority, started)
+                until, released = time.monotonic() + min(_MAX_POLL, retry_after), self._released
+                while time.monotonic() < until and self._released == released:
+                    await asyncio.sleep(_TICK)
+        except BaseException:
+            self._dequeue(key)  # отменённый запрос не держит очередь
+            if attempt is not None:
+                # Поток мог успеть зарезервировать бюджет уже после отмены
+                attempt.add_done_callback(lambda done: self._discard_reserved(done, key))
+            raise
+
+    def _discard_reserved(self, attempt: asyncio.Future, key: Tuple[int, int]):
+        if attempt.cancelled() or attempt.exception() is not None or not attempt.result()[0]:
+            return
+        asyncio.get_running_loop().run_in_executor(None, self.ledger.discard, self._entry_id(key))
+
+    def acquire_sync(self, tokens: int, priority: str = BATCH) -> Ticket:
+        """Синхронная версия acquire (блокирует поток)"""
+        key = self._enqueue(priority)
+        started = time.monotonic()
+        if self._unlimited():
+            return self._ticket(key, tokens, priority, started)
+        try:
+            while True:
+                ok, retry_after = self._try(key, tokens, priority)
+                if ok:
+                    return self._ticket(key, tokens, priority, started)
+                until, released = time.monotonic() + min(_MAX_POLL, retry_after), self._released
+                while time.monotonic() < until and self._released == released:
+                    time.sleep(_TICK)
+        except BaseException:
+            self._dequeue(key)
+            raise
+
+    def release(self, ticket: Ticket, tokens: Optional[int] = None):
+        """
+        Запрос завершён: оценка заменяется фактическим расходом
+
+        Без `tokens` (провайдер не сообщил расход или запрос упал)
+        остаётся оценка — лучше недоиспользовать бюджет, чем получить 429.
+        Из event loop общий журнал правится в потоке, как и в acquire:
+        вызов не ждёт flock, ожидающие проверят бюджет после правки.
+        """
+        if not tokens:
+            self._released += 1
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or self.ledger.path is None:
+            self.ledger.settle(ticket.entry_id, tokens)
+            self._released += 1
+            return
+        settled = loop.run_in_executor(None, self.ledger.settle, ticket.entry_id, tokens)
+        settled.add_done_callback(self._settled)
+
+    def _settled(self, settled: asyncio.Future):
+        if not settled.cancelled() and settled.exception() is not None:
+            logger.error(f"Ошибка записи LLM-бюджета: {settled.exception()}")
+        self._released += 1
+
+    def report(self) -> Dict:
+        """
+        Очередь, ожидание по приоритетам и расход за минуту
+
+        Читает общий журнал под flock: из event loop — через asyncio.to_thread.
+        """
+        with self._lock:
+            depth = {name: sum(1 for p, _ in self._queue if p == level) for name, level in PRIORITIES.items()}
+        usage = self.ledger.usage()
+        return {
+            "queue_depth": depth,
+            "used_last_minute": usage,
+            "limits": {"requests_per_minute": self.rpm, "tokens_per_minute": self.tpm},
+            "priorities": {
+                name: {
+                    **{k: round(v, 2) if isinstance(v, float) else v for k, v in stats.items()},
+                    "wait_avg_s": round(stats["wait_total_s"] / stats["waited"], 2) if stats["waited"] else 0.0,
+                }
+                for name, stats in self._stats.items()
+            },
+        }
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Общий планировщик процесса (журнал расхода — общий для процессов)
+
+    Если все провайдеры — локальные заглушки (офлайн-прогоны, бенчмарки),
+    лимитов нет и журнал ведётся только в памяти: такие прогоны не
+    отнимают бюджет у ботов и не ждут его.
+    """
+    global _scheduler
+    if _scheduler is None:
+        if LLM_PROVIDERS and set(LLM_PROVIDERS) <= _UNMETERED_PROVIDERS:
+            _scheduler = LLMScheduler(requests_per_minute=0, tokens_per_minute=0)
+        else:
+            _scheduler = LLMScheduler(ledger=BudgetLedger(LLM_BUDGET_FILE if LLM_BUDGET_SHARED else None))
+    return _scheduler
+
+
+if __name__ == "__main__":
+    # python -m trend_hunter.scheduler — расход общего бюджета за последнюю минуту
+    usage = BudgetLedger(LLM_BUDGET_FILE).usage()
+    print(
+        f"За минуту: запросов {usage['requests']}/{LLM_REQUESTS_PER_MINUTE:g}, "
+        f"токенов {usage['tokens']}/{LLM_TOKENS_PER_MINUTE:g}"
+    )
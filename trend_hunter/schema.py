@@ -0,0 +1,180 @@
+"""
+Схемы ответов модели и их проверка
+
+Ответ проверяется не по принципу "всё или ничего": идея с
+ошибкой исправляется (число строкой, "Low" вместо "low", строка
+вместо списка) или отбрасывается, остальные остаются. Проверка —
+один проход по словарям, без внешних зависимостей.
+"""
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+# Значение не исправить — поле отбрасывается (или объект, если поле обязательное)
+_INVALID = object()
+
+
+class Field:
+    """
+    Поле схемы
+
+    kind — "str", "number", "list" или "object".
+    `choices` — допустимые строки, `bounds` — (min, max) для чисел,
+    `items` — Field элементов списка или Schema вложенного объекта,
+    `default` — подставляется вместо неисправимого (или отсутствующего
+    обязательного) значения.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        required: bool = False,
+        choices: Optional[Sequence[str]] = None,
+        bounds: Optional[Tuple[float, float]] = None,
+        items=None,
+        default: Any = None
+    ):
+        self.kind = kind
+        self.required = required
+        self.choices = tuple(choices) if choices else None
+        self.bounds = bounds
+        self.items = items
+        self.default = default
+
+
+class Schema:
+    """Схема JSON-объекта: имя поля -> Field. Поля вне схемы сохраняются как есть"""
+
+    def __init__(self, fields: Dict[str, Field]):
+        self.fields = fields
+
+    def validate(self, value: Any, path: str = "") -> Tuple[Optional[Dict], List[str]]:
+        """
+        Проверяет и исправляет объект
+
+        Returns:
+            (исправленная копия или None, если объект не спасти;
+             список исправлений и отброшенного)
+        """
+        problems: List[str] = []
+        return self._check(value, path, problems), problems
+
+    def _check(self, value: Any, path: str, problems: List[str]) -> Optional[Dict]:
+        if not isinstance(value, dict):
+            problems.append(f"{path or 'ответ'}: ожидался объект, а не {type(value).__name__}")
+            return None
+
+        result = dict(value)
+        for name, field in self.fields.items():
+            where = f"{path}.{name}" if path else name
+            if name not in value or value[name] is None:
+                if not field.required:
+                    result.pop(name, None)
+                    continue
+                if field.default is None:
+                    problems.append(f"{where}: нет обязательного поля")
+                    return None
+                problems.append(f"{where}: нет поля, подставлено {field.default!r}")
+                result[name] = field.default
+                continue
+
+            checked = _check_field(field, value[name], where, problems)
+            if checked is not _INVALID:
+                result[name] = checked
+            elif field.default is not None:
+                problems.append(f"{where}: подставлено {field.default!r}")
+                result[name] = field.default
+            elif field.required:
+                return None
+            else:
+                result.pop(name)
+        return result
+
+
+def _check_field(field: Field, value: Any, path: str, problems: List[str]):
+    """Исправленное значение поля или _INVALID"""
+    if field.kind == "str":
+        return _check_str(field, value, path, problems)
+    if field.kind == "number":
+        return _check_number(field, value, path, problems)
+    if field.kind == "list":
+        return _check_list(field, value, path, problems)
+    if field.kind == "object":
+        checked = field.items._check(value, path, problems)
+        return _INVALID if checked is None else checked
+    raise ValueError(f"Неизвестный тип поля схемы: {field.kind}")
+
+
+def _check_str(field: Field, value: Any, path: str, problems: List[str]):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        problems.append(f"{path}: число вместо строки")
+        value = str(value)
+    elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+        problems.append(f"{path}: список вместо строки")
+        value = ", ".join(value)
+    elif not isinstance(value, str):
+        problems.append(f"{path}: не строка ({type(value).__name__})")
+        return _INVALID
+
+    if field.choices is None:
+        return value
+
+    normalized = value.strip().lower()
+    if normalized in field.choices:
+        if normalized != value:
+            problems.append(f"{path}: {value!r} -> {normalized!r}")
+        return normalized
+    # "low/medium", "Low complexity" — берётся первый встретившийся вариант
+    found = [(normalized.find(choice), choice) for choice in field.choices if choice in normalized]
+    if found:
+        choice = min(found)[1]
+        problems.append(f"{path}: {value!r} -> {choice!r}")
+        return choice
+    problems.append(f"{path}: {value!r} не из {'/'.join(field.choices)}")
+    return _INVALID
+
+
+def _check_number(field: Field, value: Any, path: str, problems: List[str]):
+    if isinstance(value, bool):
+        problems.append(f"{path}: bool вместо числа")
+        return _INVALID
+    if isinstance(value, str):
+        match = _NUMBER_RE.search(value)  # "8", "8/10", "7,5"
+        if not match:
+            problems.append(f"{path}: {value!r} не число")
+            return _INVALID
+        problems.append(f"{path}: строка {value!r} вместо числа")
+        value = float(match.group().replace(",", "."))
+    elif not isinstance(value, (int, float)):
+        problems.append(f"{path}: не число ({type(value).__name__})")
+        return _INVALID
+
+    if field.bounds is not None:
+        low, high = field.bounds
+        if not low <= value <= high:
+            problems.append(f"{path}: {value} вне [{low}, {high}]")
+            value = min(max(value, low), high)
+    return int(value) if float(value).is_integer() else value
+
+
+def _check_list(field: Field, value: Any, path: str, problems: List[str]):
+    if isinstance(value, str):
+        problems.append(f"{path}: строка вместо списка")
+        value = [value]
+    elif not isinstance(value, list):
+        problems.append(f"{path}: не список ({type(value).__name__})")
+        return _INVALID
+
+    if field.items is None:
+        return value
+
+    checked = []
+    for index, item in enumerate(value):
+        item = _check_field(field.items, item, f"{path}[{index}]", problems)
+        if item is not _INVALID:
+            checked.append(item)
+    return checked
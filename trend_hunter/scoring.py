@@ -0,0 +1,205 @@
+"""
+Пакетный скоринг идей
+
+Идеи один раз раскладываются по колонкам признаков (массивы NumPy:
+потенциал, сложность MVP, размер рынка, длины текстовых полей),
+после чего скор любого набора весов — одно матричное умножение,
+а top-K — частичная сортировка (argpartition). Переранжировать всю
+историю идей под новую формулу можно без LLM и без перечитывания
+отчётов.
+"""
+import json
+import sys
+from typing import Callable, Dict, List, Optional
+import logging
+
+import numpy as np
+
+from .config import IDEA_SCORE_WEIGHTS
+from .storage import get_all_ideas
+
+logger = logging.getLogger(__name__)
+
+SCORE_CAP = 100
+
+
+def _potential(idea: Dict) -> float:
+    value = idea.get("potential_score", 5)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _text_length(field: str) -> Callable[[Dict], float]:
+    def length(idea: Dict) -> float:
+        value = idea.get(field)
+        return float(len(value)) if value else 0.0
+    return length
+
+
+def _equals(field: str, value: str, default: str) -> Callable[[Dict], float]:
+    return lambda idea: float(idea.get(field, default) == value)
+
+
+def _market_small(idea: Dict) -> float:
+    # Всё, что не large и не medium, считается small (как в прежней формуле)
+    return float(idea.get("market_size", "medium") not in ("large", "medium"))
+
+
+# Сырые признаки: имя колонки -> извлечение из идеи
+RAW_FEATURES: Dict[str, Callable[[Dict], float]] = {
+    "potential": _potential,
+    "complexity_low": _equals("mvp_complexity", "low", "medium"),
+    "complexity_medium": _equals("mvp_complexity", "medium", "medium"),
+    "complexity_high": _equals("mvp_complexity", "high", "medium"),
+    "market_large": _equals("market_size", "large", "medium"),
+    "market_medium": _equals("market_size", "medium", "medium"),
+    "market_small": _market_small,
+    "monetization_len": _text_length("monetization"),
+    "audience_len": _text_length("target_audience"),
+    "differentiation_len": _text_length("differentiation"),
+    "problem_len": _text_length("problem"),
+}
+
+# Производные признаки: считаются из колонок, а не из словарей
+DERIVED_FEATURES: Dict[str, Callable[[Dict[str, np.ndarray]], np.ndarray]] = {
+    "has_monetization": lambda c: (c["monetization_len"] > 10).astype(float),
+    "has_audience": lambda c: (c["audience_len"] > 10).astype(float),
+    "has_differentiation": lambda c: (c["differentiation_len"] > 20).astype(float),
+}
+
+FEATURES = list(RAW_FEATURES) + list(DERIVED_FEATURES)
+
+
+class IdeaFrame:
+    """
+    Колоночное представление набора идей
+
+    Идеи не копируются и не меняются: frame хранит ссылки на них
+    и матрицу признаков (идеи × FEATURES).
+    """
+
+    def __init__(self, ideas: List[Dict]):
+        self.ideas = ideas
+        n = len(ideas)
+        columns = {
+            name: np.fromiter((extract(idea) for idea in ideas), dtype=np.float64, count=n)
+            for name, extract in RAW_FEATURES.items()
+        }
+        for name, derive in DERIVED_FEATURES.items():
+            columns[name] = derive(columns)
+
+        self.features = FEATURES
+        self.matrix = np.column_stack([columns[name] for name in FEATURES]) if n else np.zeros((0, len(FEATURES)))
+
+    def __len__(self) -> int:
+        return len(self.ideas)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.matrix[:, self.features.index(name)]
+
+    def weight_vector(self, weights: Dict[str, float]) -> np.ndarray:
+        """
+        Вектор весов в порядке колонок
+
+        Raises:
+            ValueError: если в весах есть неизвестный признак
+        """
+        unknown = set(weights) - set(self.features)
+        if unknown:
+            raise ValueError(f"Неизвестные признаки скора: {', '.join(sorted(unknown))}")
+        return np.array([float(weights.get(name, 0)) for name in self.features])
+
+    def scores(self, weights: Dict[str, float], cap: Optional[float] = SCORE_CAP) -> np.ndarray:
+        """Скоры всех идей по весам за один проход"""
+        scores = self.matrix @ self.weight_vector(weights)
+        return np.minimum(scores, cap) if cap is not None else scores
+
+    def top_k(self, weights: Dict[str, float], k: Optional[int] = None, cap: Optional[float] = SCORE_CAP) -> np.ndarray:
+        """Индексы k лучших идей по убыванию скора"""
+        return top_k(self.scores(weights, cap), k)
+
+
+def top_k(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Индексы k наибольших скоров по убыванию
+
+    При равном скоре — в исходном порядке. Без полной сортировки:
+    argpartition выбирает k, затем сортируются только они.
+    """
+    n = len(scores)
+    if k is None or k >= n:
+        chosen = np.arange(n)
+    elif k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    else:
+        chosen = np.argpartition(-scores, k - 1)[:k]
+        # На границе могут быть равные скоры: берём среди них первые по порядку
+        threshold = scores[chosen].min()
+        chosen = np.concatenate((np.flatnonzero(scores > threshold), np.flatnonzero(scores == threshold)))[:k]
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def _as_number(score: float):
+    """Целые скоры остаются int, как в отчётах до пакетного скоринга"""
+    return int(score) if float(score).is_integer() else round(float(score), 2)
+
+
+def score_ideas(ideas: List[Dict], weights: Dict[str, float] = IDEA_SCORE_WEIGHTS) -> List:
+    """Скоры идей списком (в порядке идей)"""
+    return [_as_number(score) for score in IdeaFrame(ideas).scores(weights)]
+
+
+def rank(
+    ideas: List[Dict],
+    weights: Dict[str, float],
+    k: Optional[int] = None,
+    field: str = "final_score"
+) -> List[Dict]:
+    """
+    Проставляет идеям скор в `field` и возвращает k лучших по убыванию
+
+    Словари идей меняются на месте (как прежде в rank_ideas).
+    """
+    frame = IdeaFrame(ideas)
+    scores = frame.scores(weights)
+    for idea, score in zip(frame.ideas, scores):
+        idea[field] = _as_number(score)
+    return [frame.ideas[i] for i in top_k(scores, k)]
+
+
+def rerank(frame: IdeaFrame, weights: Dict[str, float], k: int = 50) -> List[Dict]:
+    """
+    Top-K идей под другую формулу без изменения самих идей
+
+    Возвращает копии с полем rescored_score; исходный final_score
+    не трогается.
+    """
+    scores = frame.scores(weights)
+    ranked = []
+    for i in top_k(scores, k):
+        idea = dict(frame.ideas[i])
+        idea["rescored_score"] = _as_number(scores[i])
+        ranked.append(idea)
+    return ranked
+
+
+def history_frame() -> IdeaFrame:
+    """Frame всех канонических идей из индекса идей (без чтения отчётов)"""
+    return IdeaFrame(get_all_ideas(limit=None))
+
+
+if __name__ == "__main__":
+    # python -m trend_hunter.scoring weights.json [k] — история идей под другие веса
+    logging.basicConfig(level=logging.INFO)
+
+    weights = IDEA_SCORE_WEIGHTS
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            weights = json.load(f)
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    frame = history_frame()
+    for position, idea in enumerate(rerank(frame, weights, k), 1):
+        print(f"{position:>3}. {idea['rescored_score']:>6} (было {idea.get('final_score', 0)})  {idea.get('name', 'N/A')}")
@@ -0,0 +1,322 @@
+"""
+Запись и воспроизведение HTTP-обменов источников ("кассеты")
+
+В режиме record каждый ответ, полученный фетчерами через HttpClient,
+сохраняется в сжатый JSON-файл. В режиме replay те же запросы
+обслуживаются из файла без сети — с задержкой, пропорциональной
+записанной, или мгновенно. Так сбор и разбор данных можно гонять
+офлайн и воспроизводимо.
+
+Сид-кассету из сохранённых сырых данных можно собрать командой:
+    python -m trend_hunter.sources.cassette seed data/raw_2026-01-16.json
+"""
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import logging
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from ..config import (
+    HTTP_CASSETTE_MODE, HTTP_CASSETTE_PATH, HTTP_CASSETTE_LATENCY_SCALE,
+    SUBREDDITS, REDDIT_SEARCH_KEYWORDS, GOOGLE_TRENDS_EXTRA_GEOS
+)
+
+logger = logging.getLogger(__name__)
+
+RECORD = "record"
+REPLAY = "replay"
+
+# Условные заголовки не пишутся и не отправляются: в кассете всегда полные тела
+_CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+_SKIPPED_RESPONSE_HEADERS = {"set-cookie", "content-encoding", "transfer-encoding", "content-length"}
+
+
+class CassetteMissError(Exception):
+    """В кассете нет записи для запроса"""
+
+
+def request_key(url: str, params: Optional[Dict] = None) -> str:
+    """Ключ запроса: метод и нормализованный URL с параметрами"""
+    normalized = URL(url)
+    if params:
+        normalized = normalized.update_query(params)
+    return f"GET {normalized}"
+
+
+class _ReplayContent:
+    """Заменяет response.content: отдаёт тело кусками"""
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def iter_chunked(self, n: int) -> AsyncIterator[bytes]:
+        for start in range(0, len(self._body), n):
+            yield self._body[start:start + n]
+
+    async def read(self) -> bytes:
+        return self._body
+
+
+class RecordedResponse:
+    """
+    Ответ из кассеты
+
+    Повторяет ту часть интерфейса aiohttp.ClientResponse,
+    которой пользуются фетчеры.
+    """
+
+    def __init__(self, url: str, status: int, headers: List[Tuple[str, str]], body: bytes):
+        self.url = URL(url)
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.content = _ReplayContent(body)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = "utf-8", **kwargs) -> str:
+        return self._body.decode(encoding, errors="replace")
+
+    async def json(self, loads=json.loads, **kwargs):
+        text = self._body.decode("utf-8", errors="replace").strip()
+        if not text:
+            return None
+        return loads(text)
+
+    def release(self):
+        pass
+
+
+class Cassette:
+    """
+    Набор записанных обменов {ключ запроса: [ответы по порядку]}
+
+    Один и тот же запрос может встречаться несколько раз (повторы,
+    опросы): при воспроизведении ответы отдаются по порядку, а
+    последний повторяется, когда записи кончились.
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 0.0):
+        """
+        Args:
+            path: Файл кассеты (.json или .json.gz)
+            mode: "record" или "replay"
+            latency_scale: Доля записанной задержки, которую имитирует replay
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.exchanges: Dict[str, List[Dict]] = {}
+        self._positions: Dict[str, int] = {}
+        self._dirty = False
+
+        if mode == REPLAY:
+            self.load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    def load(self):
+        """Читает кассету с диска"""
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        self.exchanges = data.get("exchanges", {})
+        self._positions = {}
+        logger.info(f"Кассета {self.path}: {sum(len(v) for v in self.exchanges.values())} обменов")
+
+    def save(self):
+        """Записывает кассету на диск (атомарно), если она менялась"""
+        if not self._dirty:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        opener = gzip.open if self.path.endswith(".gz") else open
+        tmp_path = f"{self.path}.tmp"
+        with opener(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump({"version": 1, "exchanges": self.exchanges}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def add(self, key: str, status: int, headers: List[Tuple[str, str]], body: bytes, elapsed: float = 0.0):
+        """Добавляет обмен в конец записей для ключа"""
+        self.exchanges.setdefault(key, []).append({
+            "status": status,
+            "headers": [
+                [name, value] for name, value in headers
+                if name.lower() not in _SKIPPED_RESPONSE_HEADERS
+            ],
+            "body": body.decode("utf-8", errors="replace"),
+            "elapsed": round(elapsed, 3),
+        })
+        self._dirty = True
+
+    async def record(self, session, url: str, **kwargs) -> RecordedResponse:
+        """Выполняет реальный запрос, записывает ответ и отдаёт его копию"""
+        kwargs["headers"] = strip_conditional_headers(kwargs.get("headers"))
+        started = time.monotonic()
+
+        response = await session.get(url, **kwargs)
+        try:
+            body = await response.read()
+        finally:
+            response.release()
+
+        key = request_key(url, kwargs.get("params"))
+        headers = list(response.headers.items())
+        self.add(key, response.status, headers, body, time.monotonic() - started)
+        return RecordedResponse(url, response.status, headers, body)
+
+    async def replay(self, url: str, **kwargs) -> RecordedResponse:
+        """
+        Отдаёт следующий записанный ответ на запрос
+
+        Raises:
+            CassetteMissError: запрос не записан
+        """
+        key = request_key(url, kwargs.get("params"))
+        recorded = self.exchanges.get(key)
+        if not recorded:
+            raise CassetteMissError(f"Нет записи для {key}")
+
+        position = self._positions.get(key, 0)
+        exchange = recorded[min(position, len(recorded) - 1)]
+        self._positions[key] = position + 1
+
+        if self.latency_scale > 0 and exchange.get("elapsed"):
+            await asyncio.sleep(exchange["elapsed"] * self.latency_scale)
+
+        return RecordedResponse(
+            url,
+            exchange["status"],
+            [tuple(header) for header in exchange["headers"]],
+            exchange["body"].encode("utf-8")
+        )
+
+
+def strip_conditional_headers(headers: Optional[Dict[str, str]]) -> Optional[Dict[str, str]]:
+    """Убирает If-None-Match / If-Modified-Since из заголовков запроса"""
+    if not headers:
+        return headers
+    return {name: value for name, value in headers.items() if name.lower() not in _CONDITIONAL_HEADERS}
+
+
+def cassette_from_config() -> Optional[Cassette]:
+    """Кассета по HTTP_CASSETTE_MODE / HTTP_CASSETTE_PATH (None — обычная сеть)"""
+    if not HTTP_CASSETTE_MODE:
+        return None
+    return Cassette(HTTP_CASSETTE_PATH, HTTP_CASSETTE_MODE, HTTP_CASSETTE_LATENCY_SCALE)
+
+
+def _google_trends_rss(trends: List[Dict]) -> str:
+    """Собирает RSS Google Trends из сохранённых трендов"""
+    from xml.sax.saxutils import escape
+
+    items = "".join(
+        "<item>"
+        f"<title>{escape(trend.get('title') or '')}</title>"
+        f"<ht:approx_traffic>{escape(trend.get('traffic') or '')}</ht:approx_traffic>"
+        f"<link>{escape(trend.get('link') or '')}</link>"
+        "</item>"
+        for trend in trends
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0" xmlns:ht="https://trends.google.com/trending/rss">'
+        f"<channel><title>Daily Search Trends</title>{items}</channel></rss>"
+    )
+
+
+def _reddit_listing(posts: List[Dict]) -> str:
+    """Собирает листинг Reddit из сохранённых постов"""
+    children = []
+    for post in posts:
+        data = {key: post.get(key) for key in (
+            "id", "title", "score", "upvote_ratio", "num_comments",
+            "selftext", "created_utc", "author"
+        )}
+        data["subreddit"] = post.get("subreddit")
+        data["permalink"] = (post.get("url") or "").replace("https://reddit.com", "", 1)
+        children.append({"kind": "t3", "data": data})
+    return json.dumps({"kind": "Listing", "data": {"after": None, "children": children}}, ensure_ascii=False)
+
+
+def build_seed_cassette(
+    raw_file: str,
+    path: str = HTTP_CASSETTE_PATH,
+    subreddits: Optional[List[str]] = None,
+    keywords: Optional[List[str]] = None
+) -> Cassette:
+    """
+    Собирает кассету из сохранённых сырых данных (raw_YYYY-MM-DD.json)
+
+    Получаются ответы на запросы run_trend_hunt: RSS Google Trends (US),
+    пустые фиды доп. регионов, hot-листинги сабреддитов и поиск по ключевым словам. Посты из поиска
+    в сырых данных не привязаны к запросу, поэтому все они уходят в
+    ответ на первое ключевое слово. HN и Product Hunt в сырых данных нет.
+    """
+    with open(raw_file, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+
+    subreddits = subreddits if subreddits is not None else SUBREDDITS
+    keywords = keywords if keywords is not None else REDDIT_SEARCH_KEYWORDS
+
+    cassette = Cassette(path, RECORD)
+    xml_headers = [("Content-Type", "application/rss+xml; charset=UTF-8")]
+    json_headers = [("Content-Type", "application/json; charset=UTF-8")]
+
+    cassette.add(
+        request_key("https://trends.google.com/trending/rss?geo=US"),
+        200, xml_headers, _google_trends_rss(raw.get("google_trends", [])).encode("utf-8")
+    )
+    # Дополнительные регионы в сырых данных не сохраняются — пустые фиды
+    for geo in GOOGLE_TRENDS_EXTRA_GEOS:
+        cassette.add(
+            request_key(f"https://trends.google.com/trending/rss?geo={geo}"),
+            200, xml_headers, _google_trends_rss([]).encode("utf-8")
+        )
+
+    by_subreddit: Dict[str, List[Dict]] = {}
+    for post in raw.get("reddit_posts", []):
+        by_subreddit.setdefault(post.get("subreddit"), []).append(post)
+
+    for subreddit in subreddits:
+        cassette.add(
+            request_key(f"https://www.reddit.com/r/{subreddit}/hot.json?limit=20"),
+            200, json_headers, _reddit_listing(by_subreddit.pop(subreddit, [])).encode("utf-8")
+        )
+
+    # Всё, что не попало в hot-листинги, отдаём как результаты поиска
+    leftovers = [post for posts in by_subreddit.values() for post in posts]
+    for i, keyword in enumerate(keywords):
+        cassette.add(
+            request_key(f"https://www.reddit.com/search.json?q={keyword}&limit=15&sort=hot"),
+            200, json_headers, _reddit_listing(leftovers if i == 0 else []).encode("utf-8")
+        )
+
+    cassette.save()
+    logger.info(f"Сид-кассета сохранена: {path}")
+    return cassette
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 3 and sys.argv[1] == "seed":
+        build_seed_cassette(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else HTTP_CASSETTE_PATH)
+    else:
+        print("Использование: python -m trend_hunter.sources.cassette seed <raw.json> [cassette.json.gz]")
@@ -0,0 +1,70 @@
+"""
+Кэш RSS-фидов для условных GET-запросов (ETag / Last-Modified)
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+from ..cache import JsonFileCache
+from ..config import FEED_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class FeedCache:
+    """
+    Хранит валидаторы и уже распарсенные items для каждого URL фида
+
+    Перед запросом фетчер добавляет If-None-Match / If-Modified-Since
+    из request_headers(); на 304 берёт items из cached_items() и не
+    качает и не парсит тело заново.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = FEED_CACHE_TTL):
+        self.cache = JsonFileCache(path, ttl=ttl)
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки условного запроса для URL (пусто, если кэша нет)"""
+        entry = self.cache.get(url)
+        if not entry:
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def cached_items(self, url: str) -> Optional[List[Dict]]:
+        """
+        Items из кэша для ответа 304
+
+        fetched_at обновляется: фид подтвердил, что данные актуальны.
+        """
+        entry = self.cache.get(url)
+        if not entry:
+            return None
+
+        fetched_at = datetime.now().isoformat()
+        return [dict(item, fetched_at=fetched_at) for item in entry["items"]]
+
+    def store(self, url: str, response_headers, items: List[Dict]):
+        """Запоминает валидаторы ответа и распарсенные items"""
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+
+        if not etag and not last_modified:
+            # Сервер не поддерживает условные запросы — хранить нечего
+            self.cache.delete(url)
+            return
+
+        self.cache.set(url, {"etag": etag, "last_modified": last_modified, "items": items})
+
+    def save(self):
+        """Сохраняет кэш на диск"""
+        try:
+            self.cache.prune()
+            self.cache.save()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша фидов: {e}")
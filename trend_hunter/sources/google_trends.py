@@ -3,20 +3,38 @@
 Получает актуальные тренды и растущие поисковые запросы
 """
 import asyncio
-import aiohttp
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional
 from datetime import datetime
+import xml.etree.ElementTree as ET
 import logging
 
+from ..config import GOOGLE_TRENDS_EXTRA_GEOS, GOOGLE_TRENDS_FEED_CACHE
+from .feed_cache import FeedCache
+from .http_client import HttpClient, open_http_client
+from .rss import iter_rss_items, iter_rss_items_from_string
+from .stream import iter_completed
+
 logger = logging.getLogger(__name__)
 
 
 class GoogleTrendsFetcher:
     """Получает данные из Google Trends"""
 
-    def __init__(self):
+    def __init__(self, http: Optional[HttpClient] = None, feed_cache: Optional[FeedCache] = None):
         self.base_url = "https://trends.google.com/trends/api"
         self.daily_trends_url = "https://trends.google.com/trending/rss?geo=US"
+        self._owns_http = http is None
+        self.http = http if http is not None else HttpClient()
+        self.feed_cache = feed_cache if feed_cache is not None else FeedCache(GOOGLE_TRENDS_FEED_CACHE)
+
+    async def close(self):
+        """Закрывает HTTP-клиент, если фетчер создал его сам"""
+        if self._owns_http:
+            await self.http.close()
+
+    def save_cache(self):
+        """Сохраняет кэш фидов на диск"""
+        self.feed_cache.save()
 
     async def get_daily_trends(self, geo: str = "US") -> List[Dict]:
         """
@@ -34,41 +52,50 @@ class GoogleTrendsFetcher:
             # Используем RSS-фид Google Trends (не требует API)
             rss_url = f"https://trends.google.com/trending/rss?geo={geo}"
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(rss_url) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        trends = self._parse_rss(content)
-                        logger.info(f"Получено {len(trends)} трендов из Google Trends ({geo})")
-                    else:
-                        logger.warning(f"Google Trends вернул статус {response.status}")
+            headers = self.feed_cache.request_headers(rss_url)
+            async with self.http.get(rss_url, headers=headers) as response:
+                if response.status == 200:
+                    trends = await self._read_rss(response, geo)
+                    self.feed_cache.store(rss_url, response.headers, trends)
+                    logger.info(f"Получено {len(trends)} трендов из Google Trends ({geo})")
+                elif response.status == 304 and headers:
+                    trends = self.feed_cache.cached_items(rss_url) or []
+                    for trend in trends:
+                        trend.setdefault("geo", geo)
+                    logger.info(f"Google Trends ({geo}) не изменился, {len(trends)} трендов из кэша")
+                else:
+                    logger.warning(f"Google Trends вернул статус {response.status}")
 
         except Exception as e:
             logger.error(f"Ошибка получения Google Trends: {e}")
 
         return trends
 
-    def _parse_rss(self, content: str) -> List[Dict]:
-        """Парсит RSS-фид Google Trends"""
-        import xml.etree.ElementTree as ET
+    async def _read_rss(self, response, geo: Optional[str] = None) -> List[Dict]:
+        """Разбирает RSS-фид Google Trends потоково, по мере загрузки"""
+        trends = []
+        fetched_at = datetime.now().isoformat()
 
+        try:
+            async for item in iter_rss_items(response):
+                trend = self._parse_item(item, fetched_at, geo)
+                if trend:
+                    trends.append(trend)
+
+        except ET.ParseError as e:
+            logger.error(f"Ошибка парсинга RSS: {e}")
+
+        return trends
+
+    def _parse_rss(self, content: str, geo: Optional[str] = None) -> List[Dict]:
+        """Парсит уже загруженный RSS-фид Google Trends"""
         trends = []
+        fetched_at = datetime.now().isoformat()
+
         try:
-            root = ET.fromstring(content)
-
-            for item in root.findall('.//item'):
-                title = item.find('title')
-                link = item.find('link')
-                traffic = item.find('{https://trends.google.com/trending/rss}approx_traffic')
-
-                if title is not None:
-                    trend = {
-                        "title": title.text,
-                        "link": link.text if link is not None else None,
-                        "traffic": traffic.text if traffic is not None else "N/A",
-                        "source": "google_trends",
-                        "fetched_at": datetime.now().isoformat()
-                    }
+            for item in iter_rss_items_from_string(content):
+                trend = self._parse_item(item, fetched_at, geo)
+                if trend:
                     trends.append(trend)
 
         except ET.ParseError as e:
@@ -76,6 +103,24 @@ class GoogleTrendsFetcher:
 
         return trends
 
+    def _parse_item(self, item: ET.Element, fetched_at: str, geo: Optional[str] = None) -> Optional[Dict]:
+        """Превращает <item> в тренд"""
+        title = item.find('title')
+        if title is None:
+            return None
+
+        link = item.find('link')
+        traffic = item.find('{https://trends.google.com/trending/rss}approx_traffic')
+
+        return {
+            "title": title.text,
+            "link": link.text if link is not None else None,
+            "traffic": traffic.text if traffic is not None else "N/A",
+            "geo": geo,
+            "source": "google_trends",
+            "fetched_at": fetched_at
+        }
+
     async def search_trend(self, keyword: str, geo: str = "US") -> Dict:
         """
         Получает данные по конкретному ключевому слову
@@ -100,37 +145,60 @@ class GoogleTrendsFetcher:
         }
 
 
-async def fetch_google_trends(categories: List[str] = None, geo: str = "US") -> List[Dict]:
+async def stream_google_trends(
+    geo: str = "US",
+    geos: List[str] = None,
+    http: Optional[HttpClient] = None
+) -> AsyncIterator[Dict]:
+    """
+    Потоковая версия: отдаёт тренды по мере ответа регионов
+
+    Все регионы опрашиваются параллельно; частоту запросов к
+    trends.google.com ограничивает token bucket HTTP-клиента.
+    Дубликаты по названию отсекаются на лету.
+
+    Args:
+        geo: Код основной страны
+        geos: Полный список регионов (по умолчанию geo + GOOGLE_TRENDS_EXTRA_GEOS)
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+    """
+    if geos is None:
+        geos = [geo] + [g for g in GOOGLE_TRENDS_EXTRA_GEOS if g != geo]
+
+    seen = set()
+
+    async with open_http_client(http) as client:
+        fetcher = GoogleTrendsFetcher(client)
+        try:
+            tasks = [fetcher.get_daily_trends(region) for region in dict.fromkeys(geos)]
+            async for trends in iter_completed(tasks):
+                for trend in trends:
+                    if trend["title"] not in seen:
+                        seen.add(trend["title"])
+                        yield trend
+        finally:
+            fetcher.save_cache()
+
+
+async def fetch_google_trends(
+    categories: List[str] = None,
+    geo: str = "US",
+    geos: List[str] = None,
+    http: Optional[HttpClient] = None
+) -> List[Dict]:
     """
     Главная функция для получения трендов
 
     Args:
         categories: Список категорий для фильтрации (опционально)
-        geo: Код страны
+        geo: Код основной страны
+        geos: Полный список регионов (по умолчанию geo + GOOGLE_TRENDS_EXTRA_GEOS)
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
 
     Returns:
         Список всех найденных трендов
     """
-    fetcher = GoogleTrendsFetcher()
-
-    # Получаем ежедневные тренды
-    trends = await fetcher.get_daily_trends(geo)
-
-    # Также получаем тренды для других регионов
-    for region in ["GB", "DE"]:  # UK, Germany - tech-хабы
-        region_trends = await fetcher.get_daily_trends(region)
-        trends.extend(region_trends)
-        await asyncio.sleep(1)  # Пауза между запросами
-
-    # Убираем дубликаты по названию
-    seen = set()
-    unique_trends = []
-    for trend in trends:
-        if trend["title"] not in seen:
-            seen.add(trend["title"])
-            unique_trends.append(trend)
-
-    return unique_trends
+    return [trend async for trend in stream_google_trends(geo=geo, geos=geos, http=http)]
 
 
 # Тест
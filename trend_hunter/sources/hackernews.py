@@ -3,53 +3,190 @@
 Использует бесплатный Firebase API
 """
 import asyncio
-import aiohttp
-from typing import List, Dict
+import time
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple
 from datetime import datetime
 import logging
 
+from ..cache import JsonFileCache
+from ..config import (
+    HN_CACHE_FILE, HN_ITEM_TTL, HN_HOT_WINDOW, HN_METRICS_TTL,
+    HN_MAX_CONCURRENCY, HN_UPDATES_MAX_GAP
+)
+from .http_client import HttpClient, open_http_client
+
 logger = logging.getLogger(__name__)
 
+# Ключ кэша, под которым хранится время последнего опроса updates.json
+_UPDATES_KEY = "_updates_polled_at"
+
 
 class HackerNewsFetcher:
     """Получает данные из HackerNews API"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        http: Optional[HttpClient] = None,
+        cache: Optional[JsonFileCache] = None,
+        max_concurrency: int = HN_MAX_CONCURRENCY
+    ):
         self.base_url = "https://hacker-news.firebaseio.com/v0"
+        self.max_concurrency = max(1, max_concurrency)
+        self._owns_http = http is None
+        self.http = http if http is not None else HttpClient()
+        self.cache = cache if cache is not None else JsonFileCache(HN_CACHE_FILE, ttl=HN_ITEM_TTL)
 
-    async def get_top_stories(self, limit: int = 50) -> List[Dict]:
+    async def close(self):
+        """Закрывает HTTP-клиент, если фетчер создал его сам"""
+        if self._owns_http:
+            await self.http.close()
+
+    async def get_story_ids(self, feed: str, limit: int) -> List[int]:
         """
-        Получает топ историй с HackerNews
+        Получает ID историй из ленты
 
         Args:
-            limit: Количество историй
+            feed: Имя ленты (topstories, showstories, askstories)
+            limit: Количество ID
 
         Returns:
-            Список историй
+            Список ID
+        """
+        try:
+            async with self.http.get(f"{self.base_url}/{feed}.json") as response:
+                if response.status == 200:
+                    story_ids = await response.json()
+                    return (story_ids or [])[:limit]
+                logger.warning(f"HackerNews {feed}: статус {response.status}")
+
+        except Exception as e:
+            logger.error(f"Ошибка получения ленты HackerNews {feed}: {e}")
+
+        return []
+
+    async def get_updated_ids(self) -> Optional[Set[int]]:
+        """
+        Получает ID items, изменившихся с прошлого опроса (updates.json)
+
+        Returns:
+            Множество ID или None, если прошлого опроса не было либо он был
+            так давно (дольше HN_UPDATES_MAX_GAP), что лента его не покрывает
         """
-        stories = []
+        polled_at = self.cache.get(_UPDATES_KEY)
+        now = time.time()
 
         try:
-            async with aiohttp.ClientSession() as session:
-                # Получаем ID топ историй
-                async with session.get(f"{self.base_url}/topstories.json") as response:
-                    if response.status == 200:
-                        story_ids = await response.json()
-                        story_ids = story_ids[:limit]
+            async with self.http.get(f"{self.base_url}/updates.json") as response:
+                if response.status != 200:
+                    logger.warning(f"HackerNews updates: статус {response.status}")
+                    return None
+                data = await response.json()
 
-                        # Получаем детали каждой истории
-                        tasks = [self._fetch_item(session, story_id) for story_id in story_ids]
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"Ошибка получения HackerNews updates: {e}")
+            return None
 
-                        for result in results:
-                            if isinstance(result, dict) and result:
-                                stories.append(result)
+        self.cache.set(_UPDATES_KEY, now)
 
-                        logger.info(f"Получено {len(stories)} историй из HackerNews")
+        if polled_at is None or now - polled_at > HN_UPDATES_MAX_GAP:
+            return None
 
+        return set((data or {}).get("items", []))
+
+    async def get_items(self, item_ids: List[int], updated: Optional[Set[int]] = None) -> List[Dict]:
+        """
+        Получает items с учётом кэша (см. iter_items)
+
+        Returns:
+            Список items в порядке item_ids (копии, их можно менять)
+        """
+        order = {item_id: position for position, item_id in enumerate(item_ids)}
+        items = [item async for item in self.iter_items(item_ids, updated=updated)]
+        items.sort(key=lambda item: order.get(item.get("id"), len(order)))
+        return items
+
+    async def iter_items(self, item_ids: List[int], updated: Optional[Set[int]] = None) -> AsyncIterator[Dict]:
+        """
+        Отдаёт items по мере готовности с учётом кэша
+
+        Свежие items отдаются из кэша без запросов. У горячих историй
+        (моложе HN_HOT_WINDOW) раз в HN_METRICS_TTL обновляются только
+        score и число комментариев, остальное тело берётся из кэша.
+
+        Args:
+            item_ids: ID items (без дубликатов)
+            updated: ID изменившихся items из get_updated_ids(); если передан,
+                обновляются только они, а не все горячие
+
+        Yields:
+            Копии items (их можно менять)
+        """
+        now = time.time()
+        cached: Dict[int, Dict] = {}
+        to_fetch = []
+        hits = 0
+
+        for item_id in item_ids:
+            entry = self.cache.get(str(item_id))
+            if entry is None:
+                to_fetch.append(item_id)
+            elif self._needs_refresh(item_id, entry, now, updated):
+                cached[item_id] = entry["item"]
+                to_fetch.append(item_id)
+            else:
+                hits += 1
+                yield dict(entry["item"])
+
+        async for item_id, result in self._iter_fetched(to_fetch):
+            if result:
+                if item_id in cached:
+                    item = dict(cached[item_id])
+                    item["score"] = result["score"]
+                    item["comments"] = result["comments"]
+                    item["fetched_at"] = result["fetched_at"]
+                else:
+                    item = result
+                self.cache.set(str(item_id), {"item": item, "metrics_at": now})
+                yield dict(item)
+            elif item_id in cached:
+                # Не удалось обновить метрики — отдаём прошлые
+                yield dict(cached[item_id])
+
+        logger.info(
+            f"HackerNews items: {hits} из кэша, {len(cached)} обновлено, "
+            f"{len(to_fetch) - len(cached)} загружено"
+        )
+
+    def _needs_refresh(self, item_id: int, entry: Dict, now: float, updated: Optional[Set[int]]) -> bool:
+        """Нужно ли обновить score/comments у закэшированного item"""
+        if updated is not None:
+            return item_id in updated
+
+        item_time = entry["item"].get("time") or 0
+        is_hot = now - item_time < HN_HOT_WINDOW
+        return is_hot and now - entry.get("metrics_at", 0) > HN_METRICS_TTL
+
+    def save_cache(self):
+        """Сохраняет кэш items на диск, выбрасывая просроченные"""
+        try:
+            self.cache.prune()
+            self.cache.save()
         except Exception as e:
-            logger.error(f"Ошибка получения HackerNews: {e}")
+            logger.error(f"Ошибка сохранения кэша HackerNews: {e}")
+
+    async def get_top_stories(self, limit: int = 50) -> List[Dict]:
+        """
+        Получает топ историй с HackerNews
 
+        Args:
+            limit: Количество историй
+
+        Returns:
+            Список историй
+        """
+        story_ids = await self.get_story_ids("topstories", limit)
+        stories = await self.get_items(story_ids)
+        logger.info(f"Получено {len(stories)} историй из HackerNews")
         return stories
 
     async def get_show_hn(self, limit: int = 30) -> List[Dict]:
@@ -63,28 +200,11 @@ class HackerNewsFetcher:
         Returns:
             Список Show HN постов
         """
-        stories = []
-
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/showstories.json") as response:
-                    if response.status == 200:
-                        story_ids = await response.json()
-                        story_ids = story_ids[:limit]
-
-                        tasks = [self._fetch_item(session, story_id) for story_id in story_ids]
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                        for result in results:
-                            if isinstance(result, dict) and result:
-                                result["is_show_hn"] = True
-                                stories.append(result)
-
-                        logger.info(f"Получено {len(stories)} Show HN постов")
-
-        except Exception as e:
-            logger.error(f"Ошибка получения Show HN: {e}")
-
+        story_ids = await self.get_story_ids("showstories", limit)
+        stories = await self.get_items(story_ids)
+        for story in stories:
+            story["is_show_hn"] = True
+        logger.info(f"Получено {len(stories)} Show HN постов")
         return stories
 
     async def get_ask_hn(self, limit: int = 20) -> List[Dict]:
@@ -98,92 +218,174 @@ class HackerNewsFetcher:
         Returns:
             Список Ask HN постов
         """
-        stories = []
+        story_ids = await self.get_story_ids("askstories", limit)
+        stories = await self.get_items(story_ids)
+        for story in stories:
+            story["is_ask_hn"] = True
+        logger.info(f"Получено {len(stories)} Ask HN постов")
+        return stories
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}/askstories.json") as response:
-                    if response.status == 200:
-                        story_ids = await response.json()
-                        story_ids = story_ids[:limit]
+    async def _iter_fetched(self, item_ids: List[int]) -> AsyncIterator[Tuple[int, Dict]]:
+        """
+        Загружает items пулом из max_concurrency воркеров
 
-                        tasks = [self._fetch_item(session, story_id) for story_id in story_ids]
-                        results = await asyncio.gather(*tasks, return_exceptions=True)
+        Yields:
+            Пары (id, item) по мере загрузки; для items, которые не удалось
+            получить, item — пустой словарь
+        """
+        if not item_ids:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for item_id in item_ids:
+            queue.put_nowait(item_id)
+
+        results: asyncio.Queue = asyncio.Queue()
+        failed = []
+
+        async def worker():
+            while True:
+                try:
+                    item_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                try:
+                    result = await self._fetch_item(item_id)
+                except Exception as e:
+                    failed.append(item_id)
+                    logger.debug(f"Ошибка получения item {item_id}: {e}")
+                    result = {}
+                results.put_nowait((item_id, result))
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(self.max_concurrency, len(item_ids)))
+        ]
 
-                        for result in results:
-                            if isinstance(result, dict) and result:
-                                result["is_ask_hn"] = True
-                                stories.append(result)
+        try:
+            for _ in item_ids:
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
-                        logger.info(f"Получено {len(stories)} Ask HN постов")
+        if failed:
+            logger.warning(f"HackerNews: не удалось получить {len(failed)} items: {failed[:10]}")
 
-        except Exception as e:
-            logger.error(f"Ошибка получения Ask HN: {e}")
+    async def _fetch_item(self, item_id: int) -> Dict:
+        """
+        Получает детали одного item
 
-        return stories
+        Сетевые ошибки и 5xx повторяет HttpClient (HTTP_RETRIES), пока
+        circuit breaker не отключит хост — своих повторов здесь нет.
 
-    async def _fetch_item(self, session: aiohttp.ClientSession, item_id: int) -> Dict:
-        """Получает детали одного item"""
-        try:
-            async with session.get(f"{self.base_url}/item/{item_id}.json") as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data:
-                        return {
-                            "id": data.get("id"),
-                            "title": data.get("title", ""),
-                            "url": data.get("url", ""),
-                            "hn_url": f"https://news.ycombinator.com/item?id={data.get('id')}",
-                            "score": data.get("score", 0),
-                            "comments": data.get("descendants", 0),
-                            "author": data.get("by", ""),
-                            "time": data.get("time"),
-                            "text": data.get("text", "")[:500] if data.get("text") else "",
-                            "type": data.get("type", "story"),
-                            "source": "hackernews",
-                            "fetched_at": datetime.now().isoformat()
-                        }
-        except Exception as e:
-            logger.debug(f"Ошибка получения item {item_id}: {e}")
+        Returns:
+            Item или {} для удалённого/пустого item
+
+        Raises:
+            Последняя ошибка запроса или CircuitOpenError
+        """
+        async with self.http.get(f"{self.base_url}/item/{item_id}.json") as response:
+            if response.status != 200:
+                raise RuntimeError(f"статус {response.status}")
+
+            data = await response.json()
+            if data:
+                return {
+                    "id": data.get("id"),
+                    "title": data.get("title", ""),
+                    "url": data.get("url", ""),
+                    "hn_url": f"https://news.ycombinator.com/item?id={data.get('id')}",
+                    "score": data.get("score", 0),
+                    "comments": data.get("descendants", 0),
+                    "author": data.get("by", ""),
+                    "time": data.get("time"),
+                    "text": data.get("text", "")[:500] if data.get("text") else "",
+                    "type": data.get("type", "story"),
+                    "source": "hackernews",
+                    "fetched_at": datetime.now().isoformat()
+                }
 
         return {}
 
 
-async def fetch_hackernews(include_show: bool = True, include_ask: bool = True) -> List[Dict]:
+async def stream_hackernews(
+    include_show: bool = True,
+    include_ask: bool = True,
+    http: Optional[HttpClient] = None,
+    incremental: bool = False
+) -> AsyncIterator[Dict]:
+    """
+    Потоковая версия: отдаёт истории по мере загрузки
+
+    Args:
+        include_show: Включить Show HN
+        include_ask: Включить Ask HN
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+        incremental: Обновлять только items из ленты updates.json
+            (для частого опроса; при первом запуске работает как обычный)
+    """
+    # Top stories + Show HN (новые проекты, очень важно для SaaS!)
+    # + Ask HN (вопросы, для понимания проблем)
+    feeds = [("topstories", 50, None)]
+    if include_show:
+        feeds.append(("showstories", 30, "is_show_hn"))
+    if include_ask:
+        feeds.append(("askstories", 20, "is_ask_hn"))
+
+    async with open_http_client(http) as client:
+        fetcher = HackerNewsFetcher(client)
+
+        # Сначала все ленты ID, затем дедупликация — и только потом items,
+        # чтобы история из нескольких лент скачивалась один раз
+        tasks = [fetcher.get_story_ids(feed, limit) for feed, limit, _ in feeds]
+        if incremental:
+            *id_lists, updated = await asyncio.gather(*tasks, fetcher.get_updated_ids())
+        else:
+            id_lists, updated = await asyncio.gather(*tasks), None
+
+        flags: Dict[int, List[str]] = {}
+        for (_, _, flag), story_ids in zip(feeds, id_lists):
+            for story_id in story_ids:
+                story_flags = flags.setdefault(story_id, [])
+                if flag:
+                    story_flags.append(flag)
+
+        try:
+            async for story in fetcher.iter_items(list(flags), updated=updated):
+                for flag in flags.get(story.get("id"), []):
+                    story[flag] = True
+                yield story
+        finally:
+            fetcher.save_cache()
+
+
+async def fetch_hackernews(
+    include_show: bool = True,
+    include_ask: bool = True,
+    http: Optional[HttpClient] = None,
+    incremental: bool = False
+) -> List[Dict]:
     """
     Главная функция для получения данных из HackerNews
 
     Args:
         include_show: Включить Show HN
         include_ask: Включить Ask HN
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+        incremental: Обновлять только items из ленты updates.json
+            (для частого опроса; при первом запуске работает как обычный)
 
     Returns:
         Список всех историй
     """
-    fetcher = HackerNewsFetcher()
-    all_stories = []
-
-    # Top stories
-    top = await fetcher.get_top_stories(limit=50)
-    all_stories.extend(top)
-
-    # Show HN — новые проекты (очень важно для SaaS!)
-    if include_show:
-        show = await fetcher.get_show_hn(limit=30)
-        all_stories.extend(show)
-
-    # Ask HN — вопросы (для понимания проблем)
-    if include_ask:
-        ask = await fetcher.get_ask_hn(limit=20)
-        all_stories.extend(ask)
-
-    # Убираем дубликаты
-    seen_ids = set()
-    unique = []
-    for story in all_stories:
-        if story.get("id") and story["id"] not in seen_ids:
-            seen_ids.add(story["id"])
-            unique.append(story)
+    unique = [
+        story async for story in stream_hackernews(
+            include_show, include_ask, http=http, incremental=incremental
+        )
+    ]
 
     # Сортируем по score
     unique.sort(key=lambda x: x.get("score", 0), reverse=True)
@@ -0,0 +1,197 @@
+"""
+Общий HTTP-клиент для всех источников
+Один пул keep-alive соединений с кэшем DNS на весь запуск сбора данных
+"""
+import asyncio
+import aiohttp
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import logging
+
+from ..config import (
+    HTTP_TOTAL_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_PER_HOST, HTTP_DNS_CACHE_TTL, HTTP_KEEPALIVE_TIMEOUT,
+    HOST_RATE_LIMITS, HTTP_RETRIES, HTTP_RETRY_BASE_DELAY, HTTP_RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+from .cassette import Cassette, CassetteMissError, cassette_from_config
+from .rate_limit import HostRateLimiter
+from .resilience import CircuitBreaker, CircuitOpenError, HostStats, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Обёртка над aiohttp.ClientSession с пулом соединений
+
+    Сессия создаётся лениво при первом запросе (внутри event loop)
+    и живёт до вызова close(), поэтому TCP/TLS-соединения и DNS-ответы
+    переиспользуются между всеми фетчерами и запросами.
+    Запросы к хостам из `rate_limits` проходят через token bucket.
+
+    Сетевые ошибки, таймауты и ответы 5xx повторяются с джиттером
+    по `retry_policy`; хост, который раз за разом не отвечает,
+    отключается circuit breaker'ом до пробного запроса.
+
+    С кассетой в режиме record ответы записываются, в режиме replay —
+    отдаются из неё без обращения к сети.
+    """
+
+    def __init__(
+        self,
+        total_timeout: float = HTTP_TOTAL_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_per_host: int = HTTP_MAX_PER_HOST,
+        dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+        headers: Optional[Dict[str, str]] = None,
+        rate_limits: Optional[Dict[str, Tuple[float, int]]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        cassette: Optional[Cassette] = None
+    ):
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.headers = headers or {}
+        self.rate_limiter = HostRateLimiter(HOST_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.retry_policy = retry_policy or RetryPolicy(
+            HTTP_RETRIES, HTTP_RETRY_BASE_DELAY, HTTP_RETRY_MAX_DELAY
+        )
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats: Dict[str, HostStats] = {}
+        self.cassette = cassette if cassette is not None else cassette_from_config()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Возвращает сессию, создавая её при первом обращении"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=self.headers
+            )
+        return self._session
+
+    def _breaker_for(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+        return self.breakers[host]
+
+    def _stats_for(self, host: str) -> HostStats:
+        if host not in self.stats:
+            self.stats[host] = HostStats()
+        return self.stats[host]
+
+    @asynccontextmanager
+    async def get(self, url: str, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        GET-запрос через общий пул с учётом лимита хоста
+
+        Используется как `async with http.get(url) as response:`.
+        Отдаётся первый ответ без ошибки сервера; если все попытки
+        исчерпаны, отдаётся последний ответ 5xx или пробрасывается
+        последняя сетевая ошибка.
+
+        Raises:
+            CircuitOpenError: хост отключён circuit breaker'ом
+        """
+        host = urlsplit(url).hostname or ""
+        breaker = self._breaker_for(host)
+        stats = self._stats_for(host)
+        attempt = 0
+
+        while True:
+            if not breaker.allow():
+                stats.rejected += 1
+                raise CircuitOpenError(f"{host} временно отключён после серии ошибок")
+
+            try:
+                await self.rate_limiter.acquire(url)
+                stats.requests += 1
+                response = await self._send(url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                breaker.record_failure()
+                if attempt >= self.retry_policy.retries:
+                    stats.failures += 1
+                    raise
+                error = e
+            except BaseException as e:
+                # Отмена, промах кассеты, ошибка не сети — о хосте это ничего
+                # не говорит, но пробный запрос half-open нельзя оставить висеть
+                breaker.release_probe()
+                if isinstance(e, CassetteMissError):
+                    stats.failures += 1
+                raise
+            else:
+                if response.status < 500:
+                    breaker.record_success()
+                    break
+                breaker.record_failure()
+                if attempt >= self.retry_policy.retries:
+                    break
+                response.release()
+                error = f"HTTP {response.status}"
+
+            delay = self.retry_policy.delay(attempt)
+            logger.warning(f"{host}: {error}, повтор через {delay:.1f}с")
+            stats.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        # 429 — не ошибка хоста: его обрабатывают лимитеры источников
+        if response.status >= 400 and response.status != 429:
+            stats.failures += 1
+
+        try:
+            yield response
+        finally:
+            response.release()
+
+    async def _send(self, url: str, **kwargs):
+        """Один запрос: в сеть или в кассету"""
+        if self.cassette is None:
+            return await self.session.get(url, **kwargs)
+        if self.cassette.recording:
+            return await self.cassette.record(self.session, url, **kwargs)
+        return await self.cassette.replay(url, **kwargs)
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self.cassette is not None and self.cassette.recording:
+            self.cassette.save()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self) -> "HttpClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+@asynccontextmanager
+async def open_http_client(http: Optional[HttpClient] = None) -> AsyncIterator[HttpClient]:
+    """
+    Отдаёт переданный клиент или создаёт временный на время блока
+
+    Чужой клиент не закрывается — им управляет тот, кто его создал.
+    """
+    if http is not None:
+        yield http
+        return
+
+    async with HttpClient() as client:
+        yield client
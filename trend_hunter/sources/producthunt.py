@@ -4,20 +4,35 @@
 (GraphQL API требует регистрации)
 """
 import asyncio
-import aiohttp
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Set, Iterable, Tuple
 from datetime import datetime
 import xml.etree.ElementTree as ET
 import logging
 import re
 
+from ..config import PRODUCTHUNT_FEED_CACHE
+from .feed_cache import FeedCache
+from .http_client import HttpClient, open_http_client
+from .rss import iter_rss_items, iter_rss_items_from_string
+from .stream import iter_completed
+
 logger = logging.getLogger(__name__)
 
+# HTML-теги в описании; незакрытый тег в конце обрезанного куска тоже ловится
+_TAG_RE = re.compile(r'<[^>]*>?')
+
+# Сколько символов описания просматривать, чтобы набрать 500 символов текста
+_DESCRIPTION_SCAN = 4000
+
 
 class ProductHuntFetcher:
     """Получает данные из Product Hunt через RSS"""
 
-    def __init__(self):
+    def __init__(self, http: Optional[HttpClient] = None, feed_cache: Optional[FeedCache] = None):
+        self._owns_http = http is None
+        self.http = http if http is not None else HttpClient()
+        self.feed_cache = feed_cache if feed_cache is not None else FeedCache(PRODUCTHUNT_FEED_CACHE)
+
         # RSS фиды Product Hunt
         self.feeds = {
             "today": "https://www.producthunt.com/feed",
@@ -27,13 +42,31 @@ class ProductHuntFetcher:
             "productivity": "https://www.producthunt.com/topics/productivity/feed",
         }
 
-    async def get_products(self, category: str = "today", limit: int = 30) -> List[Dict]:
+    async def close(self):
+        """Закрывает HTTP-клиент, если фетчер создал его сам"""
+        if self._owns_http:
+            await self.http.close()
+
+    def save_cache(self):
+        """Сохраняет кэш фидов на диск"""
+        self.feed_cache.save()
+
+    async def get_products(
+        self,
+        category: str = "today",
+        limit: int = 30,
+        seen_urls: Optional[Set[str]] = None
+    ) -> List[Dict]:
         """
         Получает продукты из RSS фида
 
         Args:
             category: Категория (today, tech, saas, ai, productivity)
             limit: Количество продуктов
+            seen_urls: Общее множество уже встреченных ссылок; продукты
+                из него не возвращаются и не разбираются. В кэш фида
+                попадает весь фид (встреченные — без разбора): ответ 304
+                не должен зависеть от того, какой фид пришёл первым
 
         Returns:
             Список продуктов
@@ -42,57 +75,65 @@ class ProductHuntFetcher:
         feed_url = self.feeds.get(category, self.feeds["today"])
 
         try:
-            async with aiohttp.ClientSession() as session:
-                headers = {"User-Agent": "Mozilla/5.0 SaaS-Pipeline/1.0"}
-                async with session.get(feed_url, headers=headers) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        products = self._parse_rss(content, category)[:limit]
-                        logger.info(f"Получено {len(products)} продуктов из Product Hunt ({category})")
-                    else:
-                        logger.warning(f"Product Hunt вернул статус {response.status}")
+            conditional = self.feed_cache.request_headers(feed_url)
+            headers = {"User-Agent": "Mozilla/5.0 SaaS-Pipeline/1.0", **conditional}
+            async with self.http.get(feed_url, headers=headers) as response:
+                if response.status == 200:
+                    products, feed = await self._read_rss(response, category, seen_urls)
+                    self.feed_cache.store(feed_url, response.headers, feed)
+                    products = products[:limit]
+                    logger.info(f"Получено {len(products)} продуктов из Product Hunt ({category})")
+                elif response.status == 304 and conditional:
+                    cached = self.feed_cache.cached_items(feed_url) or []
+                    products = self._unseen(cached, category, seen_urls)[:limit]
+                    logger.info(f"Product Hunt ({category}) не изменился, {len(products)} продуктов из кэша")
+                else:
+                    logger.warning(f"Product Hunt вернул статус {response.status}")
 
         except Exception as e:
             logger.error(f"Ошибка получения Product Hunt: {e}")
 
         return products
 
+    async def _read_rss(
+        self, response, category: str, seen_urls: Optional[Set[str]] = None
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Разбирает RSS фид Product Hunt потоково, по мере загрузки
+
+        Returns:
+            (новые продукты; весь фид для кэша — продукты, уже
+            встреченные в других фидах, в нём остаются неразобранными)
+        """
+        products, feed = [], []
+        fetched_at = datetime.now().isoformat()
+
+        try:
+            async for item in iter_rss_items(response):
+                raw = self._raw_item(item)
+                if raw is None:
+                    continue
+                if seen_urls is not None and not self._claim_url(raw["url"], seen_urls):
+                    feed.append(raw)
+                    continue
+                product = self._product(raw, category, fetched_at)
+                products.append(product)
+                feed.append(product)
+
+        except ET.ParseError as e:
+            logger.error(f"Ошибка парсинга RSS: {e}")
+
+        return products, feed
+
     def _parse_rss(self, content: str, category: str) -> List[Dict]:
-        """Парсит RSS фид Product Hunt"""
+        """Парсит уже загруженный RSS фид Product Hunt"""
         products = []
+        fetched_at = datetime.now().isoformat()
 
         try:
-            root = ET.fromstring(content)
-
-            for item in root.findall('.//item'):
-                title_elem = item.find('title')
-                link_elem = item.find('link')
-                description_elem = item.find('description')
-                pub_date_elem = item.find('pubDate')
-
-                if title_elem is not None:
-                    # Извлекаем название и tagline из title
-                    title_text = title_elem.text or ""
-                    # Формат: "Product Name — Tagline"
-                    parts = title_text.split(' — ')
-                    name = parts[0].strip() if parts else title_text
-                    tagline = parts[1].strip() if len(parts) > 1 else ""
-
-                    # Парсим описание (убираем HTML теги)
-                    description = ""
-                    if description_elem is not None and description_elem.text:
-                        description = re.sub(r'<[^>]+>', '', description_elem.text)[:500]
-
-                    product = {
-                        "name": name,
-                        "tagline": tagline,
-                        "url": link_elem.text if link_elem is not None else "",
-                        "description": description,
-                        "pub_date": pub_date_elem.text if pub_date_elem is not None else "",
-                        "category": category,
-                        "source": "producthunt",
-                        "fetched_at": datetime.now().isoformat()
-                    }
+            for item in iter_rss_items_from_string(content):
+                product = self._parse_item(item, category, fetched_at)
+                if product:
                     products.append(product)
 
         except ET.ParseError as e:
@@ -100,6 +141,96 @@ class ProductHuntFetcher:
 
         return products
 
+    def _unseen(self, cached: List[Dict], category: str, seen_urls: Optional[Set[str]]) -> List[Dict]:
+        """Продукты из кэша фида, ещё не встреченные в других фидах (и отмечает их)"""
+        products = []
+        for entry in cached:
+            if seen_urls is not None and not self._claim_url(entry.get("url", ""), seen_urls):
+                continue
+            if entry.get("raw"):
+                entry = self._product(entry, category, entry.get("fetched_at") or datetime.now().isoformat())
+            products.append(entry)
+        return products
+
+    @staticmethod
+    def _claim_url(url: str, seen_urls: Set[str]) -> bool:
+        """Отмечает ссылку как встреченную; False — если она уже была (или пустая)"""
+        if not url or url in seen_urls:
+            return False
+        seen_urls.add(url)
+        return True
+
+    def _parse_item(self, item: ET.Element, category: str, fetched_at: str) -> Optional[Dict]:
+        """Превращает <item> в продукт"""
+        raw = self._raw_item(item)
+        return self._product(raw, category, fetched_at) if raw is not None else None
+
+    @staticmethod
+    def _raw_item(item: ET.Element) -> Optional[Dict]:
+        """Тексты полей <item> без разбора (None, если нет заголовка)"""
+        title_elem = item.find('title')
+        if title_elem is None:
+            return None
+
+        description = item.findtext('description') or ""
+        return {
+            "raw": True,
+            "title": title_elem.text or "",
+            "url": item.findtext('link') or "",
+            # Из описания останется не больше 500 символов текста
+            "description": description[:_DESCRIPTION_SCAN],
+            "pub_date": item.findtext('pubDate') or "",
+        }
+
+    @staticmethod
+    def _product(raw: Dict, category: str, fetched_at: str) -> Dict:
+        """Продукт из неразобранного item: название, tagline, описание без HTML"""
+        # Формат: "Product Name — Tagline"
+        title_text = raw["title"]
+        parts = title_text.split(' — ')
+        name = parts[0].strip() if parts else title_text
+        tagline = parts[1].strip() if len(parts) > 1 else ""
+
+        return {
+            "name": name,
+            "tagline": tagline,
+            "url": raw["url"],
+            "description": _TAG_RE.sub('', raw["description"])[:500],
+            "pub_date": raw["pub_date"],
+            "category": category,
+            "source": "producthunt",
+            "fetched_at": fetched_at
+        }
+
+    async def get_categories(self, categories: Iterable[str], limit: int = 30) -> List[Dict]:
+        """
+        Получает продукты из нескольких категорий параллельно
+
+        Частоту запросов к producthunt.com ограничивает HTTP-клиент.
+        Дубликаты по URL отсекаются по мере готовности фидов: продукт,
+        уже отданный из другой категории, пропускается.
+
+        Args:
+            categories: Категории
+            limit: Количество продуктов на категорию
+
+        Returns:
+            Список уникальных продуктов
+        """
+        return [product async for product in self.iter_categories(categories, limit=limit)]
+
+    async def iter_categories(self, categories: Iterable[str], limit: int = 30) -> AsyncIterator[Dict]:
+        """Как get_categories, но отдаёт продукты по мере готовности фидов"""
+        seen_urls: Set[str] = set()
+        tasks = [
+            self.get_products(category, limit=limit, seen_urls=seen_urls)
+            for category in dict.fromkeys(categories)
+        ]
+
+        async for products in iter_completed(tasks):
+            for product in products:
+                yield product
+
     async def get_all_categories(self) -> List[Dict]:
         """
         Получает продукты из всех категорий
@@ -107,53 +238,50 @@ class ProductHuntFetcher:
         Returns:
             Список всех продуктов
         """
-        all_products = []
+        return await self.get_categories(self.feeds.keys(), limit=20)
 
-        for category in self.feeds.keys():
-            products = await self.get_products(category, limit=20)
-            all_products.extend(products)
-            await asyncio.sleep(1)  # Пауза между запросами
 
-        # Убираем дубликаты по URL
-        seen_urls = set()
-        unique = []
-        for product in all_products:
-            if product["url"] and product["url"] not in seen_urls:
-                seen_urls.add(product["url"])
-                unique.append(product)
+async def stream_producthunt(
+    categories: List[str] = None,
+    http: Optional[HttpClient] = None
+) -> AsyncIterator[Dict]:
+    """
+    Потоковая версия: отдаёт продукты по мере готовности фидов
 
-        return unique
+    Args:
+        categories: Список категорий (по умолчанию все)
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+    """
+    async with open_http_client(http) as client:
+        fetcher = ProductHuntFetcher(client)
+
+        if categories:
+            products = fetcher.iter_categories(categories)
+        else:
+            products = fetcher.iter_categories(fetcher.feeds.keys(), limit=20)
+
+        try:
+            async for product in products:
+                yield product
+        finally:
+            fetcher.save_cache()
 
 
-async def fetch_producthunt(categories: List[str] = None) -> List[Dict]:
+async def fetch_producthunt(
+    categories: List[str] = None,
+    http: Optional[HttpClient] = None
+) -> List[Dict]:
     """
     Главная функция для получения продуктов из Product Hunt
 
     Args:
         categories: Список категорий (по умолчанию все)
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
 
     Returns:
         Список продуктов
     """
-    fetcher = ProductHuntFetcher()
-
-    if categories:
-        all_products = []
-        for category in categories:
-            products = await fetcher.get_products(category)
-            all_products.extend(products)
-            await asyncio.sleep(1)
-
-        # Дедупликация
-        seen = set()
-        unique = []
-        for p in all_products:
-            if p["url"] not in seen:
-                seen.add(p["url"])
-                unique.append(p)
-        return unique
-    else:
-        return await fetcher.get_all_categories()
+    return [product async for product in stream_producthunt(categories, http=http)]
 
 
 # Тест
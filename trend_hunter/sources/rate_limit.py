@@ -0,0 +1,162 @@
+"""
+Ограничители частоты запросов для источников
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Классический token bucket
+
+    Токены пополняются со скоростью `rate` в секунду до `burst` штук.
+    Каждый запрос забирает один токен; если токенов нет — ждём ровно
+    столько, сколько нужно до появления следующего, а не фиксированную паузу.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Забирает один токен, при необходимости дожидаясь его"""
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class HostRateLimiter:
+    """
+    Набор token bucket'ов по хостам
+
+    Хосты без настроенного лимита не ограничиваются.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None):
+        self.limits = dict(limits or {})
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket_for(self, url: str) -> Optional[TokenBucket]:
+        """Возвращает bucket для хоста из URL (или None, если лимита нет)"""
+        host = urlsplit(url).hostname or ""
+        if host not in self.limits:
+            return None
+
+        if host not in self._buckets:
+            rate, burst = self.limits[host]
+            self._buckets[host] = TokenBucket(rate, burst)
+        return self._buckets[host]
+
+    async def acquire(self, url: str):
+        """Ждёт разрешения на запрос к хосту из URL"""
+        bucket = self.bucket_for(url)
+        if bucket is not None:
+            await bucket.acquire()
+
+
+class HeaderRateLimiter:
+    """
+    Адаптивный лимитер по заголовкам X-Ratelimit-* (Reddit)
+
+    Пока сервер сообщает остаток бюджета, запросы идут параллельно
+    (но не больше `max_concurrency` одновременно). Ждать приходится
+    только когда бюджет окна исчерпан — до момента X-Ratelimit-Reset.
+    """
+
+    def __init__(self, max_concurrency: int = 4, default_backoff: float = 60.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_backoff = default_backoff
+        self.remaining: Optional[float] = None  # неизвестно до первого ответа
+        self.reset_at = 0.0
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    def _has_budget(self) -> bool:
+        if self.remaining is not None and time.monotonic() >= self.reset_at:
+            # Окно сбросилось — до следующего ответа считаем бюджет неизвестным
+            self.remaining = None
+        return self.remaining is None or self.remaining >= 1
+
+    async def acquire(self):
+        """Ждёт свободный слот и остаток бюджета"""
+        async with self._cond:
+            while True:
+                if self.in_flight < self.max_concurrency and self._has_budget():
+                    self.in_flight += 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+
+                timeout = None
+                if self.in_flight < self.max_concurrency:
+                    # Слоты есть, бюджета нет — ждём сброса окна
+                    timeout = max(0.05, self.reset_at - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, headers=None):
+        """Освобождает слот и учитывает заголовки ответа"""
+        async with self._cond:
+            self.in_flight -= 1
+            if headers is not None:
+                self.update(headers)
+            self._cond.notify_all()
+
+    def update(self, headers):
+        """Обновляет бюджет из X-Ratelimit-Remaining / X-Ratelimit-Reset"""
+        remaining = _header_float(headers, "X-Ratelimit-Remaining")
+        reset = _header_float(headers, "X-Ratelimit-Reset")
+
+        if reset is not None:
+            self.reset_at = time.monotonic() + reset
+        if remaining is not None:
+            # Запросы, которые ещё в полёте, сервер пока не учёл
+            self.remaining = max(0.0, remaining - self.in_flight)
+
+    def backoff(self, headers=None) -> float:
+        """
+        Реакция на 429: обнуляет бюджет до сброса окна
+
+        Returns:
+            Сколько секунд придётся подождать
+        """
+        delay = None
+        if headers is not None:
+            delay = _header_float(headers, "Retry-After")
+            if delay is None:
+                delay = _header_float(headers, "X-Ratelimit-Reset")
+        if delay is None:
+            delay = self.default_backoff
+
+        self.remaining = 0.0
+        self.reset_at = max(self.reset_at, time.monotonic() + delay)
+        return delay
+
+
+def _header_float(headers, name: str) -> Optional[float]:
+    """Читает числовой заголовок, игнорируя мусор"""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
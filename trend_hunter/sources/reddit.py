@@ -3,22 +3,76 @@
 Получает горячие посты из бизнес/стартап сабреддитов
 """
 import asyncio
-import aiohttp
-from typing import List, Dict
+from typing import AsyncIterator, Callable, List, Dict, Optional
 from datetime import datetime
 import logging
 
+from ..config import (
+    REDDIT_MAX_CONCURRENCY, REDDIT_MAX_RETRIES, REDDIT_BATCH_SIZE, REDDIT_LISTING_PAGES
+)
+from .http_client import HttpClient, open_http_client
+from .rate_limit import HeaderRateLimiter
+from .stream import iter_completed
+
 logger = logging.getLogger(__name__)
 
 
 class RedditFetcher:
     """Получает посты из Reddit без API (через JSON endpoints)"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        http: Optional[HttpClient] = None,
+        max_concurrency: int = REDDIT_MAX_CONCURRENCY,
+        max_retries: int = REDDIT_MAX_RETRIES
+    ):
         self.base_url = "https://www.reddit.com"
         self.headers = {
             "User-Agent": "TrendHunter/1.0 (Business Ideas Research Bot)"
         }
+        self._owns_http = http is None
+        self.http = http if http is not None else HttpClient()
+        self.limiter = HeaderRateLimiter(max_concurrency=max_concurrency)
+        self.max_retries = max_retries
+
+    async def close(self):
+        """Закрывает HTTP-клиент, если фетчер создал его сам"""
+        if self._owns_http:
+            await self.http.close()
+
+    async def _get_json(self, url: str, label: str) -> Optional[Dict]:
+        """
+        GET с учётом лимитов Reddit
+
+        При 429 бюджет обнуляется до сброса окна, и тот же запрос
+        повторяется (до max_retries раз), а не теряется.
+
+        Returns:
+            Распарсенный JSON или None
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            headers = None
+            try:
+                async with self.http.get(url, headers=self.headers) as response:
+                    if response.status == 200:
+                        headers = response.headers
+                        return await response.json()
+                    elif response.status == 429:
+                        delay = self.limiter.backoff(response.headers)
+                        logger.warning(
+                            f"Reddit rate limit для {label}, пауза {delay:.0f} с "
+                            f"(попытка {attempt + 1}/{self.max_retries + 1})"
+                        )
+                    else:
+                        headers = response.headers
+                        logger.warning(f"Reddit {label}: статус {response.status}")
+                        return None
+            finally:
+                await self.limiter.release(headers)
+
+        logger.warning(f"Reddit {label}: лимит повторов исчерпан")
+        return None
 
     async def get_subreddit_hot(self, subreddit: str, limit: int = 25) -> List[Dict]:
         """
@@ -35,25 +89,132 @@ class RedditFetcher:
         url = f"{self.base_url}/r/{subreddit}/hot.json?limit={limit}"
 
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        posts = self._parse_posts(data, subreddit)
-                        logger.info(f"Получено {len(posts)} постов из r/{subreddit}")
-                    elif response.status == 429:
-                        logger.warning(f"Reddit rate limit для r/{subreddit}, ждём...")
-                        await asyncio.sleep(60)
-                    else:
-                        logger.warning(f"Reddit r/{subreddit}: статус {response.status}")
+            data = await self._get_json(url, f"r/{subreddit}")
+            if data is not None:
+                posts = self._parse_posts(data, subreddit)
+                logger.info(f"Получено {len(posts)} постов из r/{subreddit}")
 
         except Exception as e:
             logger.error(f"Ошибка получения r/{subreddit}: {e}")
 
         return posts
 
-    def _parse_posts(self, data: Dict, subreddit: str) -> List[Dict]:
-        """Парсит JSON-ответ Reddit"""
+    async def get_subreddits_hot_batched(
+        self,
+        subreddits: List[str],
+        limit: int = 100,
+        pages: int = REDDIT_LISTING_PAGES,
+        batch_size: int = REDDIT_BATCH_SIZE
+    ) -> Dict[str, List[Dict]]:
+        """
+        Получает горячие посты сразу из нескольких сабреддитов
+
+        Сабреддиты объединяются в листинги вида r/a+b+c/hot.json,
+        каждый листинг листается по курсору `after` до `pages` страниц,
+        а результат раскладывается обратно по сабреддитам.
+
+        Args:
+            subreddits: Названия сабреддитов (без r/)
+            limit: Постов на страницу (Reddit отдаёт максимум 100)
+            pages: Сколько страниц листать в каждом листинге
+            batch_size: Сколько сабреддитов объединять в один листинг
+
+        Returns:
+            Словарь {сабреддит: список постов}
+        """
+        results = await asyncio.gather(*[
+            self.get_combined_hot(batch, limit, pages)
+            for batch in split_batches(subreddits, batch_size)
+        ])
+
+        grouped = {name: [] for name in subreddits}
+        for posts in results:
+            for post in posts:
+                grouped[post["subreddit"]].append(post)
+
+        for name, posts in grouped.items():
+            logger.info(f"Получено {len(posts)} постов из r/{name}")
+
+        return grouped
+
+    async def get_combined_hot(
+        self,
+        subreddits: List[str],
+        limit: int = 100,
+        pages: int = REDDIT_LISTING_PAGES,
+        known: Optional[Callable[[Dict], bool]] = None
+    ) -> List[Dict]:
+        """
+        Получает посты одного объединённого листинга r/a+b+c/hot.json
+
+        Имена сабреддитов в постах приводятся к написанию из `subreddits`,
+        посты из посторонних сабреддитов отбрасываются.
+
+        Args:
+            known: Пост уже виден и не изменился (водяные знаки) —
+                страница из таких постов заканчивает листание
+        """
+        canonical = {name.lower(): name for name in subreddits}
+        posts = []
+
+        for post in await self._get_combined_listing(subreddits, limit, pages, known):
+            name = canonical.get((post.get("subreddit") or "").lower())
+            if name is not None:
+                post["subreddit"] = name
+                posts.append(post)
+
+        return posts
+
+    async def _get_combined_listing(
+        self,
+        subreddits: List[str],
+        limit: int,
+        pages: int,
+        known: Optional[Callable[[Dict], bool]] = None
+    ) -> List[Dict]:
+        """
+        Листает общий hot-листинг нескольких сабреддитов по курсору after
+
+        Hot упорядочен не по времени, поэтому курсор before по водяному
+        знаку created_utc не годится; вместо этого листание кончается на
+        странице, где все посты уже известны и не изменились — глубже
+        в hot нового ещё меньше.
+        """
+        posts = []
+        combined = "+".join(subreddits)
+        after = None
+
+        try:
+            for _ in range(max(1, pages)):
+                url = f"{self.base_url}/r/{combined}/hot.json?limit={min(limit, 100)}"
+                if after:
+                    url += f"&after={after}"
+
+                data = await self._get_json(url, f"r/{combined}")
+                if data is None:
+                    break
+
+                page = self._parse_posts(data)
+                posts.extend(page)
+                after = data.get("data", {}).get("after")
+                if not after:
+                    break
+                if known is not None and page and all(known(post) for post in page):
+                    logger.info(f"r/{combined}: страница без нового, листание остановлено")
+                    break
+
+        except Exception as e:
+            logger.error(f"Ошибка получения r/{combined}: {e}")
+
+        return posts
+
+    def _parse_posts(self, data: Dict, subreddit: Optional[str] = None) -> List[Dict]:
+        """
+        Парсит JSON-ответ Reddit
+
+        Без `subreddit` сабреддит берётся из самого поста
+        (нужно для объединённых листингов r/a+b+c).
+        """
         posts = []
 
         try:
@@ -69,7 +230,7 @@ class RedditFetcher:
                 post = {
                     "id": post_data.get("id"),
                     "title": post_data.get("title"),
-                    "subreddit": subreddit,
+                    "subreddit": subreddit or post_data.get("subreddit"),
                     "score": post_data.get("score", 0),
                     "upvote_ratio": post_data.get("upvote_ratio", 0),
                     "num_comments": post_data.get("num_comments", 0),
@@ -114,12 +275,10 @@ class RedditFetcher:
             url = f"{self.base_url}/search.json?q={query}&limit={limit}&sort=hot"
 
         try:
-            async with aiohttp.ClientSession(headers=self.headers) as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        posts = self._parse_posts(data, subreddit or "search")
-                        logger.info(f"Найдено {len(posts)} постов по запросу '{query}'")
+            data = await self._get_json(url, f"поиск '{query}'")
+            if data is not None:
+                posts = self._parse_posts(data, subreddit or "search")
+                logger.info(f"Найдено {len(posts)} постов по запросу '{query}'")
 
         except Exception as e:
             logger.error(f"Ошибка поиска '{query}': {e}")
@@ -127,40 +286,81 @@ class RedditFetcher:
         return posts
 
 
-async def fetch_reddit_trends(subreddits: List[str], keywords: List[str] = None) -> List[Dict]:
+def split_batches(subreddits: List[str], batch_size: int = REDDIT_BATCH_SIZE) -> List[List[str]]:
+    """Делит список сабреддитов на группы для объединённых листингов"""
+    return [subreddits[i:i + batch_size] for i in range(0, len(subreddits), batch_size)]
+
+
+async def stream_reddit_trends(
+    subreddits: List[str],
+    keywords: List[str] = None,
+    http: Optional[HttpClient] = None,
+    batched: bool = False,
+    pages: int = REDDIT_LISTING_PAGES,
+    known: Optional[Callable[[Dict], bool]] = None
+) -> AsyncIterator[Dict]:
+    """
+    Потоковая версия: отдаёт посты по мере ответа каждого запроса
+
+    Горячие посты из сабреддитов и поиск по ключевым словам идут
+    параллельно — темп задаёт лимитер по заголовкам X-Ratelimit-*.
+    Дубликаты по ID отсекаются на лету.
+
+    Args:
+        subreddits: Список сабреддитов для мониторинга
+        keywords: Дополнительные ключевые слова для поиска
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+        batched: Читать сабреддиты объединёнными листингами с пагинацией
+        pages: Глубина пагинации в batched-режиме
+        known: Пост уже виден и не изменился (Watermarks.unchanged) —
+            в batched-режиме по нему останавливается пагинация
+    """
+    seen_ids = set()
+
+    async with open_http_client(http) as client:
+        fetcher = RedditFetcher(client)
+
+        if batched:
+            tasks = [
+                fetcher.get_combined_hot(batch, pages=pages, known=known)
+                for batch in split_batches(subreddits)
+            ]
+        else:
+            tasks = [fetcher.get_subreddit_hot(subreddit, limit=20) for subreddit in subreddits]
+        tasks += [fetcher.search_posts(keyword, limit=15) for keyword in keywords or []]
+
+        async for posts in iter_completed(tasks):
+            for post in posts:
+                if post["id"] not in seen_ids:
+                    seen_ids.add(post["id"])
+                    yield post
+
+
+async def fetch_reddit_trends(
+    subreddits: List[str],
+    keywords: List[str] = None,
+    http: Optional[HttpClient] = None,
+    batched: bool = False,
+    pages: int = REDDIT_LISTING_PAGES
+) -> List[Dict]:
     """
     Главная функция для получения трендов с Reddit
 
     Args:
         subreddits: Список сабреддитов для мониторинга
         keywords: Дополнительные ключевые слова для поиска
+        http: Общий HTTP-клиент (по умолчанию создаётся временный)
+        batched: Читать сабреддиты объединёнными листингами с пагинацией
+        pages: Глубина пагинации в batched-режиме
 
     Returns:
         Список всех найденных постов, отсортированных по engagement
     """
-    fetcher = RedditFetcher()
-    all_posts = []
-
-    # Получаем горячие посты из каждого сабреддита
-    for subreddit in subreddits:
-        posts = await fetcher.get_subreddit_hot(subreddit, limit=20)
-        all_posts.extend(posts)
-        await asyncio.sleep(2)  # Пауза между запросами (Reddit rate limit)
-
-    # Дополнительный поиск по ключевым словам
-    if keywords:
-        for keyword in keywords:
-            posts = await fetcher.search_posts(keyword, limit=15)
-            all_posts.extend(posts)
-            await asyncio.sleep(2)
-
-    # Убираем дубликаты по ID
-    seen_ids = set()
-    unique_posts = []
-    for post in all_posts:
-        if post["id"] not in seen_ids:
-            seen_ids.add(post["id"])
-            unique_posts.append(post)
+    unique_posts = [
+        post async for post in stream_reddit_trends(
+            subreddits, keywords, http=http, batched=batched, pages=pages
+        )
+    ]
 
     # Сортируем по engagement_score
     unique_posts.sort(key=lambda x: x.get("engagement_score", 0), reverse=True)
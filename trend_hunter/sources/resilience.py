@@ -0,0 +1,174 @@
+"""
+Устойчивость источников: повторы с джиттером, circuit breaker по хостам
+и сводка о состоянии каждого источника за запуск
+"""
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Хосты, к которым обращается каждый источник
+SOURCE_HOSTS = {
+    "google_trends": ["trends.google.com"],
+    "reddit": ["www.reddit.com"],
+    "hackernews": ["hacker-news.firebaseio.com"],
+    "producthunt": ["www.producthunt.com"],
+}
+
+
+class CircuitOpenError(Exception):
+    """Хост помечен как недоступный — запрос не отправлялся"""
+
+
+class RetryPolicy:
+    """
+    Экспоненциальные повторы с полным джиттером
+
+    Пауза перед попыткой N — случайное число от 0 до
+    min(max_delay, base_delay * 2**N), чтобы параллельные запросы
+    не повторялись синхронно.
+    """
+
+    def __init__(self, retries: int = 2, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Пауза перед повтором номер `attempt` (с нуля)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для одного хоста
+
+    После `failure_threshold` ошибок подряд хост считается лежащим:
+    запросы сразу отклоняются, пока не пройдёт `reset_timeout` секунд.
+    Затем пропускается один пробный запрос — успех закрывает цепь,
+    ошибка снова открывает её.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """closed / open / half_open"""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """Запрос ушёл без исхода (отменён, упал не по вине хоста) — пробу можно повторить"""
+        self._probe_in_flight = False
+
+
+class HostStats:
+    """Счётчики запросов к одному хосту за время жизни HTTP-клиента"""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+class SourceMonitor:
+    """
+    Собирает состояние источников за один запуск
+
+    Поток каждого источника оборачивается в track(); по окончании
+    report() отдаёт для каждого источника статус (ok / partial / failed),
+    время работы, число items и счётчики запросов к его хостам.
+    """
+
+    def __init__(self, http):
+        self.http = http
+        self._runs: Dict[str, Dict] = {}
+
+    async def track(self, source: str, stream: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        """Пропускает поток источника насквозь, записывая его метрики"""
+        run = {"started": time.monotonic(), "finished": None, "items": 0, "error": None}
+        self._runs[source] = run
+
+        try:
+            async for item in stream:
+                run["items"] += 1
+                yield item
+        except Exception as e:
+            run["error"] = str(e)
+            logger.error(f"Источник {source} упал: {e}")
+        finally:
+            run["finished"] = time.monotonic()
+
+    def report(self) -> Dict[str, Dict]:
+        """Сводка по всем отслеженным источникам"""
+        report = {}
+
+        for source, run in self._runs.items():
+            requests: Dict[str, int] = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+            for host in SOURCE_HOSTS.get(source, []):
+                stats = self.http.stats.get(host)
+                if stats is not None:
+                    for key, value in stats.to_dict().items():
+                        requests[key] += value
+
+            failed_requests = requests["failures"] + requests["rejected"]
+            if run["error"] or failed_requests:
+                status = "partial" if run["items"] else "failed"
+            else:
+                status = "ok"
+
+            finished = run["finished"] if run["finished"] is not None else time.monotonic()
+            report[source] = {
+                "status": status,
+                "latency_s": round(finished - run["started"], 2),
+                "items": run["items"],
+                "error": run["error"],
+                **requests,
+            }
+
+        return report
+
+
+def failed_sources(report: Dict[str, Dict]) -> List[str]:
+    """Источники, которые не отдали ничего или отдали не всё"""
+    return [source for source, status in report.items() if status["status"] != "ok"]
@@ -0,0 +1,78 @@
+"""
+Потоковый разбор RSS
+Тело ответа скармливается XMLPullParser кусками, а готовые <item>
+отдаются по одному и сразу удаляются из дерева
+"""
+import asyncio
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, Iterator, List, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RssItemParser:
+    """
+    Инкрементальный парсер элементов <item>
+
+    Память не растёт с размером фида: после того как item отдан
+    вызывающему, он очищается и удаляется из родителя.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: List[ET.Element] = []
+
+    def feed(self, data: Union[bytes, str]) -> Iterator[ET.Element]:
+        """Добавляет кусок документа и отдаёт завершившиеся items"""
+        self._parser.feed(data)
+        yield from self._drain()
+
+    def close(self) -> Iterator[ET.Element]:
+        """Завершает разбор (проверяет, что документ закончен)"""
+        self._parser.close()
+        yield from self._drain()
+
+    def _drain(self) -> Iterator[ET.Element]:
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                continue
+
+            self._stack.pop()
+            if elem.tag == "item":
+                yield elem
+                # item обработан — освобождаем его поддерево
+                elem.clear()
+                if self._stack:
+                    self._stack[-1].remove(elem)
+
+
+def iter_rss_items_from_string(content: Union[bytes, str]) -> Iterator[ET.Element]:
+    """Разбирает уже загруженный документ тем же парсером"""
+    parser = RssItemParser()
+    yield from parser.feed(content)
+    yield from parser.close()
+
+
+async def iter_rss_items(response, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[ET.Element]:
+    """
+    Разбирает тело HTTP-ответа по мере поступления
+
+    Между кусками управление возвращается в event loop, поэтому
+    большой фид не блокирует остальные запросы.
+
+    Raises:
+        ET.ParseError: если документ битый (items до ошибки уже отданы)
+    """
+    parser = RssItemParser()
+
+    async for chunk in response.content.iter_chunked(chunk_size):
+        for item in parser.feed(chunk):
+            yield item
+        await asyncio.sleep(0)
+
+    for item in parser.close():
+        yield item
@@ -0,0 +1,108 @@
+"""
+Потоковый интерфейс источников
+Каждый источник — async-итератор нормализованных items; merge_streams
+сливает несколько источников в один поток по мере поступления данных
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Поле, по которому item однозначно определяется внутри своего источника
+ITEM_KEY_FIELDS = {
+    "google_trends": "title",
+    "reddit": "id",
+    "hackernews": "id",
+    "producthunt": "url",
+}
+
+
+def item_key(item: Dict) -> Optional[str]:
+    """
+    Ключ дедупликации item: "<источник>:<идентификатор>"
+
+    Returns:
+        Ключ или None, если идентификатора нет
+    """
+    source = item.get("source", "")
+    value = item.get(ITEM_KEY_FIELDS.get(source, "id"))
+    if value is None or value == "":
+        return None
+    return f"{source}:{value}"
+
+
+async def iter_completed(aws: Iterable[Awaitable[Any]]) -> AsyncIterator[Any]:
+    """
+    Отдаёт результаты корутин по мере их завершения
+
+    В отличие от голого asyncio.as_completed, незавершённые задачи
+    отменяются, если потребитель перестал читать поток.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def merge_streams(*streams: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """
+    Сливает несколько потоков items в один
+
+    Items отдаются в порядке поступления из любого источника,
+    повторы (по item_key) отбрасываются на лету. Ошибка одного
+    источника логируется и не останавливает остальные.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump(stream: AsyncIterator[Dict]):
+        try:
+            async for item in stream:
+                await queue.put(item)
+        except Exception as e:
+            logger.error(f"Ошибка источника в потоке: {e}")
+        finally:
+            await queue.put(done)
+
+    tasks = [asyncio.ensure_future(pump(stream)) for stream in streams]
+    seen = set()
+    remaining = len(tasks)
+
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is done:
+                remaining -= 1
+                continue
+
+            key = item_key(item)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Порядок, в котором fetch_* отдают items (анализаторы берут верхние N)
+SOURCE_SORT_FIELDS = {
+    "reddit": "engagement_score",
+    "hackernews": "score",
+}
+
+
+def sort_source_items(items_by_source: Dict[str, list]) -> Dict[str, list]:
+    """Сортирует собранные из потока items так же, как fetch_* функции"""
+    for source, items in items_by_source.items():
+        field = SOURCE_SORT_FIELDS.get(source)
+        if field:
+            items.sort(key=lambda x: x.get(field, 0), reverse=True)
+    return items_by_source
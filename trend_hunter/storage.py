@@ -7,6 +7,8 @@ from typing import Dict, List, Optional
 from datetime import datetime
 import logging
 
+from .idea_index import get_idea_index
+
 logger = logging.getLogger(__name__)
 
 DATA_DIR = "trend_hunter/data"
@@ -49,16 +51,53 @@ def save_daily_report(analysis: Dict, ideas: List[Dict]) -> str:
         json.dump(report, f, ensure_ascii=False, indent=2)
 
     logger.info(f"Отчёт сохранён: {filename}")
+
+    try:
+        sync_idea_index(skip=date_str).add_report(date_str, ideas)
+    except Exception as e:
+        logger.error(f"Ошибка обновления индекса идей: {e}")
+
+    return filename
+
+
+def append_streamed_idea(idea: Dict) -> str:
+    """
+    Дописывает идею в ideas_stream_{дата}.jsonl, как только модель её выдала
+
+    Идеи сохраняются по одной ещё до конца ответа — если анализ
+    оборвётся, уже сгенерированное не потеряется. Полный отчёт
+    по-прежнему пишет save_daily_report.
+
+    Returns:
+        Путь к файлу
+    """
+    ensure_data_dir()
+
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    filename = f"{DATA_DIR}/ideas_stream_{date_str}.jsonl"
+
+    record = dict(idea, streamed_at=datetime.now().isoformat())
+    with open(filename, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
     return filename
 
 
-def save_raw_data(google_trends: List[Dict], reddit_posts: List[Dict]) -> str:
+def save_raw_data(
+    google_trends: List[Dict],
+    reddit_posts: List[Dict],
+    source_status: Optional[Dict[str, Dict]] = None,
+    incremental: bool = False
+) -> str:
     """
     Сохраняет сырые данные для истории
 
     Args:
         google_trends: Тренды Google
         reddit_posts: Посты Reddit
+        source_status: Состояние источников за запуск (ok/partial/failed)
+        incremental: Снимок содержит только изменения с прошлого запуска —
+            пишется в отдельный файл с временем, а не поверх дневного
 
     Returns:
         Путь к файлу
@@ -66,14 +105,20 @@ def save_raw_data(google_trends: List[Dict], reddit_posts: List[Dict]) -> str:
     ensure_data_dir()
 
     date_str = datetime.now().strftime("%Y-%m-%d")
-    filename = f"{DATA_DIR}/raw_{date_str}.json"
+    if incremental:
+        filename = f"{DATA_DIR}/raw_{date_str}_{datetime.now().strftime('%H%M%S')}.json"
+    else:
+        filename = f"{DATA_DIR}/raw_{date_str}.json"
 
     data = {
         "date": date_str,
         "fetched_at": datetime.now().isoformat(),
+        "incremental": incremental,
         "google_trends": google_trends,
         "reddit_posts": reddit_posts
     }
+    if source_status is not None:
+        data["source_status"] = source_status
 
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
@@ -134,26 +179,57 @@ def get_all_reports() -> List[Dict]:
     return reports
 
 
-def get_all_ideas(limit: int = 50) -> List[Dict]:
-    """
-    Собирает все идеи из всех отчётов
+def _report_dates() -> List[str]:
+    """Даты всех сохранённых отчётов по именам файлов, от старых к новым"""
+    ensure_data_dir()
+    return sorted(
+        filename[len("report_"):-len(".json")]
+        for filename in os.listdir(DATA_DIR)
+        if filename.startswith("report_") and filename.endswith(".json")
+    )
 
-    Args:
-        limit: Максимальное количество идей
 
-    Returns:
-        Список идей, отсортированных по скору
+def sync_idea_index(skip: Optional[str] = None):
     """
-    all_ideas = []
+    Добавляет в индекс идеи отчётов, которых в нём ещё нет
 
-    reports = get_all_reports()
-    for report_meta in reports:
-        report = load_report(report_meta["date"])
+    Так в индекс попадают отчёты, сохранённые до его появления
+    (или пока его файл был недоступен), — и первый же отчёт после
+    обновления не вытесняет из списка идей всю историю.
+
+    Args:
+        skip: Дата, которую добавит сам вызывающий
+    """
+    index = get_idea_index()
+    indexed = index.dates()
+    missing = [date for date in _report_dates() if date not in indexed and date != skip]
+    if not missing:
+        return index
+
+    for date in missing:
+        report = load_report(date)
         if report:
             for idea in report.get("ideas", []):
-                idea["report_date"] = report_meta["date"]
-                all_ideas.append(idea)
+                if isinstance(idea, dict):
+                    index.add(idea, date)
+    index.save()
+    logger.info(f"Индекс идей дополнен отчётами за {len(missing)} дн.: {len(index)} идей")
+    return index
+
 
-    # Сортируем по скору и возвращаем топ
-    all_ideas.sort(key=lambda x: x.get("final_score", 0), reverse=True)
-    return all_ideas[:limit]
+def get_all_ideas(limit: Optional[int] = 50) -> List[Dict]:
+    """
+    Все идеи из всех отчётов без повторов
+
+    Читает индекс идей (обновляется в save_daily_report); похожие
+    идеи разных дней в нём уже слиты в одну с first_seen / last_seen
+    и числом появлений occurrences. Отчёты, которых в индексе нет,
+    сначала добавляются в него (см. sync_idea_index).
+
+    Args:
+        limit: Максимальное количество идей (None — все)
+
+    Returns:
+        Список идей, отсортированных по скору
+    """
+    return sync_idea_index().ideas(limit)
@@ -0,0 +1,141 @@
+"""
+Потоковый разбор ответа модели
+
+Пока модель генерирует JSON, массив с идеями ("saas_ideas" или
+"trends") разбирается по мере поступления текста: каждый объект
+массива отдаётся вызывающему, как только закрылась его скобка.
+Первую идею видно через пару секунд, а не после всего ответа.
+
+Итоговый анализ по-прежнему строится из полного текста — поток
+даёт только ранний предварительный просмотр.
+"""
+import json
+from typing import Callable, Dict, List, Optional
+import logging
+
+from .config import LLM_TIMEOUT
+from .llm import astream
+from .llm_cache import LLMRequest
+
+logger = logging.getLogger(__name__)
+
+
+class JsonArrayStream:
+    """
+    Инкрементальный разбор массива `key` верхнего уровня JSON-объекта
+
+    Текст подаётся кусками в feed(); каждый символ просматривается
+    один раз. Всё до первой "{" (```json, пояснения модели)
+    пропускается. Строки и экранирование учитываются, так что скобки
+    и кавычки внутри значений разбор не ломают.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.text = ""
+        self.position = 0
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.last_key: Optional[str] = None
+        self.array_depth: Optional[int] = None  # глубина внутри нужного массива
+        self.item_start: Optional[int] = None
+        self.done = False
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Добавляет кусок текста; возвращает объекты массива, закрывшиеся в нём"""
+        self.text += chunk
+        items: List[Dict] = []
+        text = self.text
+
+        for i in range(self.position, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_key = text[self.string_start + 1:i]
+                continue
+
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in "{[":
+                if ch == "[" and self.depth == 1 and self.array_depth is None and self.last_key == self.key:
+                    self.array_depth = self.depth + 1
+                elif ch == "{" and self.array_depth is not None and self.depth == self.array_depth:
+                    self.item_start = i
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if ch == "}" and self.item_start is not None and self.depth == self.array_depth:
+                    item = self._parse(text[self.item_start:i + 1])
+                    if item is not None:
+                        items.append(item)
+                    self.item_start = None
+                elif ch == "]" and self.array_depth is not None and self.depth == self.array_depth - 1:
+                    self.done = True
+
+        self.position = len(text)
+        self.emitted += len(items)
+        return items
+
+    def _parse(self, fragment: str) -> Optional[Dict]:
+        try:
+            item = json.loads(fragment)
+        except json.JSONDecodeError as e:
+            logger.debug(f"Поток: не разобран объект {self.key}: {e}")
+            return None
+        return item if isinstance(item, dict) else None
+
+
+async def stream_items(
+    messages: List[Dict[str, str]],
+    key: str,
+    on_item: Callable[[Dict], None],
+    timeout: Optional[float] = LLM_TIMEOUT,
+    cache_request: Optional[LLMRequest] = None,
+    max_tokens: int = 4000,
+    temperature: float = 0.7
+) -> str:
+    """
+    Потоковый запрос: `on_item` вызывается для каждого объекта
+    массива `key`, как только он пришёл целиком
+
+    Ошибка в `on_item` логируется и не прерывает генерацию.
+
+    Returns:
+        Полный текст ответа (для обычного разбора)
+    """
+    parser = JsonArrayStream(key)
+    parts: List[str] = []
+
+    async for piece in astream(
+        messages, max_tokens=max_tokens, temperature=temperature,
+        timeout=timeout, cache_request=cache_request
+    ):
+        parts.append(piece)
+        for item in parser.feed(piece):
+            try:
+                on_item(item)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика потока: {e}")
+
+    logger.info(f"Поток: {parser.emitted} объектов {key}")
+    return "".join(parts)
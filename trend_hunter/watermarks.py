@@ -0,0 +1,171 @@
+"""
+Водяные знаки источников для инкрементального сбора
+
+Для каждого источника между запусками хранится верхняя граница
+(Reddit — created_utc, HN — максимальный id, Product Hunt — pubDate)
+и метрики недавно виденных items. В инкрементальном режиме из потока
+пропускаются только новые items и те, у которых заметно изменились
+метрики; всё остальное отбрасывается ещё до анализа и сохранения.
+"""
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+import logging
+
+from .cache import JsonFileCache
+from .config import WATERMARKS_FILE, WATERMARK_MIN_CHANGE, WATERMARK_RETENTION
+
+logger = logging.getLogger(__name__)
+
+
+def _pub_date_ts(item: Dict) -> Optional[float]:
+    value = item.get("pub_date")
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _key(field: str):
+    return lambda item: item.get(field)
+
+
+# Источник -> (ключ item, верхняя граница, время публикации, поля метрик)
+WATERMARK_RULES = {
+    "reddit": (_key("id"), _key("created_utc"), _key("created_utc"), ("score", "num_comments")),
+    "hackernews": (_key("id"), _key("id"), _key("time"), ("score", "comments")),
+    "producthunt": (_key("url"), _pub_date_ts, _pub_date_ts, ()),
+    # Без geo: stream_google_trends схлопывает тренд из разных регионов в
+    # один, и какой geo ему достанется, зависит от того, чей фид пришёл первым
+    "google_trends": (_key("title"), None, None, ()),
+}
+
+
+class Watermarks:
+    """
+    Состояние "с прошлого запуска" по всем источникам
+
+    Запись источника в кэше:
+        {"mark": верхняя граница, "items": {ключ: {"m": [метрики], "t": ts}}}
+    Items, которых не было видно дольше `retention`, забываются.
+    Незнакомый item ниже границы считается новым, только если он
+    моложе `retention` (например, пост, который только сейчас попал
+    в hot) — иначе это давно забытый старый item.
+    """
+
+    def __init__(
+        self,
+        path: str = WATERMARKS_FILE,
+        min_change: float = WATERMARK_MIN_CHANGE,
+        retention: float = WATERMARK_RETENTION
+    ):
+        self.cache = JsonFileCache(path)
+        self.min_change = min_change
+        self.retention = retention
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _state(self, source: str) -> Dict:
+        state = self.cache.get(source)
+        if state is None:
+            state = {"mark": None, "items": {}}
+        return state
+
+    def _metrics_changed(self, old: list, new: list) -> bool:
+        for before, after in zip(old, new):
+            before = before or 0
+            after = after or 0
+            if abs(after - before) >= max(1, self.min_change * abs(before)):
+                return True
+        return False
+
+    def check(
+        self, state: Dict, source: str, item: Dict, now: float, prev_mark=None
+    ) -> Tuple[bool, str]:
+        """
+        Решает, пропускать ли item, и обновляет состояние источника
+
+        Args:
+            prev_mark: Верхняя граница на начало запуска
+
+        Returns:
+            (пропускать ли, причина: new / changed / seen)
+        """
+        key_of, mark_of, time_of, metric_fields = WATERMARK_RULES[source]
+        key = str(key_of(item))
+        metrics = [item.get(field) for field in metric_fields]
+        mark = mark_of(item) if mark_of else None
+
+        previous = state["items"].get(key)
+        state["items"][key] = {"m": metrics, "t": now}
+        if previous is None:
+            below_mark = prev_mark is not None and mark is not None and mark <= prev_mark
+            published = time_of(item) if time_of else None
+            forgotten = published is not None and now - published > self.retention
+            verdict = (False, "seen") if below_mark and forgotten else (True, "new")
+        elif self._metrics_changed(previous["m"], metrics):
+            verdict = (True, "changed")
+        else:
+            verdict = (False, "seen")
+
+        if mark is not None and (state["mark"] is None or mark > state["mark"]):
+            state["mark"] = mark
+        return verdict
+
+    def unchanged(self, source: str, item: Dict) -> bool:
+        """
+        Виден ли item раньше и без заметных изменений метрик
+
+        Только проверка, состояние не меняется: по ней источник может
+        перестать листать выдачу, не дожидаясь фильтра.
+        """
+        if source not in WATERMARK_RULES:
+            return False
+        key_of, _, _, metric_fields = WATERMARK_RULES[source]
+        previous = self._state(source)["items"].get(str(key_of(item)))
+        if previous is None:
+            return False
+        return not self._metrics_changed(previous["m"], [item.get(field) for field in metric_fields])
+
+    async def filter(self, source: str, stream: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+        """
+        Пропускает из потока источника только новое и изменившееся
+
+        Состояние обновляется по мере чтения; на диск — в save(),
+        который вызывается только когда отданные items обработаны
+        (иначе при сбое анализа они больше не попадут в выдачу).
+        """
+        if source not in WATERMARK_RULES:
+            async for item in stream:
+                yield item
+            return
+
+        state = self._state(source)
+        # Граница на начало запуска: с ней сравниваются незнакомые items
+        prev_mark = state["mark"]
+        stats = self.stats.setdefault(source, {"new": 0, "changed": 0, "seen": 0})
+        now = time.time()
+
+        try:
+            async for item in stream:
+                emit, reason = self.check(state, source, item, now, prev_mark)
+                stats[reason] += 1
+                if emit:
+                    item["change"] = reason
+                    yield item
+        finally:
+            state["items"] = {
+                key: entry for key, entry in state["items"].items()
+                if now - entry["t"] <= self.retention
+            }
+            self.cache.set(source, state)
+
+    def save(self):
+        """Записывает водяные знаки на диск"""
+        self.cache.save()
+        for source, stats in self.stats.items():
+            logger.info(
+                f"{source}: новых {stats['new']}, изменилось {stats['changed']}, "
+                f"без изменений {stats['seen']}"
+            )